@@ -0,0 +1,174 @@
+#!/usr/bin/env python
+#
+# Throughput benchmark for gpfs.analyze.TraceParser.parse_trace, compares
+#   the single split, dispatch table parser against the old parser that
+#   re-split every line up to 8 times.
+#
+import argparse
+import os
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from gpfs.analyze import TraceParser
+from gen_trace import write_trace
+
+def tree():
+    return defaultdict(tree)
+
+class LegacyTraceParser(TraceParser):
+    """The line loop and line parsers as they were before the dispatch
+    table, kept here only to have something to benchmark against"""
+
+    IORegex = ['QIO:', 'SIO:', 'FIO:']
+    TSRegex = ['tscHandleMsgDirectly:', 'tscSendReply:', 'sendMessage',
+               'tscSend:', 'tscHandleMsg:']
+
+    def _parse_io_trace(self, line):
+        op = line.split()[3].strip(':')
+        pid = line.split()[1]
+        l = line.split()
+
+        # the same IOMatcher calls as the dispatch handlers, so both parsers
+        #   match and store every IO
+        if op == 'QIO':
+            oid = (l[17], pid)
+            self.iomatcher.add_qio(oid, float(l[0]))
+        elif op == 'SIO':
+            oid = (l[12], pid)
+            self.iomatcher.add_sio(oid, float(l[0]))
+        elif op == 'FIO':
+            oid = (l[17], pid)
+            self.iomatcher.add_fio(oid, float(l[0]),
+                    int(l[17].split(':')[0]), int(l[17].split(':')[1]),
+                    int(pid), l[15], ' '.join(l[4:6]), int(l[19]),
+                    int(l[7]), int(l[8]))
+
+    def _parse_ts_trace(self, line):
+        op = line.split()[3].strip(':')
+        pid = line.split()[1]
+        l = line.split()
+        traceref = self.tracelog['trace_ts']
+
+        # keyed on (msg_id, pid) like the dispatch handlers, for
+        #   _assemble_rpc_stats
+        if op == 'tscHandleMsgDirectly':
+            msg_id = l[9].strip(',')
+            oid = (msg_id, pid)
+            if l[7].strip('\'').strip('\',') == 'reply':
+                traceref[oid]['reply']['tracetime'] = float(l[0])
+                traceref[oid]['reply']['msg_id'] = msg_id
+                traceref[oid]['reply']['node_ip'] = l[14]
+                return
+            traceref[oid][op]['tracetime'] = float(l[0])
+            traceref[oid][op]['msg'] = l[7].strip('\'').strip('\',')
+            traceref[oid][op]['msg_id'] = msg_id
+            traceref[oid][op]['len'] = l[11]
+            traceref[oid][op]['node_ip'] = l[14]
+        elif op == 'tscSendReply':
+            msg_id = l[9].strip(',')
+            oid = (msg_id, pid)
+            traceref[oid][op]['tracetime'] = float(l[0])
+            traceref[oid][op]['msg'] = l[7].strip('\'').strip('\',')
+            traceref[oid][op]['msg_id'] = msg_id
+        elif op == 'sendMessage':
+            msg_id = l[9].strip(',')
+            oid = (msg_id, pid)
+            traceref[oid][op]['tracetime'] = float(l[0])
+            traceref[oid][op]['node_ip'] = l[6]
+            traceref[oid][op]['nodename'] = l[7].strip(':')
+            traceref[oid][op]['msg_id'] = msg_id
+            if not l[6] in traceref['nodetable']:
+                traceref['nodetable'][l[6]] = l[7].strip(':')
+        elif op == 'tscHandleMsg':
+            msg_id = l[9].strip(',')
+            oid = (msg_id, pid)
+            traceref[oid][op]['tracetime'] = float(l[0])
+            traceref[oid][op]['msg'] = l[7].strip('\'').strip('\',')
+            traceref[oid][op]['msg_id'] = msg_id
+            traceref[oid][op]['len'] = l[9]
+            traceref[oid][op]['node_id'] = l[13]
+            traceref[oid][op]['node_ip'] = l[14]
+        elif op == 'tscSend':
+            if "rc = 0x" in line:
+                return
+            oid = (l[13], pid)
+            traceref[oid][op]['tracetime'] = float(l[0])
+            traceref[oid][op]['msg'] = l[7].strip('\'').strip('\',')
+            traceref[oid][op]['msg_id'] = l[13]
+
+    def _parse_lines(self, lines, dispatch):
+        filter_list = [k[0].strip(':') for k in dispatch]
+        for line in lines:
+            if line.split()[2].strip(':') not in filter_list:
+                continue
+            elif line.split()[2].strip(':') == 'TRACE_IO' and \
+                line.split()[3] in self.IORegex:
+                self._parse_io_trace(line)
+            elif line.split()[2].strip(':') == 'TRACE_TS' and \
+                line.split()[3] in self.TSRegex:
+                self._parse_ts_trace(line)
+
+def bench(parser_cls, filename, filters, num_lines):
+    parser = parser_cls(tree(), False)
+    start = time.time()
+    parser.parse_trace(filename, filters)
+    elapsed = time.time() - start
+    return elapsed, num_lines / elapsed
+
+def main(args):
+
+    fd, filename = tempfile.mkstemp(suffix='.gz')
+    os.close(fd)
+
+    try:
+        num_lines = write_trace(filename, args.lines, args.disks,
+                                seed=args.seed)
+        print "Trace: {0} lines, {1} disks, filters: {2}".format(
+                num_lines, args.disks, args.filters)
+        print "*" * 80
+
+        results = {}
+        for name, cls in (('legacy', LegacyTraceParser),
+                          ('dispatch', TraceParser)):
+            best = min(bench(cls, filename, args.filters, num_lines)
+                        for i in range(args.repeat))
+            results[name] = best
+            print "{0:10s} {1:8.3f} secs, {2:12.0f} lines/sec".format(
+                    name, best[0], best[1])
+
+        print "Speedup: {0:.2f}x".format(
+                results['legacy'][0] / results['dispatch'][0])
+    finally:
+        os.unlink(filename)
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='benchmark the trace parser')
+    parser.add_argument('-n', '--lines',
+                        dest='lines',
+                        type=int,
+                        default=500000,
+                        help='number of trace lines to generate')
+    parser.add_argument('-d', '--disks',
+                        dest='disks',
+                        type=int,
+                        default=64,
+                        help='number of disks in the trace')
+    parser.add_argument('-r', '--repeat',
+                        dest='repeat',
+                        type=int,
+                        default=3,
+                        help='number of runs, the best one is reported')
+    parser.add_argument('--filters',
+                        dest='filters',
+                        default='io,ts',
+                        help='comma sep list of filters to parse')
+    parser.add_argument('--seed',
+                        dest='seed',
+                        type=int,
+                        default=1,
+                        help='random seed for the generated trace')
+    args = parser.parse_args()
+
+    main(args)
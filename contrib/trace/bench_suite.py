@@ -0,0 +1,230 @@
+#!/usr/bin/env python
+#
+# Benchmark suite for gpfs.analyze.TraceParser, on made up traces (see
+#   gen_trace.py) of a few sizes. For each size and parser mode it reports
+#   the parse throughput, the peak RSS and how long the summaries take to
+#   print, and it can save the results and compare a later run against
+#   them to catch performance regressions.
+#
+import argparse
+import json
+import multiprocessing
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from gpfs.analyze import TraceParser
+from gen_trace import write_trace
+
+def tree():
+    return defaultdict(tree)
+
+def parse_size(size):
+    """'10M' -> 10000000"""
+
+    size = size.strip().upper()
+    scale = {'K': 10 ** 3, 'M': 10 ** 6, 'G': 10 ** 9}.get(size[-1:], 1)
+    return int(float(size.rstrip('KMG')) * scale)
+
+def _run(conn, filename, filters, summary_only, workers):
+    """Parses and summarizes a trace in a child process, so the peak RSS
+    is that of the parse alone, and sends the numbers back"""
+
+    parser = TraceParser(tree(), False, summary_only)
+    start = time.time()
+    parser.parse_trace(filename, filters, workers)
+    parse_secs = time.time() - start
+
+    stdout = sys.stdout
+    sys.stdout = open(os.devnull, 'w')
+    try:
+        start = time.time()
+        if 'io' in filters.split(','):
+            parser.print_disk_summary()
+        if 'ts' in filters.split(','):
+            parser.print_network_summary()
+        summary_secs = time.time() - start
+    finally:
+        sys.stdout.close()
+        sys.stdout = stdout
+
+    # ru_maxrss is in KB on linux, the workers are the children
+    conn.send({'parse_secs':    parse_secs,
+               'summary_secs':  summary_secs,
+               'peak_rss_mb':   resource.getrusage(
+                                    resource.RUSAGE_SELF).ru_maxrss / 1024.0,
+               'worker_rss_mb': resource.getrusage(
+                                    resource.RUSAGE_CHILDREN).ru_maxrss / 1024.0})
+    conn.close()
+
+def bench(filename, num_lines, filters, summary_only, workers):
+    """Runs _run in a child process
+
+    @return: dict of the results
+    @rtype: dict
+    """
+
+    mine, theirs = multiprocessing.Pipe(False)
+    child = multiprocessing.Process(target=_run, args=(theirs, filename,
+                                        filters, summary_only, workers))
+    child.start()
+    result = mine.recv()
+    child.join()
+    result['lines'] = num_lines
+    result['lines_sec'] = num_lines / result['parse_secs']
+    return result
+
+def compare(results, baseline, tolerance):
+    """Prints the runs that got slower or bigger than the baseline by
+    more than tolerance (a fraction). Only the runs of the same size,
+    mode, filters and number of workers are compared.
+
+    @return: (number of runs compared, True if any of them regressed)
+    @rtype: tuple
+    """
+
+    compared = 0
+    regressed = False
+    for name, result in sorted(results.iteritems()):
+        base = baseline.get(name)
+        if base is None:
+            continue
+        compared += 1
+        checks = (('lines/sec', base['lines_sec'] / result['lines_sec']),
+                  ('peak RSS', result['peak_rss_mb'] / base['peak_rss_mb']),
+                  ('summary time', result['summary_secs'] /
+                                    max(base['summary_secs'], 0.01)))
+        for what, ratio in checks:
+            if ratio > 1 + tolerance:
+                print "REGRESSION {0}: {1} is {2:.0f}% worse".format(
+                        name, what, (ratio - 1) * 100)
+                regressed = True
+    return compared, regressed
+
+def main(args):
+
+    sizes = [parse_size(s) for s in args.sizes.split(',')]
+    modes = args.modes.split(',')
+    slow_disks = [int(d) for d in args.slow_disks.split(',')] \
+        if args.slow_disks else []
+
+    trace_dir = args.trace_dir or tempfile.mkdtemp(prefix='gpfs-bench-')
+    if not os.path.isdir(trace_dir):
+        os.makedirs(trace_dir)
+
+    results = {}
+    try:
+        print "{0:>10s} {1:>8s} {2:>9s} {3:>12s} {4:>12s} {5:>12s} " \
+            "{6:>12s}".format('Lines', 'Mode', 'Parse(s)', 'Lines/sec',
+                              'Peak_RSS(MB)', 'Worker(MB)', 'Summary(s)')
+        print "*" * 80
+        for size in sizes:
+            # the traces take a while to write, keep them around with
+            #   --trace-dir to rerun on the same ones
+            filename = os.path.join(trace_dir, 'bench-{0}-d{1}-s{2}.gz'.format(
+                                        size, args.disks, args.seed))
+            if not os.path.exists(filename):
+                tmp = filename + '.tmp.gz'
+                write_trace(tmp, size, args.disks, slow_disks=slow_disks,
+                            seed=args.seed)
+                os.rename(tmp, filename)
+
+            for mode in modes:
+                result = min((bench(filename, size, args.filters,
+                                    mode == 'summary', args.workers)
+                                for i in range(args.repeat)),
+                             key=lambda r: r['parse_secs'])
+                results['{0}/{1}/{2}/w{3}'.format(size, mode, args.filters,
+                                                  args.workers)] = result
+                print "{0:10d} {1:>8s} {2:9.2f} {3:12.0f} {4:12.1f} " \
+                    "{5:12.1f} {6:12.3f}".format(size, mode,
+                        result['parse_secs'], result['lines_sec'],
+                        result['peak_rss_mb'], result['worker_rss_mb'],
+                        result['summary_secs'])
+                sys.stdout.flush()
+    finally:
+        if not args.trace_dir:
+            shutil.rmtree(trace_dir, ignore_errors=True)
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        compared, regressed = compare(results, baseline, args.tolerance)
+        if regressed:
+            sys.exit(1)
+        print "No regressions in {0} runs compared to {1}".format(compared,
+                args.compare)
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='benchmark the trace ' + \
+                'parser on made up traces')
+    parser.add_argument('--sizes',
+                        dest='sizes',
+                        default='1M,10M,100M',
+                        help='comma sep list of trace sizes in lines, ' + \
+                            'ex: 1M,10M,100M')
+    parser.add_argument('--modes',
+                        dest='modes',
+                        default='full,summary',
+                        help='comma sep list of parser modes, full (every ' + \
+                            'IO kept) and/or summary (--summary-only)')
+    parser.add_argument('--filters',
+                        dest='filters',
+                        default='io,ts',
+                        help='comma sep list of filters to parse')
+    parser.add_argument('-w', '--workers',
+                        dest='workers',
+                        type=int,
+                        default=1,
+                        help='number of worker processes to parse with')
+    parser.add_argument('-r', '--repeat',
+                        dest='repeat',
+                        type=int,
+                        default=1,
+                        help='number of runs of each size and mode, the ' + \
+                            'fastest one is reported')
+    parser.add_argument('-d', '--disks',
+                        dest='disks',
+                        type=int,
+                        default=64,
+                        help='number of disks in the traces')
+    parser.add_argument('--slow-disks',
+                        dest='slow_disks',
+                        default='7',
+                        help='comma sep list of disks to make slow')
+    parser.add_argument('--seed',
+                        dest='seed',
+                        type=int,
+                        default=1,
+                        help='random seed for the generated traces')
+    parser.add_argument('--trace-dir',
+                        dest='trace_dir',
+                        required=False,
+                        help='keep the generated traces in this directory ' + \
+                            'and reuse them, they are deleted otherwise')
+    parser.add_argument('--save',
+                        dest='save',
+                        required=False,
+                        help='write the results to this json file')
+    parser.add_argument('--compare',
+                        dest='compare',
+                        required=False,
+                        help='json file of an earlier run (--save), exits ' + \
+                            '1 if any run got worse by more than --tolerance')
+    parser.add_argument('--tolerance',
+                        dest='tolerance',
+                        type=float,
+                        default=0.15,
+                        help='how much worse than --compare is a ' + \
+                            'regression, ex: 0.15 for 15%%')
+    args = parser.parse_args()
+
+    main(args)
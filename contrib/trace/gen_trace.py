@@ -0,0 +1,260 @@
+#!/usr/bin/env python
+#
+# Writes made up trcrpt trace reports, for benchmarking and trying out
+#   gpfs.analyze without a production trace. The IOs arrive at a steady
+#   rate, wait in the queue, are in service for a random io time and
+#   finish out of order like the real thing, with RPCs to the NSD servers
+#   and lines of other trace classes mixed in.
+#
+import argparse
+import datetime
+import gzip
+import heapq
+import math
+import random
+import time
+
+# the fields of the trace lines the parser reads, everything else is
+#   filled in the way trcrpt does it
+_QIO = "{0:12.6f} {1:6d} TRACE_IO: QIO: {2} tag {3} {4} ioVecSize 1 1st " \
+    "buf 0x41509B0000 nsdId {5} da {6}:{7} nSectors {8} align 0 by " \
+    "iocMBHandler (DioHandlerThread)\n"
+_SIO = "{0:12.6f} {1:6d} TRACE_IO: SIO: {2} tag {3} {4} nsdId {5} da " \
+    "{6}:{7} nSectors {8}\n"
+_FIO = "{0:12.6f} {1:6d} TRACE_IO: FIO: {2} tag {3} {4} ioVecSize 1 1st " \
+    "buf 0x41509B0000 nsdId {5} da {6}:{7} nSectors {8} err 0\n"
+_SEND = "{0:12.6f} {1:6d} TRACE_TS: tscSend: service 16.1, msg '{2}', " \
+    "n_dest 1, data_len 112, msg_id {3} msg 0x7F60B8050C18 mr 0x7F60B8050A78\n"
+_SEND_MESSAGE = "{0:12.6f} {1:6d} TRACE_TS: sendMessage dest <c0n{2}> {3} " \
+    "{4}: msg_id {5} type 1 tagP 0x7F60B8050D08 seq 1 state initial\n"
+_REPLY = "{0:12.6f} {1:6d} TRACE_TS: tscHandleMsgDirectly: service 1.1, " \
+    "msg 'reply', msg_id {2}, len 0, from {3} {4}\n"
+_NOISE = ("{0:12.6f} {1:6d} TRACE_MUTEX: Thread 0x{2:X} (Worker) waiting on "
+          "condVar 0x18029A3E720 (0x18029A3E720) (MsgRecordCondvar), "
+          "reason 'RPC wait'\n",
+          "{0:12.6f} {1:6d} TRACE_VNODE: gpfs_i_getattr enter: inode "
+          "{2}\n",
+          "{0:12.6f} {1:6d} TRACE_LOG: logWrite: writing {2} bytes\n")
+
+_MESSAGES = ('nsdMsgWrite', 'nsdMsgRead', 'tmMsgRevoke', 'sgmMsgSGClientCmd')
+
+
+def _latency(rng, dist, median, sigma):
+    """A random io time of the given distribution"""
+
+    if dist == 'exponential':
+        return rng.expovariate(math.log(2) / median)
+    if dist == 'uniform':
+        return rng.uniform(0, 2 * median)
+    return rng.lognormvariate(math.log(median), sigma)
+
+
+def write_trace(filename, num_lines, num_disks=64, iops=2000.0,
+        latency=0.005, dist='lognormal', sigma=0.6, queue_time=0.001,
+        slow_disks=(), slow_factor=10.0, meta_disks=0, num_nodes=8,
+        msgs_per_io=0.5, noise_per_io=1.0, seed=1):
+    """Writes a trace report of about num_lines lines, gzip'd when the
+    name ends in .gz.
+
+    The IOs arrive at iops per second (Poisson), over num_disks disks
+    numbered from 1. Each waits queue_time on average between its QIO and
+    SIO, and has an io time of the given distribution (lognormal,
+    exponential or uniform) with the given median, slow_factor times that
+    on the slow_disks. The first meta_disks disks only see small metadata
+    IOs. The trace is cut off at num_lines, the IOs still in flight then
+    are orphans, same as in a real trace.
+
+    @return: number of lines written, header included
+    @rtype: int
+    """
+
+    rng = random.Random(seed)
+    slow_disks = set(slow_disks)
+    nodes = [('10.0.{0}.{1}'.format(i / 250, i % 250 + 1),
+              'nsd{0}'.format(i + 1)) for i in range(num_nodes)]
+    nsd_ids = ['AC17{0:04X}:5065{0:04X}'.format(d) for d in
+                range(num_disks + 1)]
+
+    # the header lines, the trace runs as long as the IOs take to arrive
+    lines_per_io = 3 + 3 * msgs_per_io + noise_per_io
+    duration = num_lines / lines_per_io / iops
+    start = datetime.datetime(2014, 2, 26, 16, 43, 41)
+    stop = start + datetime.timedelta(seconds=int(math.ceil(duration)))
+    header = [
+        "Trace started: {0}\n".format(start.strftime('%a %b %d %H:%M:%S %Y')),
+        "Trace stopped at: {0}\n".format(stop.strftime('%a %b %d %H:%M:%S %Y')),
+        "\n",
+        "Elapsed trace time: {0:.6f} seconds\n".format(duration),
+        "\n",
+        "Operating system trace:\n",
+        "\n",
+        "   relative-seconds  pid  hookword  data\n"]
+
+    if filename.endswith('.gz'):
+        f = gzip.open(filename, 'wb')
+    else:
+        f = open(filename, 'wb')
+    f.write(''.join(header))
+
+    # the SIO/FIO lines (and message replies) waiting for their time,
+    #   (time, seq, format, args). seq keeps the order of equal times
+    pending = []
+    out = []
+    written = len(header)
+    t = 0.0
+    seq = 0
+    msg_id = 100000
+    while written < num_lines:
+        t += rng.expovariate(iops)
+
+        # whatever happened before this IO arrived
+        while pending and pending[0][0] <= t and written < num_lines:
+            when, s, fmt, args = heapq.heappop(pending)
+            out.append(fmt.format(when, *args))
+            written += 1
+
+        pid = rng.randint(20000, 20200)
+        disk = rng.randint(1, num_disks)
+        if disk <= meta_disks:
+            optype = rng.choice(('read inode', 'write inode', 'read indBlock'))
+            nsectors = rng.choice((1, 8))
+            median = latency / 2
+        else:
+            optype = rng.choice(('read data', 'write data'))
+            nsectors = rng.choice((16, 256, 2048, 2048, 8192, 16384))
+            median = latency
+        if disk in slow_disks:
+            median *= slow_factor
+        diskaddr = rng.randint(0, 2 ** 30) * 8
+        inode, block = rng.randint(1, 10 ** 7), rng.randint(0, 4096)
+        args = (pid, optype, inode, block, nsd_ids[disk], disk, diskaddr,
+                nsectors)
+
+        sio = t + rng.expovariate(1.0 / queue_time) if queue_time else t
+        fio = sio + _latency(rng, dist, median, sigma)
+        out.append(_QIO.format(t, *args))
+        written += 1
+        heapq.heappush(pending, (sio, seq, _SIO, args))
+        heapq.heappush(pending, (fio, seq + 1, _FIO, args))
+        seq += 2
+
+        # the RPCs of this node, a request and its reply
+        if rng.random() < msgs_per_io:
+            msg_id += 1
+            node = rng.randrange(num_nodes)
+            ip, name = nodes[node]
+            msg = rng.choice(_MESSAGES)
+            out.append(_SEND.format(t, pid, msg, msg_id))
+            out.append(_SEND_MESSAGE.format(t, pid, node, ip, name, msg_id))
+            written += 2
+            heapq.heappush(pending, (t + rng.expovariate(2000.0), seq, _REPLY,
+                (rng.randint(20000, 20200), msg_id, node, ip)))
+            seq += 1
+
+        # and the lines the analyzer doesn't care about
+        noise = noise_per_io
+        while noise > 0 and rng.random() < noise:
+            out.append(rng.choice(_NOISE).format(t, pid,
+                                                 rng.randint(1, 10 ** 7)))
+            written += 1
+            noise -= 1
+
+        if len(out) >= 10000:
+            f.write(''.join(out))
+            out = []
+
+    f.write(''.join(out))
+    f.close()
+    return written
+
+
+def main(args):
+
+    slow_disks = [int(d) for d in args.slow_disks.split(',')] \
+        if args.slow_disks else []
+    start = time.time()
+    num_lines = write_trace(args.filename, args.lines, args.disks, args.iops,
+        args.latency, args.dist, args.sigma, args.queue_time, slow_disks,
+        args.slow_factor, args.meta_disks, args.nodes, args.msgs_per_io,
+        args.noise_per_io, args.seed)
+    print "Wrote {0} lines to {1} in {2:.1f} secs".format(num_lines,
+            args.filename, time.time() - start)
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='write a made up GPFS ' + \
+                'trace report (trcrpt format)')
+    parser.add_argument('filename',
+                        help='trace report to write, gzip\'d if it ends in .gz')
+    parser.add_argument('-n', '--lines',
+                        dest='lines',
+                        type=int,
+                        default=1000000,
+                        help='number of trace lines to write')
+    parser.add_argument('-d', '--disks',
+                        dest='disks',
+                        type=int,
+                        default=64,
+                        help='number of disks')
+    parser.add_argument('--iops',
+                        dest='iops',
+                        type=float,
+                        default=2000.0,
+                        help='IOs per second, over all the disks')
+    parser.add_argument('--latency',
+                        dest='latency',
+                        type=float,
+                        default=0.005,
+                        help='median io time (secs)')
+    parser.add_argument('--dist',
+                        dest='dist',
+                        choices=['lognormal', 'exponential', 'uniform'],
+                        default='lognormal',
+                        help='io time distribution')
+    parser.add_argument('--sigma',
+                        dest='sigma',
+                        type=float,
+                        default=0.6,
+                        help='shape of the lognormal io times')
+    parser.add_argument('--queue-time',
+                        dest='queue_time',
+                        type=float,
+                        default=0.001,
+                        help='mean time between QIO and SIO (secs)')
+    parser.add_argument('--slow-disks',
+                        dest='slow_disks',
+                        required=False,
+                        help='comma sep list of disk numbers to make slow')
+    parser.add_argument('--slow-factor',
+                        dest='slow_factor',
+                        type=float,
+                        default=10.0,
+                        help='how many times slower the slow disks are')
+    parser.add_argument('--meta-disks',
+                        dest='meta_disks',
+                        type=int,
+                        default=0,
+                        help='number of metadata only disks (the first ones)')
+    parser.add_argument('--nodes',
+                        dest='nodes',
+                        type=int,
+                        default=8,
+                        help='number of nodes the RPCs go to')
+    parser.add_argument('--msgs-per-io',
+                        dest='msgs_per_io',
+                        type=float,
+                        default=0.5,
+                        help='RPCs sent per IO (each one is 3 lines)')
+    parser.add_argument('--noise-per-io',
+                        dest='noise_per_io',
+                        type=float,
+                        default=1.0,
+                        help='lines of other trace classes per IO')
+    parser.add_argument('--seed',
+                        dest='seed',
+                        type=int,
+                        default=1,
+                        help='random seed')
+    args = parser.parse_args()
+
+    main(args)
@@ -1,43 +1,68 @@
 #!/usr/bin/env python
-import json
-import numpy as np
-from collections import defaultdict
+import sys
 from optparse import OptionParser
-
-def yodict():
-	return defaultdict(yodict)
+from gpfs.heatmap import LBAHeatMap, REGION_SIZE
+from gpfs.traceio import TraceFile, line_batches
 
 def main(options, args):
-	diskmap = yodict()
+    heatmap = LBAHeatMap(options.region_size)
 
-	with open(options.filename, 'r') as f:
-		#   28.104046   7998 TRACE_IO: FIO: write data tag 225395665 23682052 ioVecSize 128 1st buf 0x41509B0000 nsdId AC170567:50655A01 da 263:8366374912 nSectors 16384 err 0
-		for line in f:
-			fields = line.split()
-			io_t = fields[4]
-			inode = fields[7]
-			iblock = fields[8]
-			disk = fields[17].split(':')[0]
-			lba = fields[17].split(':')[1]
-			sectors = fields[19]
-			iosz = sectors * 512
-			io_s = lba
-			io_e = lba + iosz
+    # small reads and a short read ahead, so the lines waiting to be
+    #   counted don't take more memory than the counts
+    try:
+        f = TraceFile(options.filename, 1024 * 1024)
+    except IOError as ioe:
+        print "Error opening file: {0}".format(ioe)
+        sys.exit(1)
 
-			if diskmap[disk][lba]:
-				diskmap[disk][lba] += 1
-			else:
-				diskmap[disk][lba] = 1
+    #   28.104046   7998 TRACE_IO: FIO: write data tag 225395665 23682052 ioVecSize 128 1st buf 0x41509B0000 nsdId AC170567:50655A01 da 263:8366374912 nSectors 16384 err 0
+    num_ios = 0
+    for batch in line_batches(f, 50000, 1):
+        for line in batch:
+            if not 'FIO:' in line:
+                continue
+            fields = line.split()
+            if len(fields) < 20 or fields[3] != 'FIO:':
+                continue
+            disk, diskaddr = fields[17].split(':')
+            heatmap.add(int(disk), int(diskaddr), int(fields[19]))
+            num_ios += 1
+    f.close()
 
-	#print sorted(diskmap, key=lambda x: diskmap[x][lba])
-	print json.dumps(diskmap, sort_keys=True, indent=4)
+    heatmap.save(options.output)
+    disks, ios, nbytes = heatmap.matrix()
+    print "{0} IOs on {1} disks, {2} regions of {3} bytes, written to " \
+        "{4}".format(num_ios, len(disks), ios.shape[1], options.region_size,
+                     options.output)
+    if options.png:
+        heatmap.write_png(options.png, options.png_counts)
+        print "Heat map of the {0} written to {1}".format(options.png_counts,
+                                                          options.png)
 
 if __name__ == '__main__':
-	parser = OptionParser()
-	parser.add_option('-f', '--filename',
-						dest='filename',
-    					help='tracefile to open (formatted for FIO only)')
- 	options, args = parser.parse_args()
-	if not options.filename:   # if filename is not given
-		parser.error('Filename not given')
- 	main(options, args)
+    parser = OptionParser()
+    parser.add_option('-f', '--filename',
+                      dest='filename',
+                      help='trace report to open (plain or compressed)')
+    parser.add_option('-o', '--output',
+                      dest='output',
+                      default='heatmap.npz',
+                      help='compressed numpy file to write the disk x ' + \
+                        'region IO and byte counts to [default: %default]')
+    parser.add_option('-r', '--region-size',
+                      dest='region_size',
+                      type='int',
+                      default=REGION_SIZE,
+                      help='LBA region size in bytes [default: %default]')
+    parser.add_option('--png',
+                      dest='png',
+                      help='also draw the heat map to this PNG file')
+    parser.add_option('--png-counts',
+                      dest='png_counts',
+                      choices=['ios', 'bytes'],
+                      default='ios',
+                      help='what to draw, ios or bytes [default: %default]')
+    options, args = parser.parse_args()
+    if not options.filename:   # if filename is not given
+        parser.error('Filename not given')
+    main(options, args)
@@ -2,13 +2,13 @@
 #
 #
 import argparse
-import datetime
-import gzip
-import json
+import numpy as np
+import os
 import sys
-import zlib
 from collections import defaultdict
+from gpfs import tracecache
 from gpfs.analyze import TraceParser
+from gpfs.columnar import ColumnWriter
 from IPython import embed
 
 def tree():
@@ -18,25 +18,79 @@ def main(args):
 
     filters = args.filters
 
-    if args.traceinput:     # this currently crashes on my vm...
-        j = gzip.open(args.traceinput, 'r')
-        tracelog = json.load(j)
-        parser = TraceParser(tracelog, args.verbose)
+    options = {'start': args.start, 'end': args.end, 'top_ios': args.top_ios,
+               'top_inodes': args.top_inodes}
+    if args.size_buckets:
+        options['size_buckets'] = [int(b) for b in args.size_buckets.split(',')]
+    if args.latency_buckets:
+        options['latency_buckets'] = [float(b) for b in
+                                        args.latency_buckets.split(',')]
+    if args.disks:
+        options['disks'] = args.disks.split(',')
+    if args.nodes:
+        options['nodes'] = args.nodes.split(',')
+
+    #tracelog = lambda: defaultdict(tracelog)   # look how cool I am
+    tracelog = tree()
+    parser = TraceParser(tracelog, args.verbose, args.summary_only,
+                         args.io_horizon, **options)
+
+    writer = None
+    if args.export:
+        try:
+            writer = ColumnWriter(args.export, format=args.export_format)
+        except (ValueError, OSError) as e:
+            print "Error, can't export to {0}: {1}".format(args.export, e)
+            sys.exit(1)
+        parser.export_to(writer)
+
+    if args.traceinput:
+        if not tracecache.load(parser, args.traceinput):
+            print "Error, {0} is not a parse cache.".format(args.traceinput)
+            sys.exit(1)
+    elif args.directory:
+        parser.parse_trace_dir(args.directory, filters, args.workers)
+    elif args.follow:
+        parser.follow_trace(args.filename, filters, args.refresh, args.window)
+    elif args.cachedir and not writer:
+        # the same trace, filters and options, skip the parse entirely
+        key = tracecache.cache_key(args.filename, filters, parser._options)
+        entry = os.path.join(args.cachedir, key)
+        if tracecache.load(parser, entry):
+            if args.verbose:
+                print "Loaded parse cache {0}".format(entry)
+        else:
+            parser.parse_trace(args.filename, filters, args.workers)
+            tracecache.save(parser, entry)
     else:
-        #tracelog = lambda: defaultdict(tracelog)   # look how cool I am
-        tracelog = tree()
-        parser = TraceParser(tracelog, args.verbose)
-        parser.parse_trace(args.filename, filters)
+        parser.parse_trace(args.filename, filters, args.workers)
 
-    # write the io dictionary to a compressed file in json format
-    if args.tojson:
-        gzipout = gzip.open(args.tojson, 'wb')
-        json.dump(tracelog, gzipout)
-        gzipout.close()
+    if writer:
+        writer.close()
+        print "Exported {0} IOs and {1} RPCs to {2} ({3})".format(
+            writer.rows['ios'], writer.rows['rpcs'], args.export, writer.format)
 
     if args.printsum:
         parser.print_disk_summary()
+        if 'io' in filters.split(','):
+            parser.print_pattern_summary()
+            parser.print_inode_summary()
         parser.print_network_summary()
+        if 'rdma' in filters.split(','):
+            parser.print_rdma_summary()
+        if 'brl' in filters.split(','):
+            parser.print_brl_summary()
+        if args.directory:
+            parser.print_node_summary()
+
+    if args.timeline:
+        parser.print_io_timeline(args.timeline)
+        if 'rdma' in filters.split(','):
+            parser.print_rdma_timeline(args.timeline)
+        if args.timeline_out:
+            timeline = parser.io_timeline(args.timeline)
+            if timeline is not None:
+                np.savez(args.timeline_out, **timeline.arrays())
 
     if args.interactive:
         embed()
@@ -48,6 +102,11 @@ if __name__ == '__main__':
                         dest='filename',
                         required=False,
                         help='filename of the trace to open.')
+    parser.add_argument('-d', '--directory',
+                        dest='directory',
+                        required=False,
+                        help='directory of trace reports, one per node, to ' + \
+                            'parse together (one worker process per report)')
     parser.add_argument('-i', '--interactive',
                         dest='interactive',
                         required=False,
@@ -57,22 +116,129 @@ if __name__ == '__main__':
     parser.add_argument('-t', '--traceinput',
                         dest='traceinput',
                         required=False,
-                        help='instead of reading a tracefile, pass in a json dump.')
+                        help='instead of reading a tracefile, open a parse cache entry.')
+    parser.add_argument('-c', '--cache-dir',
+                        dest='cachedir',
+                        required=False,
+                        help='directory to keep parse caches in, a trace parsed ' + \
+                            'before with the same filters is not parsed again')
     parser.add_argument('--filters',
                         dest='filters',
                         required=False,
                         default='io',
                         help='command sep list of filters. Valid values: ' + \
                             'io,ts,rdma,brl')
+    parser.add_argument('-w', '--workers',
+                        dest='workers',
+                        type=int,
+                        required=False,
+                        default=1,
+                        help='number of processes to parse the trace with')
+    parser.add_argument('-s', '--summary-only',
+                        dest='summary_only',
+                        required=False,
+                        action='store_true',
+                        default=False,
+                        help='only keep running per disk stats, not every IO ' + \
+                            '(constant memory for long traces)')
+    parser.add_argument('--io-horizon',
+                        dest='io_horizon',
+                        type=float,
+                        required=False,
+                        default=300.0,
+                        help='seconds of trace time an IO may wait for ' + \
+                            'its FIO before it is counted as an orphan')
+    parser.add_argument('--size-buckets',
+                        dest='size_buckets',
+                        required=False,
+                        help='comma sep list of io size bucket edges (bytes), ' + \
+                            'default 0 to 896K by 128K and 1M to 8M by 1M')
+    parser.add_argument('--latency-buckets',
+                        dest='latency_buckets',
+                        required=False,
+                        help='comma sep list of io time bucket edges (secs), ' + \
+                            'default 0 and 10us to 100s, 4 per power of 10')
+    parser.add_argument('--start',
+                        dest='start',
+                        type=float,
+                        required=False,
+                        help='skip the trace before this trace time (secs)')
+    parser.add_argument('--end',
+                        dest='end',
+                        type=float,
+                        required=False,
+                        help='stop parsing the trace after this trace time (secs)')
+    parser.add_argument('--disks',
+                        dest='disks',
+                        required=False,
+                        help='comma sep list of disk numbers, only parse ' + \
+                            'the IOs of these disks')
+    parser.add_argument('--nodes',
+                        dest='nodes',
+                        required=False,
+                        help='comma sep list of node ips/names, only parse ' + \
+                            'the messages to/from these nodes (the reports ' + \
+                            'of these nodes with -d). a name only matches ' + \
+                            'once a message was sent to it, ips always do')
+    parser.add_argument('--top-ios',
+                        dest='top_ios',
+                        type=int,
+                        required=False,
+                        default=10,
+                        help='how many of the slowest IOs and longest ' + \
+                            'queue waits to report')
+    parser.add_argument('--top-inodes',
+                        dest='top_inodes',
+                        type=int,
+                        required=False,
+                        default=10,
+                        help='how many of the busiest inodes (by bytes, ' + \
+                            'IOs and io time) to report')
     parser.add_argument('--print',
                         dest='printsum',
                         required=False,
                         help='Print summaries in a comma separated list. Valid values: ' + \
                             'io,ts,rdma,brl')
-    parser.add_argument('--tojson',
-                        dest='tojson',
+    parser.add_argument('-F', '--follow',
+                        dest='follow',
+                        required=False,
+                        action='store_true',
+                        default=False,
+                        help='follow a trace report that is still being written, ' + \
+                            'ctrl-c to stop')
+    parser.add_argument('--refresh',
+                        dest='refresh',
+                        type=float,
+                        required=False,
+                        default=5.0,
+                        help='secs between the rolling stats in follow mode')
+    parser.add_argument('--window',
+                        dest='window',
+                        type=float,
+                        required=False,
+                        default=60.0,
+                        help='secs of trace the rolling stats cover in follow mode')
+    parser.add_argument('--timeline',
+                        dest='timeline',
+                        type=float,
+                        required=False,
+                        help='print the IO stats of each window of this many ' + \
+                            'secs (ex: 1, 0.1)')
+    parser.add_argument('--timeline-out',
+                        dest='timeline_out',
+                        required=False,
+                        help='also save the timeline arrays to this .npz file')
+    parser.add_argument('--export',
+                        dest='export',
+                        required=False,
+                        help='write a row per IO and per RPC to this ' + \
+                            'directory, parquet if pyarrow is installed, ' + \
+                            '.npz files if not (parses, even with -c)')
+    parser.add_argument('--export-format',
+                        dest='export_format',
+                        choices=['parquet', 'npz'],
                         required=False,
-                        help='write dictionary to a json file')
+                        help='force the export format')
     parser.add_argument('-v', '--verbose',
                         dest='verbose',
                         default=False,
@@ -80,5 +246,9 @@ if __name__ == '__main__':
                         action='store_true',
                         help='show verbose stats (can be spammy)')
     args = parser.parse_args()
+    if args.export and (args.traceinput or args.follow):
+        parser.error('--export needs a trace to parse, not -t or -F')
+    if args.cachedir and args.follow:
+        parser.error('-c caches a finished parse, it can\'t be used with -F')
 
     main(args)
@@ -0,0 +1,228 @@
+import heapq
+
+# the access pattern classes, in the order of the per disk counters
+SEQUENTIAL, STRIDED, RANDOM = 0, 1, 2
+PATTERNS = ('seq', 'strided', 'random')
+
+_NAN = float('nan')
+
+
+class _DiskPatterns(object):
+    """The access pattern counters of one disk, and the little state
+    needed to classify its next IOs"""
+
+    __slots__ = ('counts', 'sectors', 'iotimes', 'timed', 'runs', 'run_ios',
+                 'longest_run', 'ends', 'starts', 'streams', 'clock')
+
+    def __init__(self):
+        self.counts = [0, 0, 0]
+        self.sectors = [0, 0, 0]
+        self.iotimes = [0.0, 0.0, 0.0]
+        self.timed = [0, 0, 0]      # IOs with an io time (they had a SIO)
+        self.runs = 0               # sequential runs ended
+        self.run_ios = 0
+        self.longest_run = 0
+
+        # the open runs: end sector -> [start sector, IOs, last used], and
+        #   start sector -> end sector to find a run from its front. the
+        #   streams (inodes) on this disk: inode -> [last disk address,
+        #   last address delta, last used]. last used is the clock, the
+        #   number of IOs seen on this disk then
+        self.ends = {}
+        self.starts = {}
+        self.streams = {}
+        self.clock = 0
+
+    def close(self, end):
+        """Ends the run ending at end"""
+
+        run = self.ends.pop(end)
+        if self.starts.get(run[0]) == end:
+            del self.starts[run[0]]
+        self.runs += 1
+        self.run_ios += run[1]
+        if run[1] > self.longest_run:
+            self.longest_run = run[1]
+
+    def evict(self, since):
+        """Ends the runs and forgets the streams not used since the clock
+        was at since"""
+
+        for end, run in self.ends.items():
+            if run[2] <= since:
+                self.close(end)
+        self.streams = dict((inode, stream) for inode, stream in
+                            self.streams.iteritems() if stream[2] > since)
+
+    def merge(self, other):
+        for i in range(len(PATTERNS)):
+            self.counts[i] += other.counts[i]
+            self.sectors[i] += other.sectors[i]
+            self.iotimes[i] += other.iotimes[i]
+            self.timed[i] += other.timed[i]
+        self.runs += other.runs
+        self.run_ios += other.run_ios
+        self.longest_run = max(self.longest_run, other.longest_run)
+
+
+class AccessPatterns(object):
+    """Classifies each finished IO of a disk as sequential, strided or
+    random, and keeps the mix and io times of each class per disk and
+    per inode.
+
+    An IO is sequential if it picks up where one of the recent runs of
+    its disk ends, or ends where one starts (IOs of a run can finish out
+    of order). Otherwise it's strided if it is as far from the last IO
+    of its stream (its inode on that disk) as that one was from the one
+    before, and random if not. A run or stream not used for lru_size IOs
+    of its disk is forgotten (the run is over), so there are at most
+    2 * lru_size of each per disk.
+
+    Memory is bounded by the number of disks and max_inodes. When there
+    are max_inodes inodes, the least active half (by IOs, then by inode
+    number) is dropped and their IOs are counted together under None.
+    """
+
+    def __init__(self, lru_size=32, max_inodes=100000):
+        self.lru_size = lru_size
+        self.max_inodes = max_inodes
+        self.disks = {}     # disknum -> _DiskPatterns
+        self.inodes = {}    # inode -> [seq, strided, random]
+
+    def add(self, record):
+        """Classifies a finished IO (an IORecord)"""
+
+        disk = self.disks.get(record.disknum)
+        if disk is None:
+            disk = self.disks[record.disknum] = _DiskPatterns()
+        disk.clock += 1
+        clock = disk.clock
+        ends = disk.ends
+        starts = disk.starts
+        start = record.diskaddr
+        end = start + record.nsectors
+
+        if start in ends:
+            # the next IO of a run
+            run = ends.pop(start)
+            if end in ends:
+                disk.close(end)
+            if starts.get(run[0]) == start:
+                starts[run[0]] = end
+            run[1] += 1
+            run[2] = clock
+            ends[end] = run
+            pattern = SEQUENTIAL
+        elif end in starts:
+            # the IO right before a run, it finished late
+            run_end = starts.pop(end)
+            run = ends[run_end]
+            run[0] = start
+            run[1] += 1
+            run[2] = clock
+            starts[start] = run_end
+            pattern = SEQUENTIAL
+        else:
+            if end in ends:
+                disk.close(end)
+            ends[end] = [start, 1, clock]
+            starts[start] = end
+            pattern = RANDOM
+
+        streams = disk.streams
+        stream = streams.get(record.inode)
+        if stream is None:
+            streams[record.inode] = [start, None, clock]
+        else:
+            delta = start - stream[0]
+            if pattern == RANDOM and delta and delta == stream[1]:
+                pattern = STRIDED
+            stream[0] = start
+            stream[1] = delta
+            stream[2] = clock
+        if not clock % self.lru_size:
+            disk.evict(clock - self.lru_size)
+
+        disk.counts[pattern] += 1
+        disk.sectors[pattern] += record.nsectors
+        iotime = record.fio_time - record.sio_time
+        if iotime == iotime:    # not nan, there was a SIO
+            disk.iotimes[pattern] += iotime
+            disk.timed[pattern] += 1
+
+        counts = self.inodes.get(record.inode)
+        if counts is None:
+            if len(self.inodes) >= self.max_inodes:
+                self._trim()
+            counts = self.inodes[record.inode] = [0, 0, 0]
+        counts[pattern] += 1
+
+    def _trim(self):
+        """Keeps the max_inodes / 2 most active inodes, the IOs of the
+        others are counted under None"""
+
+        ranked = sorted((inode for inode in self.inodes if inode is not None),
+                        key=lambda inode: (-sum(self.inodes[inode]), inode))
+        other = self.inodes.setdefault(None, [0, 0, 0])
+        for inode in ranked[self.max_inodes // 2:]:
+            counts = self.inodes.pop(inode)
+            for i in range(len(PATTERNS)):
+                other[i] += counts[i]
+
+    def finish(self):
+        """Ends the runs still open, at the end of the trace"""
+
+        for disk in self.disks.itervalues():
+            for end in disk.ends.keys():
+                disk.close(end)
+            disk.streams.clear()
+
+    def disk_stats(self, sector_size=512):
+        """Returns a dict of disknum -> dict of the IOs, average io time
+        and average io size of each pattern (ex: 'seq_ios', 'avg_io_tm_seq',
+        'avg_io_sz_seq'), and the average and longest sequential run (in
+        IOs). The open runs are only counted after finish()"""
+
+        stats = {}
+        for disknum, disk in self.disks.iteritems():
+            d = stats[disknum] = {
+                'avg_run_ios':      float(disk.run_ios) / disk.runs
+                                        if disk.runs else _NAN,
+                'longest_run_ios':  disk.longest_run}
+            for i, name in enumerate(PATTERNS):
+                count = disk.counts[i]
+                d[name + '_ios'] = count
+                d['avg_io_tm_' + name] = disk.iotimes[i] / disk.timed[i] \
+                    if disk.timed[i] else _NAN
+                d['avg_io_sz_' + name] = disk.sectors[i] * sector_size / count \
+                    if count else 0
+        return stats
+
+    def inode_stats(self, top=10):
+        """Returns the top inodes by random IOs, a list of (inode, [seq,
+        strided, random]), worst first (then by IOs and inode number)"""
+
+        worst = heapq.nsmallest(top, self.inodes.iteritems(),
+                    key=lambda kv: (-kv[1][RANDOM], -sum(kv[1]), kv[0]))
+        return [(inode, list(counts)) for inode, counts in worst]
+
+    def merge(self, other):
+        """Adds the counters of another AccessPatterns, of a later part of
+        the same trace or of another node. Its runs are ended first, a
+        run going across the two parts is counted as two"""
+
+        other.finish()
+        for disknum, disk in other.disks.iteritems():
+            if disknum in self.disks:
+                self.disks[disknum].merge(disk)
+            else:
+                self.disks[disknum] = disk
+        for inode, counts in other.inodes.iteritems():
+            mine = self.inodes.get(inode)
+            if mine is None:
+                self.inodes[inode] = list(counts)
+            else:
+                for i in range(len(PATTERNS)):
+                    mine[i] += counts[i]
+        if len(self.inodes) > self.max_inodes:
+            self._trim()
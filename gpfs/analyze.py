@@ -1,22 +1,179 @@
 import datetime
-import gzip
+import math
+from array import array
+import multiprocessing
+import numpy as np
+import os
 import sys
-from collections import defaultdict 
-from gpfstrace.funcs import zscore, stddev, count_iterations
-from IPython import embed
+import time
+from collections import defaultdict, deque
+from gpfs.funcs import stddev, count_iterations
+from gpfs.accesspattern import AccessPatterns, PATTERNS
+from gpfs.brlstats import BRLStats
+from gpfs.columnar import IOColumns
+from gpfs.hotinodes import HotInodes, METRICS
+from gpfs.iomatch import BRLMatcher, IOMatcher, RDMAMatcher
+from gpfs.iostore import IOStore, IOSummary, SIZE_BUCKETS, LATENCY_BUCKETS, \
+    PERCENTILES, bucket_counts, group_percentiles, robust_zscores
+from gpfs.rdmastore import RDMAStore, RDMASummary
+from gpfs.slowios import SlowestIOs
+from gpfs.timeline import IOWindow, build_timeline
+from gpfs.traceio import follow_lines, line_batches, node_name, open_trace, \
+    read_shard, trace_shards
+
+
+def _tree():
+    return defaultdict(_tree)
+
+def _format_pcts(pcts):
+    """p50: 0.0012, p90: ... for the PERCENTILES"""
+
+    return ', '.join(["p{0:g}: {1:.4f}".format(p, v)
+                        for p, v in zip(PERCENTILES, pcts)])
+
+def _parse_shard(task):
+    """Parses one shard of a trace report in a worker process and returns
+    the raw entries for the parent to merge, see TraceParser._merge_partial"""
+
+    filename, shard, filter_list, trace_start_epoch, options, export = task
+
+    parser = TraceParser(_tree(), False, **options)
+    parser.trace_start_epoch = trace_start_epoch
+    if export:
+        parser._collect_ios()
+    parser.iomatcher.partial = True
+    parser.rdmamatcher.partial = True
+    parser.brlmatcher.partial = True
+
+    if isinstance(shard, list):     # a batch of lines handed to us
+        lines = shard
+    else:
+        lines = read_shard(filename, shard)
+
+    past_end = parser._parse_lines(lines, parser._build_dispatch(filter_list))
+    partial = parser._partial_state()
+    partial['past_end'] = past_end
+    return partial
+
+def _parse_node(task):
+    """Parses the whole trace report of one node in a worker process and
+    returns what the parent needs, see TraceParser.parse_trace_dir"""
+
+    filename, filters, options, export = task
+
+    parser = TraceParser(_tree(), False, **options)
+    if export:
+        parser._collect_ios()
+    parser.parse_trace(filename, filters)
+
+    trace_ts = parser.tracelog.get('trace_ts', {})
+    trace_ts.pop('stats', None)
+    return {'node':         node_name(filename),
+            'start_epoch':  parser.trace_start_epoch,
+            'stop_epoch':   parser.trace_stop_epoch,
+            'iostore':      parser.iostore,
+            'orphan_ios':   parser.iomatcher.orphans,
+            'rdmastore':    parser.rdmastore,
+            'orphan_rdma':  parser.rdmamatcher.orphans,
+            'brlstats':     parser.brlstats,
+            'slowios':      parser.slowios,
+            'patterns':     parser.patterns,
+            'hotinodes':    parser.hotinodes,
+            'iocolumns':    parser.iocolumns,
+            'disks':        _plain(parser.tracelog['trace_io']['disks']),
+            'trace_ts':     trace_ts}
+
+def _format_depths(stats):
+    """The queue depths of a disk, see IOStore.queue_depths"""
+
+    return "Queued: {0:.2f} (max {1}), In_Service: {2:.2f} (max {3})".format(
+        stats['avg_queued'], stats['max_queued'], stats['avg_in_service'],
+        stats['max_in_service'])
+
+def _disk_class(stats):
+    """'data' for a disk most of whose IOs are data blocks, 'meta' for
+    the rest (inodes, indirect blocks, the log, ...)"""
+
+    return 'data' if stats['num_data_ios'] * 2 > stats['num_iops'] else 'meta'
+
+def _plain(d):
+    """defaultdict tree -> plain dicts"""
+
+    if isinstance(d, dict):
+        return dict((k, _plain(v)) for k, v in d.iteritems())
+    return d
 
 
 class TraceParser(object):
 
-    def __init__(self, tracelog, verbose):
+    def __init__(self, tracelog, verbose, summary_only=False, io_horizon=300.0,
+            size_buckets=SIZE_BUCKETS, latency_buckets=LATENCY_BUCKETS,
+            start=None, end=None, disks=None, nodes=None, top_ios=10,
+            top_inodes=10):
         self.tracelog = tracelog
         self._SECTOR_SIZE = 512
         self.verbose = verbose
 
-        # some regexes to filter out lines we don't want
-        self.IORegex = ['QIO:', 'SIO:', 'FIO:']
-        self.TSRegex = ['tscHandleMsgDirectly:', 'tscSendReply:', 'sendMessage',
-                        'tscSend:', 'tscHandleMsg:']
+        # what the workers need to be set up the same way. start/end are
+        #   trace times (secs), lines outside of them are dropped. disks
+        #   (disk numbers) and nodes (ips or names) are include lists, see
+        #   _build_dispatch. top_ios is how many of the slowest IOs (and
+        #   longest queue waits) are kept, top_inodes how many of the
+        #   busiest inodes are reported
+        self._options = {'summary_only': summary_only,
+                         'io_horizon': io_horizon,
+                         'size_buckets': list(size_buckets),
+                         'latency_buckets': list(latency_buckets),
+                         'start': start,
+                         'end': end,
+                         'disks': sorted(set(str(d) for d in disks))
+                                    if disks else None,
+                         'nodes': sorted(set(nodes)) if nodes else None,
+                         'top_ios': top_ios,
+                         'top_inodes': top_inodes}
+
+        # the IO triplets are matched up while parsing, and each finished
+        #   IO is kept in flat columns, or only in per disk running stats
+        #   in summary only mode
+        self.iomatcher = IOMatcher(io_horizon)
+        if summary_only:
+            self.iostore = IOSummary(self._SECTOR_SIZE, size_buckets,
+                                     latency_buckets)
+        else:
+            self.iostore = IOStore(self._SECTOR_SIZE)
+        self.iomatcher.consumers.append(self.iostore.add)
+
+        # the few slowest IOs are kept whole, in either mode
+        self.slowios = SlowestIOs(top_ios)
+        self.iomatcher.consumers.append(self.slowios.add)
+
+        # and sorted into sequential/strided/random, per disk and inode
+        self.patterns = AccessPatterns()
+        self.iomatcher.consumers.append(self.patterns.add)
+
+        # and the busiest inodes picked out of a sketch, however many
+        #   inodes the trace has
+        self.hotinodes = HotInodes(top_inodes, sector_size=self._SECTOR_SIZE)
+        self.iomatcher.consumers.append(self.hotinodes.add)
+
+        # the RDMA transfers go the same way, start -> completion
+        self.rdmamatcher = RDMAMatcher(io_horizon)
+        if summary_only:
+            self.rdmastore = RDMASummary()
+        else:
+            self.rdmastore = RDMAStore()
+        self.rdmamatcher.consumers.append(self.rdmastore.add)
+
+        # and the byte range lock line pairs, into per inode/node counters
+        self.brlmatcher = BRLMatcher(io_horizon)
+        self.brlstats = BRLStats()
+        self.brlmatcher.consumers.append(self.brlstats.add)
+
+        # the columnar export (a gpfs.columnar.ColumnWriter) and the IOs
+        #   waiting for it, see export_to
+        self.export = None
+        self.iocolumns = None
+
         self._FILTER_MAP = {
                         'io':   'TRACE_IO',
                         'rdma': 'TRACE_RDMA',
@@ -24,54 +181,83 @@ class TraceParser(object):
                         'brl':  'TRACE_BRL' 
         }
 
+        # dispatch table, keyed on the raw (trace class, op) fields of a
+        #   line, ex: ('TRACE_IO:', 'QIO:'). each line is split exactly once
+        #   and the fields are handed down to the handler
+        self._HANDLERS = {
+            'TRACE_IO': {
+                'QIO:':                     self._parse_io_qio,
+                'SIO:':                     self._parse_io_sio,
+                'FIO:':                     self._parse_io_fio,
+            },
+            'TRACE_TS': {
+                'tscHandleMsgDirectly:':    self._parse_ts_handle_msg_directly,
+                'tscSendReply:':            self._parse_ts_send_reply,
+                'sendMessage':              self._parse_ts_send_message,
+                'tscHandleMsg:':            self._parse_ts_handle_msg,
+                'tscSend:':                 self._parse_ts_send,
+            },
+            'TRACE_RDMA': {
+                'rdmaStart:':               self._parse_rdma_start,
+                'rdmaDone:':                self._parse_rdma_done,
+            },
+            'TRACE_BRL': {
+                'brlAcquire:':              self._parse_brl_acquire,
+                'brlGranted:':              self._parse_brl_granted,
+                'brlRevoke:':               self._parse_brl_revoke,
+                'brlRelease:':              self._parse_brl_release,
+            },
+        }
+
+        # the disknum:diskaddr field of the IO lines, and the node ip (and
+        #   nodename) fields of the TS/RDMA/BRL lines to/from another node,
+        #   for the include lists
+        self._DISK_FIELDS = {
+            ('TRACE_IO', 'QIO:'):                   17,
+            ('TRACE_IO', 'SIO:'):                   12,
+            ('TRACE_IO', 'FIO:'):                   17,
+        }
+        self._NODE_FIELDS = {
+            ('TRACE_TS', 'sendMessage'):            (6, 7),
+            ('TRACE_TS', 'tscHandleMsg:'):          (14, None),
+            ('TRACE_TS', 'tscHandleMsgDirectly:'):  (14, None),
+            ('TRACE_RDMA', 'rdmaStart:'):           (8, None),
+            ('TRACE_RDMA', 'rdmaDone:'):            (8, None),
+            ('TRACE_BRL', 'brlAcquire:'):           (11, None),
+            ('TRACE_BRL', 'brlGranted:'):           (11, None),
+            ('TRACE_BRL', 'brlRevoke:'):            (11, None),
+            ('TRACE_BRL', 'brlRelease:'):           (11, None),
+        }
+
     def _assemble_io_stats(self):
-        """Takes raw tracelog dict and computes disk stats"""
+        """Takes the IO store and computes disk stats"""
 
-        for v in self.tracelog['trace_io'].values():
+        # whatever is still in flight never finished
+        self.iomatcher.finish()
+        self.tracelog['trace_io']['stats']['orphan_ios'] = self.iomatcher.orphans
 
-            # some of the traces triplets don't contain 'fio'
-            #   if so, don't bother looking at this...
-            if not 'fio' in v:
-                continue
-                        
-            # the disk data was read/written to
-            try:
-                disk = int(v['fio']['disknum'])
-                v['iosize'] = v['fio']['nSectors'] * self._SECTOR_SIZE
-            except TypeError as te:
-                print "Type error: {0}".format(te)
-                print v
-
-            # some of the client logs don't have QIO/SIO for certain things
-            #   like log writes, so check for those...
-            if 'sio' in v and \
-                    'fio' in v:
-                v['iotime'] = v['fio']['tracetime'] - \
-                                v['sio']['tracetime']
-                self.tracelog['trace_io']['disks'][disk]['iotimes'].setdefault(disk, []).append(
-                        float(v['iotime']))
-
-            # figure out how long the IO was queued...
-            if 'qio' in v and \
-                    'sio' in v:
-                io_time_in_queue = v['sio']['tracetime'] - \
-                                   v['qio']['tracetime']
-                v['time_in_queue'] = io_time_in_queue
-
-                # get the start time in epoch, since we now have the finish time (epoch)
-                #   and the duration of the IO
-                io_start_time = v['sio']['tracetime'] + self.trace_start_epoch
-                io_queued_time = v['qio']['tracetime'] + self.trace_start_epoch
-                v['sio']['start_time'] = io_start_time
-                v['qio']['queued_time'] = io_queued_time
-
-            # increment the disks bucket per FIO
-            try:
-                self.tracelog['trace_io']['disks'][disk]['iosizes'].setdefault(
-                        disk, []).append(int(v['iosize']))
-            except TypeError as te:
-                print "Type error: {0}".format(te)
+        for disk, stats in self.iostore.disk_stats().iteritems():
+            # these only happen when the "write logData" operation
+            #   the problem is that the PID changes on the FIO of a triplet,
+            #   so the unique ID "disknum:diskaddr:pid" changes
+            if not stats.pop('num_times'):
                 continue
+            self.tracelog['trace_io']['disks'][disk]['stats'].update(stats)
+
+        # io times (fio - sio) and queue times (sio - qio)
+        disks = self.tracelog['trace_io']['disks']
+        for disk, pcts in self.iostore.latency_percentiles(PERCENTILES).iteritems():
+            if disk in disks:
+                disks[disk]['stats']['io_tm_pcts'] = pcts
+        for disk, pcts in self.iostore.queue_percentiles(PERCENTILES).iteritems():
+            if disk in disks:
+                disks[disk]['stats']['qu_tm_pcts'] = pcts
+
+        # how many IOs were waiting and in service at once, needs every IO
+        if isinstance(self.iostore, IOStore):
+            for disk, depths in self.iostore.queue_depths().iteritems():
+                if disk in disks:
+                    disks[disk]['stats'].update(depths)
 
         total_bytes = 0
         total_iops = 0
@@ -81,39 +267,18 @@ class TraceParser(object):
         avg_long_io_tm_meta = []
         avg_bucket_data = []
         avg_bucket_meta = []
+        classes = {}
 
 
-        # calculate the average time per iop per disk and average io size
+        # split the disks into data and metadata disks
         for k, v in self.tracelog['trace_io']['disks'].iteritems():
 
-            try:
-                num_iops = len(v['iosizes'][k])
-                total_io_bytes = sum(v['iosizes'][k])
-                total_io_time = sum(v['iotimes'][k])
-                average_io_size = total_io_bytes / len(v['iosizes'][k])
-                average_io_time = total_io_time / len(v['iotimes'][k])
-
-                v['stats']['avg_io_tm'] = average_io_time
-                v['stats']['avg_io_sz'] = average_io_size
-                v['stats']['total_bytes_io'] = total_io_bytes
-                v['stats']['total_time_io'] = total_io_time
-                v['stats']['longest_io'] = max(v['iotimes'][k])
-                v['stats']['num_iops'] = num_iops
-            except ZeroDivisionError as zde:
-                #print "Zero Division error: {0}".format(zde)
-                # these only happen when the "write logData" operation
-                #   the problem is that the PID changes on the FIO of a triplet,
-                #   so the unique ID "disknum:diskaddr:pid" changes
-                continue
-            except ValueError as ve:
-                print "Value error: {0}".format(ve)
-                continue
-
-            if v['stats']['avg_io_sz'] > 1048576: 
+            v['stats']['class'] = classes[k] = _disk_class(v['stats'])
+            if classes[k] == 'data':
                 avg_io_tm_data.append(v['stats']['avg_io_tm'])
                 avg_long_io_tm_data.append(v['stats']['longest_io'])
                 avg_bucket_data.append(v['stats']['avg_io_tm'])
-            else:   # metadata disks most likely, fix later...
+            else:
                 avg_io_tm_meta.append(v['stats']['avg_io_tm'])
                 avg_long_io_tm_meta.append(v['stats']['longest_io'])
                 avg_bucket_meta.append(v['stats']['avg_io_tm'])
@@ -123,10 +288,19 @@ class TraceParser(object):
             total_iops += v['stats']['num_iops']
 
         # compute the standard deviations and then set those k, v pairs
-        std_dev_avg_io_tm_data, data_var = stddev(avg_io_tm_data)[0:2]
-        std_dev_avg_io_tm_meta, meta_var = stddev(avg_io_tm_meta)[0:2]
-        avg_io_tm_data = sum(avg_bucket_data) / len(avg_bucket_data)
-        avg_io_tm_meta = sum(avg_bucket_meta) / len(avg_bucket_meta)
+        #   a trace might not have any data (or metadata) disks in it
+        std_dev_avg_io_tm_data, data_var = 0.0, 0.0
+        std_dev_avg_io_tm_meta, meta_var = 0.0, 0.0
+        if avg_io_tm_data:
+            std_dev_avg_io_tm_data, data_var = stddev(avg_io_tm_data)[0:2]
+            avg_io_tm_data = math.fsum(avg_bucket_data) / len(avg_bucket_data)
+        else:
+            avg_io_tm_data = 0.0
+        if avg_io_tm_meta:
+            std_dev_avg_io_tm_meta, meta_var = stddev(avg_io_tm_meta)[0:2]
+            avg_io_tm_meta = math.fsum(avg_bucket_meta) / len(avg_bucket_meta)
+        else:
+            avg_io_tm_meta = 0.0
 
         self.tracelog['trace_io']['stats']['avg_io_tm_data'] = avg_io_tm_data
         self.tracelog['trace_io']['stats']['avg_io_tm_meta'] = avg_io_tm_meta
@@ -137,6 +311,136 @@ class TraceParser(object):
         self.tracelog['trace_io']['stats']['total_bytes'] = total_bytes
         self.tracelog['trace_io']['stats']['total_iops'] = total_iops
 
+        # the tail of the io and queue times, over all the IOs of each
+        #   class of disk
+        nan = [float('nan')] * len(PERCENTILES)
+        pcts = self.iostore.latency_percentiles(PERCENTILES, classes)
+        self.tracelog['trace_io']['stats']['io_tm_pcts_data'] = pcts.get('data', nan)
+        self.tracelog['trace_io']['stats']['io_tm_pcts_meta'] = pcts.get('meta', nan)
+        pcts = self.iostore.queue_percentiles(PERCENTILES, classes)
+        self.tracelog['trace_io']['stats']['qu_tm_pcts_data'] = pcts.get('data', nan)
+        self.tracelog['trace_io']['stats']['qu_tm_pcts_meta'] = pcts.get('meta', nan)
+
+        self._score_disks()
+        self._assemble_slow_ios()
+
+        # the access pattern mix of each disk, and the worst inodes
+        self.patterns.finish()
+        for disk, stats in self.patterns.disk_stats(self._SECTOR_SIZE).iteritems():
+            if disk in disks:
+                disks[disk]['stats']['patterns'] = stats
+        self.tracelog['trace_io']['stats']['random_inodes'] = \
+            self.patterns.inode_stats()
+
+        # the busiest inodes by each metric, estimates within the bounds
+        self.tracelog['trace_io']['stats']['top_inodes'] = dict(
+            (m, self.hotinodes.top_inodes(m)) for m in METRICS)
+        self.tracelog['trace_io']['stats']['top_inodes_error'] = \
+            self.hotinodes.error_bounds()
+
+        return
+
+    def _score_disks(self):
+        """Scores how slow each disk is against the other disks of its
+        class, on its average io time and on its p99 io time (the
+        percentile of percentiles), with robust_zscores. The disk score
+        is the worst of the two, the disks are ranked on it."""
+
+        disks = self.tracelog['trace_io']['disks']
+        keys = sorted(disks)
+        if not keys:
+            self.tracelog['trace_io']['stats']['ranked_disks'] = []
+            return
+        p99 = PERCENTILES.index(99.0)
+        nan = float('nan')
+        classes = np.array([disks[k]['stats']['class'] == 'data'
+                                for k in keys])
+        avg = np.array([disks[k]['stats']['avg_io_tm'] for k in keys],
+                       dtype=np.float64)
+        tail = np.array([disks[k]['stats'].get('io_tm_pcts',
+                                                  [nan] * len(PERCENTILES))[p99]
+                            for k in keys], dtype=np.float64)
+
+        z_avg = robust_zscores(classes, avg)
+        z_tail = robust_zscores(classes, tail)
+        scores = np.fmax(z_avg, z_tail)
+        for i, k in enumerate(keys):
+            disks[k]['stats']['zscore_avg'] = float(z_avg[i])
+            disks[k]['stats']['zscore_p99'] = float(z_tail[i])
+            disks[k]['stats']['score'] = float(scores[i])
+        ranked = np.argsort(-np.nan_to_num(scores), kind='mergesort')
+        self.tracelog['trace_io']['stats']['ranked_disks'] = \
+            [keys[i] for i in ranked]
+
+    def _assemble_slow_ios(self):
+        """Puts the slowest IOs and the longest queue waits, with what
+        the trace says about them, in the trace_io stats"""
+
+        def entry(elapsed, r):
+            return {'elapsed':      elapsed,
+                    'disk':         r.disknum,
+                    'diskaddr':     r.diskaddr,
+                    'pid':          r.pid,
+                    'optype':       r.optype,
+                    'nsd_id':       r.diskid,
+                    'tags':         (r.inode, r.block),
+                    'io_sz':        r.nsectors * self._SECTOR_SIZE,
+                    'qio_epoch':    self.trace_start_epoch + r.qio_time,
+                    'sio_epoch':    self.trace_start_epoch + r.sio_time,
+                    'fio_epoch':    self.trace_start_epoch + r.fio_time}
+
+        stats = self.tracelog['trace_io']['stats']
+        stats['slowest_ios'] = [entry(e, r) for e, r in self.slowios.slowest()]
+        stats['longest_queue_waits'] = [entry(e, r) for e, r in
+                                            self.slowios.longest_waits()]
+
+    def _assemble_rdma_stats(self):
+        """Takes the RDMA store and computes per peer stats"""
+
+        # whatever is still in flight never completed
+        self.rdmamatcher.finish()
+        traceref = self.tracelog['trace_rdma']
+        traceref['stats']['orphan_rdma'] = self.rdmamatcher.orphans
+
+        start, peers, counts = self.rdmastore.throughput(1.0)
+        peak = dict(zip(peers, counts.max(axis=1))) if counts.size else {}
+        pcts = self.rdmastore.latency_percentiles(PERCENTILES)
+
+        total_bytes = 0
+        total_ops = 0
+        for peer, stats in self.rdmastore.peer_stats().iteritems():
+            stats['peak_bytes_sec'] = int(peak.get(peer, 0))
+            if peer in pcts:
+                stats['lat_pcts'] = pcts[peer]
+            traceref['peers'][peer]['stats'].update(stats)
+            total_bytes += stats['total_bytes']
+            total_ops += stats['num_ops']
+
+        traceref['stats']['total_bytes'] = total_bytes
+        traceref['stats']['total_ops'] = total_ops
+
+        return
+
+    def _assemble_brl_stats(self, top=10):
+        """Takes the byte range lock counters and computes per node stats
+        and the most contended inodes"""
+
+        # forget the locks still held (or asked for) at the end
+        self.brlmatcher.finish()
+        traceref = self.tracelog['trace_brl']
+
+        for node, stats in self.brlstats.node_stats().iteritems():
+            traceref['nodes'][node]['stats'].update(stats)
+        traceref['stats']['contended'] = self.brlstats.contended(top)
+        traceref['stats']['total_acquires'] = sum(
+            i.acquires for i in self.brlstats.inodes.itervalues())
+        traceref['stats']['total_revokes'] = sum(
+            i.revokes for i in self.brlstats.inodes.itervalues())
+        # an inode dropped and seen again counts twice
+        inodes = self.brlstats.inodes
+        traceref['stats']['num_inodes'] = len(inodes) - (None in inodes) + \
+            self.brlstats.dropped
+
         return
 
     def _assemble_ts_stats(self):
@@ -194,8 +498,131 @@ class TraceParser(object):
                 except Exception as e:
                     print "Exception in 'sent', '{0}'".format(e)
                     continue
+
+        self._assemble_rpc_stats()
         return
 
+    def _assemble_rpc_stats(self):
+        """Matches the messages we sent with their replies on the msg_id
+        and computes the round trip times, per message type and per node
+        the message was sent to"""
+
+        traceref = self.tracelog['trace_ts']
+
+        # the sends and the replies, keyed on the msg_id (oid[0])
+        send_ids, send_pids, send_times, msgs, nodes = [], [], array('d'), \
+            [], []
+        reply_ids, reply_times = [], array('d')
+        for oid, v in traceref.iteritems():
+            if oid in ('stats', 'nodetable'):
+                continue
+            if 'reply' in v:
+                reply_ids.append(oid[0])
+                reply_times.append(v['reply']['tracetime'])
+            send = v.get('tscSend')
+            if 'sendMessage' in v and send and 'tracetime' in send:
+                send_ids.append(oid[0])
+                send_pids.append(oid[1])
+                send_times.append(send['tracetime'])
+                msgs.append(send['msg'])
+                nodes.append(v['sendMessage']['node_ip'])
+            # else a reply we sent, nothing comes back for those
+        if not send_ids:
+            return
+
+        # the ids get reused over a trace, so put all the sends and replies
+        #   of an id in time order: a send is answered by the reply right
+        #   after it, if the id isn't sent again first
+        num_sends = len(send_ids)
+        ids = np.unique(np.array(send_ids + reply_ids), return_inverse=True)[1]
+        times = np.append(np.frombuffer(send_times, dtype='d'),
+                          np.frombuffer(reply_times, dtype='d')
+                            if reply_times else [])
+        kind = np.arange(len(ids)) >= num_sends    # True for the replies
+        order = np.lexsort((kind, times, ids))
+        ids, times, kind = ids[order], times[order], kind[order]
+
+        answered = np.zeros(len(ids), dtype=bool)
+        answered[:-1] = ~kind[:-1] & kind[1:] & (ids[1:] == ids[:-1])
+        unanswered = ~kind & ~answered
+        rtts = (times[1:] - times[:-1])[answered[:-1]]
+
+        msg_names, msg_codes = np.unique(np.array(msgs), return_inverse=True)
+        node_names, node_codes = np.unique(np.array(nodes),
+                                           return_inverse=True)
+        msg_names = [str(m) for m in msg_names]
+        node_names = [str(n) for n in node_names]
+
+        by_msg = self._rpc_group_stats(msg_codes[order[answered]], msg_names,
+                                       rtts)
+        no_reply = np.bincount(msg_codes[order[unanswered]],
+                               minlength=len(msg_names))
+        for i, msg in enumerate(msg_names):
+            stats = traceref['stats']['rpc_msgs'][msg]
+            stats.update(by_msg.get(msg, {'replies': 0}))
+            stats['no_reply'] = int(no_reply[i])
+        for node, stats in self._rpc_group_stats(node_codes[order[answered]],
+                node_names, rtts).iteritems():
+            traceref['stats']['rpc_nodes'][node].update(stats)
+
+        if self.export is not None:
+            sends = order[answered]
+            self._export_rpcs(np.array(send_ids)[sends],
+                              np.array(send_pids)[sends],
+                              np.array(msgs)[sends], np.array(nodes)[sends],
+                              times[answered], rtts)
+
+    def _export_rpcs(self, ids, pids, msgs, dests, send_times, rtts):
+        """Writes the matched RPCs to the export, a row each. In a
+        directory parse the ids are node/msg_id and the times are on the
+        clock of the report of that node"""
+
+        node, sep, ids = np.char.rpartition(ids, '/').T
+        names, codes = np.unique(node, return_inverse=True)
+        reports = self.tracelog.get('nodes', {})
+        starts = np.array([reports[n]['start_epoch'] if n in reports
+                                else self.trace_start_epoch for n in names],
+                          dtype=np.float64)[codes]
+        for first in range(0, len(ids), self.export.batch_size):
+            batch = slice(first, first + self.export.batch_size)
+            self.export.write('rpcs', {
+                'node':         node[batch],
+                'msg_id':       ids[batch],
+                'pid':          pids[batch].astype(np.int32),
+                'msg':          msgs[batch],
+                'dest':         dests[batch],
+                'send_epoch':   starts[batch] + send_times[batch],
+                'reply_epoch':  starts[batch] + send_times[batch] +
+                                    rtts[batch],
+                'rtt':          rtts[batch]})
+
+    def _rpc_group_stats(self, codes, names, rtts):
+        """Round trip time stats of each group (message type, node)"""
+
+        if not len(rtts):
+            return {}
+        buckets = self._options['latency_buckets']
+        num = np.bincount(codes, minlength=len(names))
+        total = np.bincount(codes, weights=rtts, minlength=len(names))
+        longest = np.empty(len(names))
+        longest.fill(-np.inf)
+        np.maximum.at(longest, codes, rtts)
+        hists = bucket_counts(codes, len(names), rtts, buckets)
+        pcts = group_percentiles(codes, rtts, PERCENTILES)
+
+        stats = {}
+        for i, name in enumerate(names):
+            if not num[i]:
+                continue
+            stats[name] = {
+                'replies':      int(num[i]),
+                'avg_rtt':      total[i] / num[i],
+                'longest_rtt':  float(longest[i]),
+                'rtt_pcts':     pcts[i],
+                'rtt_hist':     list(hists[i]),
+            }
+        return stats
+
     def _lookup_node_name(self, node):
         """Attempts to use the nodetable to find the hostname..."""
 
@@ -204,239 +631,651 @@ class TraceParser(object):
         else:
             return node     # just return the IP
 
-    def _parse_io_trace(self, line):
-        """Parses lines with TRACE_IO"""
-
-        op = line.split()[3].strip(':')
-        pid = line.split()[1]
-        l = line.split()
-        traceref = self.tracelog['trace_io']
+    def _parse_io_qio(self, l):
+        """Parses TRACE_IO QIO (queued) lines, l is the split line"""
 
         # we will figure out the OID of the IO operation based on the
         #   disknum:diskaddr address, since that's the only thing that is
         #   the same between the 3 lines of an IO operation, queued (QIO),
-        #   starting (SIO), finished (FIO)
-
-        # the line formats vary, sigh...
-        if op == 'QIO':
-            #oid = l[17]
-            oid = l[17] + ":" + pid
-            traceref[oid]['qio']['pid'] = pid
-            traceref[oid]['qio']['tracetime'] = float(l[0])
-            #traceref[oid]['qio']['diskid'] = l[15]
-            traceref[oid]['qio']['disknum'] = l[17].split(':')[0]
-            traceref[oid]['qio']['diskaddr'] = l[17].split(':')[1]
-            traceref[oid]['qio']['optype'] = ' '.join(l[4:6])
-            traceref[oid]['qio']['nSectors'] = int(l[19])
-            traceref[oid]['qio']['align'] = l[21]
-            #traceref[oid]['qio']['line'] = line
-
-            # get the IO tags
-            traceref[oid]['qio']['tags'] = (l[7:9])
-
-        elif op == 'SIO':
-            #oid = l[12]
-            oid = l[12] + ":" + pid
-            traceref[oid]['sio']['tracetime'] = float(l[0])
-            traceref[oid]['sio']['pid'] = pid
-            traceref[oid]['sio']['diskid'] = l[10]
-            traceref[oid]['sio']['disknum'] = l[12].split(':')[0]
-            traceref[oid]['sio']['diskaddr'] = l[12].split(':')[1]
-            traceref[oid]['sio']['nSectors'] = int(l[14])
-            #traceref[oid]['sio']['line'] = line
-
-        elif op == 'FIO':
-            #oid = l[17]
-            oid = l[17] + ":" + pid
-            traceref[oid]['fio']['tracetime'] = float(l[0])
-            traceref[oid]['fio']['pid'] = pid
-            traceref[oid]['fio']['diskid'] = l[15]
-            traceref[oid]['fio']['disknum'] = l[17].split(':')[0]
-            traceref[oid]['fio']['diskaddr'] = l[17].split(':')[1]
-            traceref[oid]['fio']['optype'] = ' '.join(l[4:6])
-            traceref[oid]['fio']['nSectors'] = int(l[19])
-            traceref[oid]['fio']['finish_time'] = self.trace_start_epoch + \
-                traceref[oid]['fio']['tracetime']
-            #traceref[oid]['fio']['line'] = line
-
-            # get the IO tags
-            traceref[oid]['fio']['tags'] = (l[7:9])
+        #   starting (SIO), finished (FIO). the (disknum:diskaddr, pid)
+        #   tuple only points at the fields of the line, no new string
+        self.iomatcher.add_qio((l[17], l[1]), float(l[0]))
+
+    def _parse_io_sio(self, l):
+        """Parses TRACE_IO SIO (started) lines, l is the split line"""
+
+        self.iomatcher.add_sio((l[12], l[1]), float(l[0]))
+
+    def _parse_io_fio(self, l):
+        """Parses TRACE_IO FIO (finished) lines, l is the split line"""
+
+        pid = l[1]
+        da = l[17]
+        disknum, diskaddr = da.split(':')
+        self.iomatcher.add_fio((da, pid), float(l[0]), int(disknum),
+                int(diskaddr), int(pid), l[15], l[4] + ' ' + l[5],
+                int(l[19]), int(l[7]), int(l[8]))
+
+    def _parse_ts_handle_msg_directly(self, l):
+        """Parses TRACE_TS tscHandleMsgDirectly lines"""
+
+        msg = intern(l[7].strip('\'').strip('\','))
+        msg_id = l[9].strip(',')
+
+        # the reply to a message we sent, matched up with the send on the
+        #   msg_id in _assemble_rpc_stats
+        if msg == 'reply':
+            ref = self.tracelog['trace_ts'][(msg_id, intern(l[1]))]['reply']
+            ref['tracetime'] = float(l[0])
+            ref['msg_id'] = msg_id
+            ref['node_ip'] = intern(l[14])
+            return
 
-        return
+        ref = self.tracelog['trace_ts'][(msg_id, intern(l[1]))]['tscHandleMsgDirectly']
+        ref['tracetime'] = float(l[0])
+        ref['msg'] = msg
+        ref['msg_id'] = msg_id
+        ref['len'] = intern(l[11])
+        ref['node_ip'] = intern(l[14])
+
+    def _parse_ts_send_reply(self, l):
+        """Parses TRACE_TS tscSendReply lines"""
 
-    def _parse_ts_trace(self, line):
-        """Parses lines with TRACE_TS"""
+        msg_id = l[9].strip(',')
+        ref = self.tracelog['trace_ts'][(msg_id, intern(l[1]))]['tscSendReply']
+        ref['tracetime'] = float(l[0])
+        ref['msg'] = intern(l[7].strip('\'').strip('\','))
+        ref['msg_id'] = msg_id
 
-        op = line.split()[3].strip(':')
-        pid = line.split()[1]
-        l = line.split()
+    def _parse_ts_send_message(self, l):
+        """Parses TRACE_TS sendMessage lines"""
 
-        # make nested dictionary traceref...
         traceref = self.tracelog['trace_ts']
+        msg_id = l[9].strip(',')
+        node_ip = intern(l[6])
+        nodename = intern(l[7].strip(':'))
+        ref = traceref[(msg_id, intern(l[1]))]['sendMessage']
+        ref['tracetime'] = float(l[0])
+        ref['node_ip'] = node_ip
+        ref['nodename'] = nodename
+        ref['msg_id'] = msg_id
+
+        # as a bonus, try to build an ip -> nodename table
+        if not node_ip in traceref['nodetable']:
+            traceref['nodetable'][node_ip] = nodename
+
+    def _parse_ts_handle_msg(self, l):
+        """Parses TRACE_TS tscHandleMsg lines"""
+
+        msg_id = l[9].strip(',')
+        ref = self.tracelog['trace_ts'][(msg_id, intern(l[1]))]['tscHandleMsg']
+        ref['tracetime'] = float(l[0])
+        ref['msg'] = intern(l[7].strip('\'').strip('\','))
+        ref['msg_id'] = msg_id
+        ref['len'] = l[9]
+        ref['node_id'] = intern(l[13])
+        ref['node_ip'] = intern(l[14])
+
+    def _parse_ts_send(self, l):
+        """Parses TRACE_TS tscSend lines"""
+
+        if 'rc' in l:   # useless line, "rc = 0x..."
+            return
 
-        if op == 'tscHandleMsgDirectly':
-            # we don't want the reply messages for now...
-            if l[7].strip('\'').strip('\',') == 'reply':
-                return
-
-            msg_id = l[9].strip(',')
-            oid = msg_id + ':' + pid
-            traceref[oid][op]['tracetime'] = float(l[0])
-            #traceref[oid][op]['pid'] = pid
-            traceref[oid][op]['msg'] = l[7].strip('\'').strip('\',')
-            traceref[oid][op]['msg_id'] = msg_id
-            traceref[oid][op]['len'] = l[11]
-            #traceref[oid][op]['node_id'] = l[13]
-            traceref[oid][op]['node_ip'] = l[14]
-            #traceref[oid][op]['line'] = line
-
-        elif op == 'tscSendReply':
-            msg_id = l[9].strip(',')
-            oid = msg_id + ':' + pid
-            traceref[oid][op]['tracetime'] = float(l[0])
-            #traceref[oid][op]['pid'] = pid
-            traceref[oid][op]['msg'] = l[7].strip('\'').strip('\',')
-            traceref[oid][op]['msg_id'] = msg_id
-            #traceref[oid][op]['replyLen'] = l[11]
-            #traceref[oid][op]['line'] = line
-
-        elif op == 'sendMessage':
-            msg_id = l[9].strip(',')
-            oid = msg_id + ':' + pid
-            traceref[oid][op]['tracetime'] = float(l[0])
-            #traceref[oid][op]['pid'] = pid
-            #traceref[oid][op]['node_id'] = l[5]
-            traceref[oid][op]['node_ip'] = l[6]
-            traceref[oid][op]['nodename'] = l[7].strip(':')
-            traceref[oid][op]['msg_id'] = msg_id
-            #traceref[oid][op]['type'] = l[11]
-            #traceref[oid][op]['tagP'] = l[13]
-            #traceref[oid][op]['seq'] = l[15]
-            #traceref[oid][op]['state'] = l[17]
-            #traceref[oid][op]['line'] = line
-
-            # as a bonus, try to build an ip -> nodename table
-            if not l[6] in traceref['nodetable']:
-                traceref['nodetable'][l[6]] = l[7].strip(':')
-
-        elif op =='tscHandleMsg':
-            msg_id = l[9].strip(',')
-            oid = msg_id + ':' + pid
-            traceref[oid][op]['tracetime'] = float(l[0])
-            #traceref[oid][op]['pid'] = pid
-            traceref[oid][op]['msg'] = l[7].strip('\'').strip('\',')
-            traceref[oid][op]['msg_id'] = msg_id
-            traceref[oid][op]['len'] = l[9]
-            traceref[oid][op]['node_id'] = l[13]
-            traceref[oid][op]['node_ip'] = l[14]
-            #traceref[oid][op]['line'] = line
-
-        elif op == 'tscSend':
-            if "rc = 0x" in line:  # useless line
-                return
-            oid = l[13] + ':' + pid
-            traceref[oid][op]['tracetime'] = float(l[0])
-            #traceref[oid][op]['pid'] = pid
-            traceref[oid][op]['msg'] = l[7].strip('\'').strip('\',')
-            #traceref[oid][op]['n_dest'] = l[9]
-            #traceref[oid][op]['data_len'] = l[11]
-            traceref[oid][op]['msg_id'] = l[13]
-            #traceref[oid][op]['msg_buf'] = l[15]
-            #traceref[oid][op]['mr'] = l[17]
+        ref = self.tracelog['trace_ts'][(l[13], intern(l[1]))]['tscSend']
+        ref['tracetime'] = float(l[0])
+        ref['msg'] = intern(l[7].strip('\'').strip('\','))
+        ref['msg_id'] = l[13]
 
-        else:
-            # do nothing
-            return
-        
-        return
+    def _parse_rdma_start(self, l):
+        """Parses TRACE_RDMA rdmaStart lines (a read/write posted), ex:
+        rdmaStart: read tag 1234 peer 10.0.0.5 len 1048576 conn 3"""
 
-    def _populate_buckets(self, bucket_list, value):
-        """
-        Takes a list of buckets (ints), and a value, and returns a key for
-        which bucket the value resides in...
-        """
-        from bisect import bisect
-        i = bisect(bucket_list, value)
-        return i
+        self.rdmamatcher.add_start((l[6], l[8]), float(l[0]))
 
-    # Public methods
-    #
-    #
-    def parse_trace(self, filename, filters=None):
+    def _parse_rdma_done(self, l):
+        """Parses TRACE_RDMA rdmaDone lines (a read/write completed), ex:
+        rdmaDone: read tag 1234 peer 10.0.0.5 len 1048576 status 0"""
+
+        peer = intern(l[8])
+        self.rdmamatcher.add_done((l[6], peer), float(l[0]), peer,
+                intern(l[4]), int(l[10]), int(l[12]))
+
+    def _parse_brl_acquire(self, l):
+        """Parses TRACE_BRL brlAcquire lines (a node asks for a lock), ex:
+        brlAcquire: inode 12345 range 0-1048575 mode xw node 10.0.0.3"""
+
+        inode, lockrange, node = int(l[5]), l[7], intern(l[11])
+        self.brlstats.acquire(inode, node)
+        self.brlmatcher.add_start(('wait', inode, lockrange, node),
+                                  float(l[0]))
+
+    def _parse_brl_granted(self, l):
+        """Parses TRACE_BRL brlGranted lines (a node got its lock)"""
+
+        inode, lockrange, node = int(l[5]), l[7], intern(l[11])
+        tracetime = float(l[0])
+        self.brlmatcher.add_done(('wait', inode, lockrange, node), tracetime)
+        self.brlmatcher.add_start(('hold', inode, lockrange, node), tracetime)
+
+    def _parse_brl_revoke(self, l):
+        """Parses TRACE_BRL brlRevoke lines (a lock is taken back from a
+        node, someone else wants the range)"""
+
+        inode, lockrange, node = int(l[5]), l[7], intern(l[11])
+        self.brlstats.revoke(inode, node)
+        self.brlmatcher.add_start(('revoke', inode, lockrange, node),
+                                  float(l[0]))
+
+    def _parse_brl_release(self, l):
+        """Parses TRACE_BRL brlRelease lines (a node gave its lock up)"""
+
+        inode, lockrange, node = int(l[5]), l[7], intern(l[11])
+        tracetime = float(l[0])
+        self.brlmatcher.add_done(('hold', inode, lockrange, node), tracetime)
+        self.brlmatcher.add_done(('revoke', inode, lockrange, node), tracetime)
+
+    def _parse_trace_date(self, ld):
+        """Takes the split date fields of a trace header line,
+        ex: ['Wed', 'Feb', '26', '16:43:41', '2014'], returns epoch time"""
+
+        datearg = "{0}-{1}-{2} {3}".format(ld[-1], ld[1], ld[2], ld[3])
+        return int(datetime.datetime.strptime(
+                    datearg, '%Y-%b-%d %H:%M:%S').strftime('%s'))
+
+    def _parse_header(self, f):
+        """Reads the 8 header lines of a trace report, sets the start
+        and stop epochs from the first two"""
+
+        self._parse_header_lines([f.readline() for i in range(8)])
+
+    def _parse_header_lines(self, header):
+        """Sets the start and stop epochs from the header lines, lines
+        3-8 are skipped. shameful to say the least..."""
+
+        # grab the date from the first line to use it later...
+        self.trace_start_epoch = self._parse_trace_date(header[0].split()[2:])
+        self.tracelog['start_epoch'] = self.trace_start_epoch
+
+        self.trace_stop_epoch = self._parse_trace_date(header[1].split()[3:])
+        self.tracelog['stop_epoch'] = self.trace_stop_epoch
+
+    def _filter_list(self, filters):
+        """Returns the trace classes of a comma separated list of filters,
+        exits on an unknown filter"""
 
         try:
-            # create a filter list
-            filter_list = [self._FILTER_MAP[i] for i in filters.split(',')]
+            return [self._FILTER_MAP[i] for i in filters.split(',')]
         except KeyError as ke:
             print "Error, filter ({0}) is not a valid filter.".format(ke)
             print "Please use the following filters: {0}".format(
                     self._FILTER_MAP.keys())
             sys.exit(1)
 
-        skip = 0
-        trace_start = 0
+    def _assemble_stats(self, filters):
+        """Assembles the stats for the enabled filters"""
+
+        self._flush_ios(True)
+        if 'io' in filters.split(','):
+            self._assemble_io_stats()
+        if 'ts' in filters.split(','):
+            self._assemble_ts_stats()
+        if 'rdma' in filters.split(','):
+            self._assemble_rdma_stats()
+        if 'brl' in filters.split(','):
+            self._assemble_brl_stats()
+
+    def _build_dispatch(self, filter_list):
+        """Returns the handler table for the enabled trace classes, keyed
+        on the (trace class, op) fields exactly as they appear in a line.
+
+        With a disks include list the IO handlers only get the lines of
+        those disks. With a nodes include list the TS lines to or from
+        another node only get through for the listed ones, matched on the
+        ip, or on the name through the ip -> nodename table built from the
+        sendMessage lines (so a name only matches once a message was sent
+        to that node, in the part of the trace a worker has seen). The TS
+        lines without a node (ex: tscSend) are
+        kept, they only count along with a line that has one.
+        """
+
+        disks = self._options['disks']
+        nodes = self._options['nodes']
+        dispatch = {}
+        for tclass in filter_list:
+            for op, handler in self._HANDLERS.get(tclass, {}).iteritems():
+                if disks and (tclass, op) in self._DISK_FIELDS:
+                    handler = self._only_disks(handler,
+                            self._DISK_FIELDS[(tclass, op)], set(disks))
+                elif nodes and (tclass, op) in self._NODE_FIELDS:
+                    handler = self._only_nodes(handler,
+                            self._NODE_FIELDS[(tclass, op)], set(nodes))
+                dispatch[(tclass + ':', op)] = handler
+        return dispatch
+
+    def _only_disks(self, handler, field, disks):
+        """Wraps a handler to skip the lines of the disks not in disks,
+        field is the disknum:diskaddr field of the line"""
+
+        def handle(l):
+            if l[field].split(':', 1)[0] in disks:
+                handler(l)
+        return handle
+
+    def _only_nodes(self, handler, fields, nodes):
+        """Wraps a handler to skip the lines of the nodes not in nodes,
+        fields are the node ip and nodename (or None) fields of the line"""
+
+        nodetable = self.tracelog['trace_ts']['nodetable']
+        ip_field, name_field = fields
+
+        def handle(l):
+            ip = l[ip_field]
+            if ip in nodes or nodetable.get(ip) in nodes or \
+                    (name_field and l[name_field].strip(':') in nodes):
+                handler(l)
+        return handle
+
+    def _parse_lines(self, lines, dispatch):
+        """Tokenizes each line once and hands the fields to its handler.
+
+        The lines without any of the trace classes of the dispatch table
+        are dropped on a substring search, before they're split, and the
+        ones outside of the start/end trace times are dropped before they
+        get to their handler. Returns True once a line is past the end,
+        the lines of a trace report are in time order so there is nothing
+        left to parse.
+        """
+
+        self._flush_ios()
+        get = dispatch.get
+        needles = tuple(set(tclass for tclass, op in dispatch))
+        start = self._options['start']
+        end = self._options['end']
+        timed = start is not None or end is not None
+        if start is None:
+            start = float('-inf')
+        if end is None:
+            end = float('inf')
+
+        for line in lines:
+            for needle in needles:
+                if needle in line:
+                    break
+            else:
+                continue
+            l = line.split()
+            if len(l) < 4:
+                continue
+            handler = get((l[2], l[3]))
+            if handler is None:
+                continue
+            if timed:
+                tracetime = float(l[0])
+                if tracetime < start:
+                    continue
+                if tracetime > end:
+                    return True
+            handler(l)
+        return False
+
+    def _collect_ios(self):
+        """Keeps every finished IO in flat columns until it's exported,
+        see export_to"""
+
+        self.iocolumns = IOColumns()
+        self.iomatcher.consumers.append(self.iocolumns.add)
+
+    def _flush_ios(self, force=False):
+        """Hands the IOs collected so far to the export, once there are a
+        batch of them"""
+
+        if self.export is None:
+            return
+        if force or len(self.iocolumns) >= self.export.batch_size:
+            self.export.write('ios', self.iocolumns.columns(
+                                        self.trace_start_epoch))
+            self.iocolumns.clear()
+
+    def _partial_state(self):
+        """Returns what a worker parsed from its shard, to be merged by
+        the parent with _merge_partial"""
+
+        partial = {'iomatcher': self.iomatcher, 'iostore': self.iostore,
+                   'slowios': self.slowios,
+                   'patterns': self.patterns,
+                   'hotinodes': self.hotinodes,
+                   'rdmamatcher': self.rdmamatcher,
+                   'rdmastore': self.rdmastore,
+                   'brlmatcher': self.brlmatcher,
+                   'brlstats': self.brlstats}
+        if 'trace_ts' in self.tracelog:
+            partial['trace_ts'] = self.tracelog['trace_ts']
+        if self.iocolumns is not None:
+            partial['iocolumns'] = self.iocolumns
+        return partial
+
+    def _merge_partial(self, partial):
+        """Merges the entries a worker parsed from its shard.
+
+        Partials must be merged in trace order. The lines a worker held
+        back (IOs that may have started in an earlier shard) are replayed
+        through our IOMatcher, so QIO/SIO/FIO triplets that straddle two
+        shards come back together here, the RDMA transfers and the lock
+        line pairs the same way through their matchers. The message ids
+        (msg_id, pid) get reused over a trace, and a serial parse keeps
+        the last entry seen for each id, so the TS entries are merged
+        entry by entry.
+        """
+
+        # the IOs the worker finished go out first, then the held back
+        #   lines go through our matcher into our store
+        if self.export is not None and 'iocolumns' in partial:
+            self.export.write('ios', partial['iocolumns'].columns(
+                                        self.trace_start_epoch))
+        self.iomatcher.merge(partial['iomatcher'])
+        self.iostore.merge(partial['iostore'])
+        self.slowios.merge(partial['slowios'])
+        self.patterns.merge(partial['patterns'])
+        self.hotinodes.merge(partial['hotinodes'])
+        self.rdmamatcher.merge(partial['rdmamatcher'])
+        self.rdmastore.merge(partial['rdmastore'])
+        self.brlmatcher.merge(partial['brlmatcher'])
+        self.brlstats.merge(partial['brlstats'])
+
+        entries = partial.get('trace_ts')
+        if entries:
+            traceref = self.tracelog['trace_ts']
+            for oid, ops in entries.iteritems():
+                if oid == 'nodetable':
+                    for ip, name in ops.iteritems():
+                        if not ip in traceref['nodetable']:
+                            traceref['nodetable'][ip] = name
+                    continue
+                for op, fields in ops.iteritems():
+                    traceref[oid][op].update(fields)
+        self._flush_ios()
+
+    def _parse_parallel(self, filename, f, filter_list, workers):
+        """Parses the rest of an open trace report in worker processes.
+
+        Plain files and multi member gzip files are split into shards the
+        workers read on their own. A single member gzip file (or any other
+        compressed report) can only be read front to back, so it is
+        decompressed here and batches of lines are handed out instead.
+        """
+
+        shards = trace_shards(filename, f.tell(), workers * 4)
+        if shards:
+            tasks = ((filename, s, filter_list, self.trace_start_epoch,
+                        self._options, self.export is not None)
+                        for s in shards)
+        else:
+            tasks = ((filename, batch, filter_list, self.trace_start_epoch,
+                        self._options, self.export is not None)
+                        for batch in line_batches(f, 200000))
+
+        pool = multiprocessing.Pool(workers)
+        try:
+            # keep a few shards in flight, and merge them in order. once a
+            #   shard got past the end time, the rest can't have anything
+            pending = deque()
+            for task in tasks:
+                pending.append(pool.apply_async(_parse_shard, (task,)))
+                if len(pending) >= workers * 2:
+                    partial = pending.popleft().get()
+                    self._merge_partial(partial)
+                    if partial['past_end']:
+                        break
+            tasks.close()
+            while pending:
+                self._merge_partial(pending.popleft().get())
+        finally:
+            pool.close()
+            pool.join()
+
+    # Public methods
+    #
+    #
+    def export_to(self, writer):
+        """Writes a row per finished IO, and per RPC matched with its
+        reply, to a gpfs.columnar.ColumnWriter. The IOs go out a batch at
+        a time as they finish (the workers hand theirs back with their
+        shard), the RPCs when the TS stats are assembled. Call it before
+        parsing, and close the writer after.
+
+        @param writer: where the rows go
+        @type writer: gpfs.columnar.ColumnWriter
+
+        @return: NOTHING
+        """
+
+        self.export = writer
+        self._collect_ios()
+
+    def parse_trace(self, filename, filters=None, workers=1):
+        """Parses a trace report (plain or compressed, see
+        gpfs.traceio.trace_format) and assembles the stats for the
+        given filters. With start/end trace times (see TraceParser) the
+        stats are as if the trace only covered that window, the IOs
+        that started before it have no io time, and the parse stops at
+        the end.
+
+        @param filename: trace report to parse
+        @type filename: string
+
+        @param filters: comma separated list of filters, ex: 'io,ts'
+        @type filters: string
+
+        @param workers: number of worker processes to parse with
+        @type workers: int
+
+        @return: NOTHING
+        """
+
+        # create a filter list
+        filter_list = self._filter_list(filters)
 
         # open the trace report file
         try:
-            f = gzip.open(filename, 'rb')
+            f = open_trace(filename)
         except IOError as ioe:
             print "Error opening file: {0}".format(ioe)
             sys.exit(0)
 
-        for line in f:
-
-            # grab the date from the first line to use it later...
-            if skip == 0:
-                ld = line.split()[2:]   # longdate
-                datearg = "{0}-{1}-{2} {3}:{4}:{5}".format(ld[-1], ld[1],
-                        ld[2], ld[3].split(':')[0], ld[3].split(':')[1],
-                        ld[3].split(':')[2])
-                # will be in epoch time...
-                self.trace_start_epoch = int(datetime.datetime.strptime(
-                            datearg, '%Y-%b-%d %H:%M:%S').strftime('%s'))
-                self.tracelog['start_epoch'] = self.trace_start_epoch
-                skip += 1
-                continue
-            elif skip == 1:
-                ld = line.split()[3:]   # longdate
-                datearg = "{0}-{1}-{2} {3}:{4}:{5}".format(ld[-1], ld[1], 
-                        ld[2], ld[3].split(':')[0], ld[3].split(':')[1], 
-                        ld[3].split(':')[2])
-                # will be in epoch time...
-                self.trace_stop_epoch = int(datetime.datetime.strptime(
-                            datearg, '%Y-%b-%d %H:%M:%S').strftime('%s'))
-                self.tracelog['stop_epoch'] = self.trace_stop_epoch
-                skip += 1
-                continue
-            # this is to skip the lines 3-8. shameful to say the least...
-            elif skip > 1 and skip < 8:
-                skip += 1
-                continue
-            elif line.split()[2].strip(':') not in filter_list:
-                # skip any lines we don't want
-                continue
-            elif line.split()[2].strip(':') == 'TRACE_IO' and \
-                line.split()[3] in self.IORegex:
-                self._parse_io_trace(line)
-            elif line.split()[2].strip(':') == 'TRACE_TS' and \
-                line.split()[3] in self.TSRegex:
-                self._parse_ts_trace(line)
-            else:
-                continue
+        self._parse_header(f)
+        if workers > 1:
+            self._parse_parallel(filename, f, filter_list, workers)
+        else:
+            # decompressing in the background while we parse
+            dispatch = self._build_dispatch(filter_list)
+            batches = line_batches(f)
+            for batch in batches:
+                if self._parse_lines(batch, dispatch):
+                    break
+            batches.close()
+        f.close()
 
         # assemble the stats for enabled filters
-        if 'io' in filters.split(','):
-            self._assemble_io_stats()
-        if 'ts' in filters.split(','):
-            self._assemble_ts_stats()
+        self._assemble_stats(filters)
+
+        return
+
+    def parse_trace_dir(self, directory, filters=None, workers=1):
+        """Parses a directory of trace reports, one per node (named after
+        the node), and assembles cluster wide stats for the given filters.
+
+        Each report is parsed whole by a worker process with its own start
+        and stop epochs, the IOs are matched within their node. The IOs of
+        all the nodes are then put on the clock of the earliest report and
+        merged, so the per disk stats are cluster wide (disks are
+        identified by their disk number, same as in a single report). The
+        per node disk stats are kept in tracelog['nodes'].
+
+        With a nodes include list (see TraceParser) only the reports of
+        those nodes are parsed, the node being the file name less its
+        compression and report extensions (see traceio.node_name). The
+        start/end times are in the trace time of each report.
+
+        @param directory: directory of trace reports (gzip'd or plain)
+        @type directory: string
+
+        @param filters: comma separated list of filters, ex: 'io,ts'
+        @type filters: string
+
+        @param workers: number of worker processes, one report each
+        @type workers: int
+
+        @return: NOTHING
+        """
+
+        self._filter_list(filters)
+        try:
+            filenames = sorted(os.path.join(directory, n)
+                                for n in os.listdir(directory)
+                                if os.path.isfile(os.path.join(directory, n)))
+        except OSError as oe:
+            print "Error opening directory: {0}".format(oe)
+            sys.exit(0)
+
+        nodes = self._options['nodes']
+        if nodes:
+            filenames = [n for n in filenames if node_name(n) in nodes]
+
+        # the nodes are the reports to parse, not the peers of a report
+        options = dict(self._options, nodes=None)
+        tasks = [(filename, filters, options, self.export is not None)
+                    for filename in filenames]
+        pool = multiprocessing.Pool(max(1, min(workers, len(tasks))))
+        try:
+            nodes = pool.map(_parse_node, tasks, chunksize=1)
+        finally:
+            pool.close()
+            pool.join()
+        if not nodes:
+            print "No trace reports in {0}".format(directory)
+            return
+
+        self.trace_start_epoch = min(n['start_epoch'] for n in nodes)
+        self.trace_stop_epoch = max(n['stop_epoch'] for n in nodes)
+        self.tracelog['start_epoch'] = self.trace_start_epoch
+        self.tracelog['stop_epoch'] = self.trace_stop_epoch
+
+        for n in nodes:
+            self.tracelog['nodes'][n['node']] = {
+                'start_epoch':  n['start_epoch'],
+                'stop_epoch':   n['stop_epoch'],
+                'orphan_ios':   n['orphan_ios'],
+                'disks':        n['disks']}
+
+            n['iostore'].shift_times(n['start_epoch'] - self.trace_start_epoch)
+            self.iostore.merge(n['iostore'])
+            self.iomatcher.orphans += n['orphan_ios']
+            n['slowios'].shift_times(n['start_epoch'] - self.trace_start_epoch)
+            self.slowios.merge(n['slowios'])
+            self.patterns.merge(n['patterns'])
+            self.hotinodes.merge(n['hotinodes'])
+            if self.export is not None:
+                self.export.write('ios', n['iocolumns'].columns(
+                                            n['start_epoch'], n['node']))
+            n['rdmastore'].shift_times(n['start_epoch'] - self.trace_start_epoch)
+            self.rdmastore.merge(n['rdmastore'])
+            self.rdmamatcher.orphans += n['orphan_rdma']
+            self.brlstats.merge(n['brlstats'])
+
+            # the message ids are only unique within a node, so they get
+            #   the node in front, ex: ('nsd1/1234', pid)
+            traceref = self.tracelog['trace_ts']
+            for oid, ops in n['trace_ts'].iteritems():
+                if oid == 'nodetable':
+                    for ip, name in ops.iteritems():
+                        if not ip in traceref['nodetable']:
+                            traceref['nodetable'][ip] = name
+                    continue
+                traceref[(n['node'] + '/' + oid[0], oid[1])].update(ops)
+
+        # assemble the stats for enabled filters
+        self._assemble_stats(filters)
+
+        return
+
+    def follow_trace(self, filename, filters='io', interval=5.0, window=60.0,
+            max_zscore=4):
+        """Parses a trace report that is still being written, like tail -f.
+        Every interval seconds the per disk stats over the last window
+        seconds of the trace are printed, until the user hits ctrl-c (or
+        the trace gets past the end time). The stats of the whole trace
+        are assembled after that, same as parse_trace.
+
+        @param filename: trace report to follow
+        @type filename: string
+
+        @param filters: comma separated list of filters, ex: 'io,ts'
+        @type filters: string
+
+        @param interval: seconds between refreshes
+        @type interval: float
+
+        @param window: seconds of trace time the rolling stats cover
+        @type window: float
+
+        @param max_zscore: disks with an average io time more than this
+            many robust deviations above their class are reported slow
+        @type max_zscore: int
+
+        @return: NOTHING
+        """
+
+        filter_list = self._filter_list(filters)
+        dispatch = self._build_dispatch(filter_list)
+
+        rolling = IOWindow(window, self._SECTOR_SIZE)
+        self.iomatcher.consumers.append(rolling.add)
+
+        try:
+            open(filename, 'rb').close()
+        except IOError as ioe:
+            print "Error opening file: {0}".format(ioe)
+            sys.exit(0)
+        lines = follow_lines(filename, min(interval, 1.0))
+
+        header = []
+        try:
+            for line in lines:
+                if line is None:
+                    continue
+                header.append(line)
+                if len(header) == 8:
+                    break
+            self._parse_header_lines(header)
+
+            next_refresh = time.time() + interval
+            for line in lines:
+                if line is not None and self._parse_lines([line], dispatch):
+                    break   # past the end time
+                if time.time() >= next_refresh:
+                    rolling.expire(self.iomatcher.now)
+                    self.print_rolling_summary(rolling, max_zscore)
+                    next_refresh = time.time() + interval
+        except KeyboardInterrupt:
+            pass
+        finally:
+            lines.close()
+            self.iomatcher.consumers.remove(rolling.add)
+
+        if len(header) < 8:
+            print "No trace data collected."
+            return
+
+        self._assemble_stats(filters)
 
         return
 
     def print_disk_summary(self, max_zscore=4):
         """Print out a summary of disk statistics...
 
-        @param max_zscore: the number of standard deviations above the mean
-            we'd like to filter
+        @param max_zscore: the disks scoring above this (robust z-score
+            against the other disks of their class) are reported slow
         @type max_zscore: int
 
         @return: NOTHING
@@ -450,15 +1289,18 @@ class TraceParser(object):
         trace_elapsed_secs = self.tracelog['stop_epoch'] -\
              self.tracelog['start_epoch']
 
-        # disk io size buckets
-        d_buckets_k = [i for i in range(0,9437184,1048576)]
-        m_buckets_k = [i for i in range(0,1048576,131072)]
-        d_buckets = dict((k, int(0)) for k in d_buckets_k)
-        m_buckets = dict((k, int(0)) for k in m_buckets_k)
-                                                            
+        # disk io size buckets, data disks get the 1M and up buckets
+        size_buckets = self._options['size_buckets']
+        d_buckets_k = [0] + [b for b in size_buckets if b >= 1048576]
+        m_buckets_k = [b for b in size_buckets if b < 1048576]
 
         # summarize some disk stats
         if self.verbose:
+            d_buckets = self.iostore.size_histograms(d_buckets_k)
+            m_buckets = self.iostore.size_histograms(m_buckets_k)
+            t_buckets_k = self._options['latency_buckets']
+            t_buckets = self.iostore.latency_histograms(t_buckets_k)
+
             print "Disk Summary:"
             print "*" * 80
             for k, v in sorted(self.tracelog['trace_io']['disks'].iteritems()):
@@ -474,73 +1316,79 @@ class TraceParser(object):
                     v['stats']['total_bytes_io'],
                     v['stats']['total_time_io'])
                    
-                    if v['stats']['avg_io_sz'] < 1048576:
+                    if v['stats']['class'] == 'meta':
                         bucket = m_buckets
                         bucket_k = m_buckets_k
                     else:
                         bucket = d_buckets
                         bucket_k = d_buckets_k
 
-                    # populate the iosize buckets
-                    #from IPython import embed; embed()
-                    for io in v['iosizes'][k]:
-                        b_index = self._populate_buckets(bucket_k, io)
-                        b_key = bucket_k[b_index - 1]
-                        bucket[b_key] += 1
-
                     # print the buckets
-                    print "\tIO Size buckets: " + ', '.join(["{0}: {1}".format(k, v) for k, v in sorted(bucket.iteritems())])
-
-                    # clear the buckets for the next disk
-                    for k in bucket:
-                        bucket[k] = 0
+                    if k in bucket:
+                        print "\tIO Size buckets: " + ', '.join(
+                            ["{0}: {1}".format(b, c) for b, c in
+                                zip(bucket_k, bucket[k])])
+
+                    if 'io_tm_pcts' in v['stats']:
+                        print "\tIO Time percentiles: " + \
+                            _format_pcts(v['stats']['io_tm_pcts'])
+                    if 'qu_tm_pcts' in v['stats']:
+                        print "\tQueue Time percentiles: " + \
+                            _format_pcts(v['stats']['qu_tm_pcts'])
+                    if 'max_queued' in v['stats']:
+                        print "\tQueue depths: " + _format_depths(v['stats'])
+
+                    # only the io time buckets that were hit, there are
+                    #   a lot of them
+                    if k in t_buckets:
+                        print "\tIO Time buckets: " + ', '.join(
+                            ["{0:.6g}: {1}".format(b, c) for b, c in
+                                zip(t_buckets_k, t_buckets[k]) if c])
 
                 except ValueError as ve:
                     continue
 
         print
         print
-        print "Disks with Avg IO times > {0} standard deviations".format(
-                max_zscore)
+        print "Disks with Avg or p99 IO times > {0} robust deviations " \
+            "(median/MAD of their class)".format(max_zscore)
         print "Average IO Times (data: {0:.4f}, metadata: {1:.4f})".format(
             self.tracelog['trace_io']['stats']['avg_io_tm_data'], 
             self.tracelog['trace_io']['stats']['avg_io_tm_meta'])
+        print "IO Time percentiles data: {0}".format(
+            _format_pcts(self.tracelog['trace_io']['stats']['io_tm_pcts_data']))
+        print "IO Time percentiles metadata: {0}".format(
+            _format_pcts(self.tracelog['trace_io']['stats']['io_tm_pcts_meta']))
+        print "Queue Time percentiles data: {0}".format(
+            _format_pcts(self.tracelog['trace_io']['stats']['qu_tm_pcts_data']))
+        print "Queue Time percentiles metadata: {0}".format(
+            _format_pcts(self.tracelog['trace_io']['stats']['qu_tm_pcts_meta']))
         print "Deviation Variance: ( data: {0:.2f}, metadata: {1:.2f})".format(
                 max_zscore * (self.tracelog['trace_io']['stats']['stddev_io_data_var']),
                 max_zscore * (self.tracelog['trace_io']['stats']['stddev_io_meta_var']) )
 
         print "*" * 80
 
-        for k, v in sorted(self.tracelog['trace_io']['disks'].iteritems()):
-            if not v['stats']['avg_io_tm']:
-                continue    # some disks just dont have the right fields...
-            else:
-                d_io_tm = v['stats']['avg_io_tm']
-                strfrmt = "Disk: {0}, Avg_IO_Time {1:.4f}, ZScore: {2:.4f}"
-
-            try:
-                if v['stats']['avg_io_sz'] > 1048576: # data disks
-                    mean = self.tracelog['trace_io']['stats']['avg_io_tm_data']
-                    stddev = self.tracelog['trace_io']['stats']['stddev_io_data']
-                    zs = zscore(d_io_tm, mean, stddev)
-                    if zs > max_zscore:
-                        print strfrmt.format(k, d_io_tm, zs)
-
-                else:   # metadata
-                    mean = self.tracelog['trace_io']['stats']['avg_io_tm_meta']
-                    stddev = self.tracelog['trace_io']['stats']['stddev_io_meta']
-                    zs = zscore(d_io_tm, mean, stddev)
-                    if zs > max_zscore:
-                        print strfrmt.format(k, d_io_tm, zs)
-
-                    # populate the iosize buckets
-                    #for io in v['iosizes']:
-                    #    p = _populate_buckets(m_bucket_k, io)
-                    #    m_buckets[p] += 1
-
-            except TypeError as te:
-                print "TypeError: {0}".format(te)
-                continue
+        # worst first, along with what the score is based on
+        strfrmt = "Disk: {0}, Class: {1}, Score: {2:.2f} (avg: {3:.2f}, " + \
+            "p99: {4:.2f}), Avg_IO_Time: {5:.4f}, p99_IO_Time: {6:.4f}, IOs: {7}"
+        p99 = PERCENTILES.index(99.0)
+        disks = self.tracelog['trace_io']['disks']
+        for k in self.tracelog['trace_io']['stats']['ranked_disks']:
+            stats = disks[k]['stats']
+            if not stats['score'] > max_zscore:
+                break
+            print strfrmt.format(k, stats['class'], stats['score'],
+                    stats['zscore_avg'], stats['zscore_p99'],
+                    stats['avg_io_tm'], stats['io_tm_pcts'][p99],
+                    stats['num_iops'])
+            if 'max_queued' in stats:
+                print "\tQueue depths: " + _format_depths(stats)
+
+        self._print_slow_ios("Slowest IOs (SIO -> FIO):",
+                             self.tracelog['trace_io']['stats']['slowest_ios'])
+        self._print_slow_ios("Longest queue waits (QIO -> SIO):",
+                    self.tracelog['trace_io']['stats']['longest_queue_waits'])
 
         total_bytes = self.tracelog['trace_io']['stats']['total_bytes']
         total_iops = self.tracelog['trace_io']['stats']['total_iops']
@@ -551,10 +1399,284 @@ class TraceParser(object):
         print "*" * 80
         print "Total Gigabytes Read/Written: {0}".format(float(total_bytes) / 1024 / 1024 / 1024)
         print "Total IO Operations: {0}".format(total_iops)
+        print "Orphaned IOs (no FIO): {0}".format(
+                self.tracelog['trace_io']['stats'].get('orphan_ios', 0))
         print "Total IO Trace Time: {0} secs".format(trace_elapsed_secs)
         print "Total GB/s: {0:.3f}".format(
                 float(total_bytes / 1024 / 1024 / 1024) / float(trace_elapsed_secs))
 
+    def _print_slow_ios(self, title, ios):
+        """Prints a list of IOs from _assemble_slow_ios"""
+
+        def when(epoch):
+            if epoch != epoch:
+                return '-'
+            return datetime.datetime.fromtimestamp(epoch).strftime(
+                        '%H:%M:%S.%f')
+
+        print
+        print
+        print title
+        print "*" * 80
+        if not ios:
+            print "none"
+        strfrmt = "{0:.6f} secs, Disk: {1}, Da: {2}, Pid: {3}, Op: {4}, " + \
+            "Tags: {5} {6}, Size: {7}, Queued: {8}, Started: {9}, Finished: {10}"
+        for io in ios:
+            print strfrmt.format(io['elapsed'], io['disk'], io['diskaddr'],
+                    io['pid'], io['optype'], io['tags'][0], io['tags'][1],
+                    io['io_sz'], when(io['qio_epoch']), when(io['sio_epoch']),
+                    when(io['fio_epoch']))
+
+    def print_pattern_summary(self, small_io=262144):
+        """Prints the sequential/strided/random mix of the IOs of each
+        disk with the io times and sizes of each, the disks that mostly
+        see small random IOs (prefetch or write behind isn't coalescing,
+        costly on spinning disks), and the inodes with the most random
+        IOs
+
+        @param small_io: random IOs smaller than this (bytes) on average
+            are small
+        @type small_io: int
+
+        @return: NOTHING
+        """
+
+        disks = self.tracelog['trace_io']['disks']
+        if not disks:
+            print "No disk data collected."
+            return
+
+        print "Access patterns by disk:"
+        print "*" * 80
+        small_random = []
+        for k, v in sorted(disks.iteritems()):
+            p = v['stats'].get('patterns')
+            if not p:
+                continue
+            total = float(sum(p[name + '_ios'] for name in PATTERNS))
+            print "Disk: {0}, Seq: {1:.1f}%, Strided: {2:.1f}%, Random: " \
+                "{3:.1f}%, Avg_Run: {4:.1f} IOs, Longest_Run: {5} IOs".format(
+                    k, 100 * p['seq_ios'] / total, 100 * p['strided_ios'] / total,
+                    100 * p['random_ios'] / total, p['avg_run_ios'],
+                    p['longest_run_ios'])
+            print "\tAvg_IO_T " + ', '.join("{0}: {1:.4f}".format(name,
+                    p['avg_io_tm_' + name]) for name in PATTERNS) + \
+                ", Avg_IO_Sz " + ', '.join("{0}: {1}".format(name,
+                    p['avg_io_sz_' + name]) for name in PATTERNS)
+            if p['random_ios'] * 2 > total and \
+                    p['avg_io_sz_random'] < small_io:
+                small_random.append(k)
+
+        print
+        print
+        print "Disks with mostly small (< {0} bytes) random IOs:".format(
+                small_io)
+        print "*" * 80
+        print ', '.join(str(k) for k in small_random) or 'none'
+
+        print
+        print
+        print "Inodes with the most random IOs:"
+        print "*" * 80
+        for inode, counts in self.tracelog['trace_io']['stats']['random_inodes']:
+            print "Inode: {0}, Seq: {1}, Strided: {2}, Random: {3}".format(
+                    'other' if inode is None else inode, *counts)
+
+    def print_inode_summary(self):
+        """Prints the inodes that got the most bytes, IOs and io time,
+        with the number of disks their IOs went to. The numbers are
+        estimates, high by at most the printed error (most likely), the
+        inodes that didn't get more than that are left out
+
+        @return: NOTHING
+        """
+
+        stats = self.tracelog['trace_io']['stats']
+        if 'top_inodes' not in stats:
+            print "No inode data collected."
+            return
+
+        titles = {'bytes':      "Inodes with the most bytes:",
+                  'ios':        "Inodes with the most IOs:",
+                  'io_time':    "Inodes with the most io time (SIO -> FIO):"}
+        errors = stats['top_inodes_error']
+        for m in METRICS:
+            print titles[m]
+            print "*" * 80
+            if not stats['top_inodes'][m]:
+                print "none stands out"
+            for i in stats['top_inodes'][m]:
+                print "Inode: {0}, Bytes: {1}, IOs: {2}, Total_IO_T: " \
+                    "{3:.4f}, Disks: {4}".format(i['inode'], i['bytes'],
+                        i['ios'], i['io_time'], i['disks'])
+            print "Estimates, high by at most Bytes: {0:.0f}, IOs: {1:.0f}, " \
+                "Total_IO_T: {2:.4f}".format(errors['bytes'], errors['ios'],
+                                             errors['io_time'])
+            print
+            print
+
+    def io_timeline(self, window=1.0):
+        """Returns the per window IO stats of the trace, see
+        gpfs.timeline.Timeline. Needs every IO, so it's None in summary
+        only mode (or without any IOs)
+
+        @param window: window size in seconds (ex: 1.0, 0.1)
+        @type window: float
+
+        @return: the timeline
+        @rtype: Timeline
+        """
+
+        if not isinstance(self.iostore, IOStore):
+            return None
+        return build_timeline(self.iostore, window)
+
+    def print_io_timeline(self, window=1.0):
+        """Prints the cluster wide IO stats of each window of the trace,
+        and of each disk in verbose mode
+
+        @param window: window size in seconds
+        @type window: float
+
+        @return: NOTHING
+        """
+
+        if self._options['summary_only']:
+            print "No IO timeline in summary only mode."
+            return
+        timeline = self.io_timeline(window)
+        if timeline is None:
+            print "No disk data collected."
+            return
+
+        formatstr = "{0} MB/s: {1:.3f}, IOPS: {2:.1f}, Avg_IO_T: {3:.4f}, " + \
+            "p99_IO_T: {4:.4f}, Avg_Queue_T: {5:.4f}, Queued: {6:.2f} " + \
+            "(max {7}), In_Service: {8:.2f} (max {9})"
+        times = timeline.times(self.tracelog['start_epoch'])
+
+        def print_windows(stats, row=None):
+            for i, t in enumerate(times):
+                get = lambda stat: stats[stat][i] if row is None else \
+                    stats[stat][row, i]
+                print formatstr.format(
+                    datetime.datetime.fromtimestamp(t).strftime(
+                        '%H:%M:%S.%f')[:-3],
+                    get('bytes') / window / 1024 / 1024,
+                    get('iops'), get('io_tm_mean'), get('io_tm_p99'),
+                    get('qu_tm_mean'), get('queued_avg'), get('queued_max'),
+                    get('in_service_avg'), get('in_service_max'))
+
+        print "IO Timeline ({0} sec windows):".format(window)
+        print "*" * 80
+        print_windows(timeline.total)
+
+        if self.verbose:
+            for row, disk in enumerate(timeline.disks):
+                print
+                print "Disk: {0}".format(disk)
+                print_windows(timeline.stats, row)
+
+    def print_node_summary(self, max_zscore=4):
+        """Prints how each disk looks from each node, after
+        parse_trace_dir. A disk that is slow from every node is likely
+        the disk (or its server), one that is only slow from some nodes
+        points at those nodes or their network.
+
+        @param max_zscore: a disk scoring above this (robust z-score of
+            its average io time from a node, against all the disks of its
+            class from all the nodes) is slow from that node
+        @type max_zscore: int
+
+        @return: NOTHING
+        """
+
+        if not self.tracelog.get('nodes'):
+            print "No per node data collected."
+            return
+
+        nodes = self.tracelog['nodes']
+        disks = self.tracelog['trace_io']['disks']
+
+        # how each disk looks from each node, all scored at once
+        views = []
+        for k in sorted(disks):
+            for node, n in sorted(nodes.iteritems()):
+                d = n['disks'].get(k, {}).get('stats')
+                if d and d.get('avg_io_tm') is not None:
+                    views.append((k, node, d))
+        scores = robust_zscores(
+            np.array([disks[k]['stats']['class'] == 'data'
+                        for k, node, d in views]),
+            np.array([d['avg_io_tm'] for k, node, d in views]))
+        by_disk = defaultdict(list)
+        for (k, node, d), zs in zip(views, scores):
+            by_disk[k].append((node, d, zs))
+
+        print "Disks slow (robust score > {0}) from some nodes:".format(
+                max_zscore)
+        print "*" * 80
+        for k, v in sorted(disks.iteritems()):
+            seen_from = by_disk[k]
+            slow_from = [node for node, d, zs in seen_from if zs > max_zscore]
+
+            if not slow_from and not self.verbose:
+                continue
+            print "Disk: {0}, Avg_IO_Time {1:.4f}, slow from {2} of {3} " \
+                "nodes: {4}".format(k, v['stats']['avg_io_tm'], len(slow_from),
+                    len(seen_from), ', '.join(slow_from) or 'none')
+            if self.verbose:
+                for node, d, zs in seen_from:
+                    print "\tNode: {0}, IOPS: {1}, Avg_IO_T: {2:.4f}, " \
+                        "Longest_IO: {3:.3f}, Score: {4:.4f}".format(node,
+                            d['num_iops'], d['avg_io_tm'], d['longest_io'], zs)
+                    if 'max_queued' in d:
+                        print "\t\t" + _format_depths(d)
+
+    def print_rolling_summary(self, rolling, max_zscore=4):
+        """Prints the per disk stats of an IOWindow, and the disks that are
+        slow compared to the other disks of their class (data/metadata)
+
+        @param rolling: the rolling stats
+        @type rolling: IOWindow
+
+        @param max_zscore: the disks scoring above this (robust z-score of
+            the average io time) are reported slow
+        @type max_zscore: int
+
+        @return: NOTHING
+        """
+
+        stats = rolling.disk_stats()
+        print
+        print "Last {0} secs of the trace, up to {1}:".format(rolling.window,
+            datetime.datetime.fromtimestamp(
+                self.trace_start_epoch + rolling.now).strftime('%H:%M:%S'))
+        print "*" * 80
+
+        # score the disks against the others of their class
+        keys = sorted(stats)
+        scores = robust_zscores(
+            np.array([_disk_class(stats[k]) == 'data' for k in keys]),
+            np.array([stats[k]['avg_io_tm'] for k in keys], dtype=np.float64))
+        slow = [k for k, zs in zip(keys, scores) if zs > max_zscore]
+
+        formatstr = "Disk: {0}, IOPS: {1:.1f}, MB/s: {2:.3f}, Avg_IO_T: {3}"
+        for k, v in sorted(stats.iteritems()):
+            if v['avg_io_tm'] is None:
+                d_io_tm = "n/a"
+            else:
+                d_io_tm = "{0:.4f}".format(v['avg_io_tm'])
+            if self.verbose:
+                print formatstr.format(k, v['iops'],
+                        v['bytes_sec'] / 1024 / 1024, d_io_tm)
+
+        print "Disks: {0}, IOPS: {1:.1f}, MB/s: {2:.3f}".format(len(stats),
+                sum(v['iops'] for v in stats.itervalues()),
+                sum(v['bytes_sec'] for v in stats.itervalues()) / 1024 / 1024)
+        print "Disks with Avg IO times > {0} robust deviations: {1}".format(
+                max_zscore, ', '.join(str(k) for k in slow) or 'none')
+
     def print_network_summary(self):
         """Prints out network summary"""
 
@@ -586,7 +1708,175 @@ class TraceParser(object):
                 for n,c in count_iterations(v).items():
                     print "\t\tNode: {0}, Count: {1}".format(
                             self._lookup_node_name(n),c)
+
+        # Round trip times, the slowest tails first
+        rpc_msgs = self.tracelog['trace_ts']['stats'].get('rpc_msgs', {})
+        rpc_nodes = self.tracelog['trace_ts']['stats'].get('rpc_nodes', {})
+        tail = lambda kv: kv[1].get('rtt_pcts', [0.0])[-1]
+        buckets = self._options['latency_buckets']
+
+        print
+        print
+        print "Round trip times of sent messages:"
+        print "*" * 80
+        for k, v in sorted(rpc_msgs.iteritems(), key=tail, reverse=True):
+            if not v['replies']:
+                print "Msg: '{0}', Replies: 0, No_Reply: {1}".format(
+                        k, v['no_reply'])
+                continue
+            print "Msg: '{0}', Replies: {1}, No_Reply: {2}, Avg_RTT: " \
+                "{3:.4f}, Longest_RTT: {4:.4f}".format(k, v['replies'],
+                    v['no_reply'], v['avg_rtt'], v['longest_rtt'])
+            print "\tRTT percentiles: " + _format_pcts(v['rtt_pcts'])
+            if self.verbose:
+                print "\tRTT buckets: " + ', '.join(
+                    ["{0:.6g}: {1}".format(b, c) for b, c in
+                        zip(buckets, v['rtt_hist']) if c])
+
+        print
+        print
+        print "Round trip times by node:"
+        print "*" * 80
+        for k, v in sorted(rpc_nodes.iteritems(), key=tail, reverse=True):
+            print "Node: {0}, Replies: {1}, Avg_RTT: {2:.4f}, " \
+                "Longest_RTT: {3:.4f}".format(self._lookup_node_name(k),
+                    v['replies'], v['avg_rtt'], v['longest_rtt'])
+            print "\tRTT percentiles: " + _format_pcts(v['rtt_pcts'])
+            if self.verbose:
+                print "\tRTT buckets: " + ', '.join(
+                    ["{0:.6g}: {1}".format(b, c) for b, c in
+                        zip(buckets, v['rtt_hist']) if c])
+        print
+        print
+        print "Totals:"
+        print "*" * 80
+
+    def print_rdma_summary(self):
+        """Prints the RDMA bytes, throughput and completion latencies of
+        each peer, the slowest tails first"""
+
+        peers = self.tracelog['trace_rdma']['peers']
+        if not peers:
+            print "No RDMA data collected."
+            return
+
+        trace_elapsed_secs = max(self.tracelog['stop_epoch'] -
+                                 self.tracelog['start_epoch'], 1)
+        tail = lambda kv: kv[1]['stats'].get('lat_pcts', [0.0])[-1]
+
+        print "RDMA Summary:"
+        print "*" * 80
+        for k, v in sorted(peers.iteritems(), key=tail, reverse=True):
+            stats = v['stats']
+            print "Peer: {0}, Ops: {1}, Errors: {2}, Read_MB: {3:.1f}, " \
+                "Write_MB: {4:.1f}, Avg_MB/s: {5:.3f}, Peak_MB/s: {6:.3f}".format(
+                    self._lookup_node_name(k), stats['num_ops'],
+                    stats['num_errors'], stats['read_bytes'] / 1048576.0,
+                    stats['write_bytes'] / 1048576.0,
+                    stats['total_bytes'] / 1048576.0 / trace_elapsed_secs,
+                    stats['peak_bytes_sec'] / 1048576.0)
+            if 'lat_pcts' in stats:
+                print "\tAvg_Lat: {0:.6f}, Longest_Lat: {1:.6f}".format(
+                        stats['avg_lat'], stats['longest_lat'])
+                print "\tLatency percentiles: " + _format_pcts(stats['lat_pcts'])
+
+        print
+        print
+        print "Totals:"
+        print "*" * 80
+        print "Total Gigabytes RDMA Read/Written: {0}".format(
+                self.tracelog['trace_rdma']['stats']['total_bytes'] / 1024.0 **3)
+        print "Total RDMA Operations: {0}".format(
+                self.tracelog['trace_rdma']['stats']['total_ops'])
+        print "Orphaned RDMA ops (no completion): {0}".format(
+                self.tracelog['trace_rdma']['stats']['orphan_rdma'])
+
+    def print_rdma_timeline(self, window=1.0):
+        """Prints the RDMA throughput of each window of the trace, per peer
+
+        @param window: window size in seconds
+        @type window: float
+
+        @return: NOTHING
+        """
+
+        try:
+            start, peers, counts = self.rdmastore.throughput(window)
+        except ValueError as ve:
+            print "No RDMA timeline: {0}".format(ve)
+            return
+        if not counts.size:
+            print "No RDMA data collected."
+            return
+
+        epoch = self.tracelog['start_epoch'] + start
+        print "RDMA Timeline ({0} sec windows, MB/s):".format(window)
+        print "*" * 80
+        for i, peer in enumerate(peers):
+            print "Peer: {0}".format(self._lookup_node_name(peer))
+            for w, nbytes in enumerate(counts[i]):
+                print "{0} {1:.3f}".format(
+                    datetime.datetime.fromtimestamp(epoch + w * window).strftime(
+                        '%H:%M:%S.%f')[:-3],
+                    nbytes / window / 1048576)
+
+    def print_brl_summary(self, top=10):
+        """Prints the byte range lock contention: the most contended
+        inodes, the time each node spent waiting for locks, and the nodes
+        whose lock requests caused the most revokes
+
+        @param top: how many nodes to list as the worst offenders
+        @type top: int
+
+        @return: NOTHING
+        """
+
+        traceref = self.tracelog['trace_brl']
+        if not traceref['nodes']:
+            print "No byte range lock data collected."
+            return
+
+        print "Contended inodes:"
+        print "*" * 80
+        for inode, stats in traceref['stats']['contended']:
+            print "Inode: {0}, Revokes: {1}, Acquires: {2}, Nodes: {3}, " \
+                "Total_Wait: {4:.4f}, Longest_Wait: {5:.4f}".format(inode,
+                    stats['revokes'], stats['acquires'], stats['num_nodes'],
+                    stats['total_wait'], stats['longest_wait'])
+
+        nodes = traceref['nodes']
+        print
+        print
+        print "Lock waits by node:"
+        print "*" * 80
+        for k, v in sorted(nodes.iteritems(), reverse=True,
+                           key=lambda kv: kv[1]['stats']['total_wait']):
+            stats = v['stats']
+            print "Node: {0}, Acquires: {1}, Total_Wait: {2:.4f}, " \
+                "Avg_Wait: {3:.6f}, Longest_Wait: {4:.4f}, Avg_Hold: {5:.6f}, " \
+                "Revoked: {6}, Avg_Revoke_T: {7:.6f}".format(
+                    self._lookup_node_name(k), stats['acquires'],
+                    stats['total_wait'], stats['avg_wait'],
+                    stats['longest_wait'], stats['avg_hold'],
+                    stats['revokes'], stats['avg_revoke_wait'])
+
+        print
+        print
+        print "Worst offenders (revokes caused):"
+        print "*" * 80
+        offenders = sorted(nodes.iteritems(), reverse=True,
+                           key=lambda kv: kv[1]['stats']['revokes_caused'])
+        for k, v in offenders[:top]:
+            if not v['stats']['revokes_caused']:
+                break
+            print "Node: {0}, Revokes_Caused: {1}".format(
+                    self._lookup_node_name(k), v['stats']['revokes_caused'])
+
         print
         print
         print "Totals:"
         print "*" * 80
+        print "Inodes Locked: {0}".format(traceref['stats']['num_inodes'])
+        print "Total Lock Acquires: {0}".format(
+                traceref['stats']['total_acquires'])
+        print "Total Revokes: {0}".format(traceref['stats']['total_revokes'])
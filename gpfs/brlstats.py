@@ -0,0 +1,196 @@
+from gpfs.funcs import RunningStats
+
+
+class _InodeStats(object):
+    """Lock traffic on one inode"""
+
+    def __init__(self):
+        self.acquires = 0
+        self.revokes = 0
+        self.waits = RunningStats()
+        self.nodes = set()
+        self.last_acquire = None    # the node that asked for it last
+
+
+class _NodeStats(object):
+    """Lock traffic of one node"""
+
+    def __init__(self):
+        self.acquires = 0
+        self.revokes = 0                    # revokes this node was sent
+        self.caused = 0                     # revokes its acquires caused
+        self.waits = RunningStats()         # acquire -> granted
+        self.holds = RunningStats()         # granted -> release
+        self.revoke_waits = RunningStats()  # revoke -> release
+
+
+def _merge_stats(mine, other):
+    for name, value in other.__dict__.iteritems():
+        if isinstance(value, RunningStats):
+            getattr(mine, name).merge(value)
+        elif isinstance(value, set):
+            getattr(mine, name).update(value)
+        elif name == 'last_acquire':
+            if value is not None:
+                mine.last_acquire = value
+        else:
+            setattr(mine, name, getattr(mine, name) + value)
+
+
+class BRLStats(object):
+    """Byte range lock contention of a trace, per inode and per node.
+
+    The handlers count the acquires and revokes as they're seen (a revoke
+    is blamed on the node that last asked for the inode), and the
+    BRLMatcher hands over the wait/hold/revoke times of the line pairs.
+    Only counters and running stats are kept, no per lock event state.
+
+    Memory is bounded by the number of nodes and max_inodes. When there
+    are max_inodes inodes, the least contended half (by revokes, time
+    waited and acquires, then by inode number) is dropped and their
+    stats are added up under None. A revoke of a dropped inode can't be
+    blamed on anyone.
+    """
+
+    def __init__(self, max_inodes=100000):
+        self.max_inodes = max_inodes
+        self.inodes = {}    # inode -> _InodeStats
+        self.nodes = {}     # node -> _NodeStats
+        self.dropped = 0    # inodes added up under None
+
+        # the revokes seen before any acquire of their inode, a worker
+        #   leaves those for the parent to blame in merge()
+        self.unblamed = {}  # (inode, node) -> count
+
+    def _inode(self, inode):
+        stats = self.inodes.get(inode)
+        if stats is None:
+            if len(self.inodes) >= self.max_inodes:
+                self._trim()
+            stats = self.inodes[inode] = _InodeStats()
+        return stats
+
+    def _trim(self):
+        """Keeps the max_inodes / 2 most contended inodes, the stats of
+        the others are added up under None"""
+
+        def rank(inode):
+            i = self.inodes[inode]
+            return (-i.revokes, -i.waits.total, -i.acquires, inode)
+
+        ranked = sorted((inode for inode in self.inodes if inode is not None),
+                        key=rank)
+        other = self.inodes.setdefault(None, _InodeStats())
+        for inode in ranked[self.max_inodes // 2:]:
+            _merge_stats(other, self.inodes.pop(inode))
+            self.dropped += 1
+        other.last_acquire = None
+
+    def _node(self, node):
+        stats = self.nodes.get(node)
+        if stats is None:
+            stats = self.nodes[node] = _NodeStats()
+        return stats
+
+    def acquire(self, inode, node):
+        """Counts a lock request of node on inode"""
+
+        i = self._inode(inode)
+        i.acquires += 1
+        i.nodes.add(node)
+        i.last_acquire = node
+        self._node(node).acquires += 1
+
+    def revoke(self, inode, node):
+        """Counts a lock on inode being revoked from node. The revoke is
+        blamed on the last other node that asked for a lock on inode"""
+
+        i = self._inode(inode)
+        i.revokes += 1
+        self._node(node).revokes += 1
+        if i.last_acquire is None:
+            key = (inode, node)
+            self.unblamed[key] = self.unblamed.get(key, 0) + 1
+        elif i.last_acquire != node:
+            self._node(i.last_acquire).caused += 1
+
+    def add(self, record):
+        """Adds the times of a finished pair of lines (a BRLRecord)"""
+
+        elapsed = record.done_time - record.start_time
+        if elapsed != elapsed:  # nan, the first line wasn't seen
+            return
+        node = self._node(record.node)
+        if record.kind == 'wait':
+            node.waits.add(elapsed)
+            self._inode(record.inode).waits.add(elapsed)
+        elif record.kind == 'hold':
+            node.holds.add(elapsed)
+        else:
+            node.revoke_waits.add(elapsed)
+
+    def contended(self, top=10):
+        """Returns the top inodes by revokes, then by time waited (then by
+        inode number), the dropped inodes left out
+
+        @param top: how many inodes
+        @type top: int
+
+        @return: list of (inode, dict of stats), worst first
+        @rtype: list
+        """
+
+        worst = sorted(((inode, i) for inode, i in self.inodes.iteritems()
+                            if inode is not None),
+                       key=lambda kv: (-kv[1].revokes, -kv[1].waits.total,
+                                       kv[0]))
+        return [(inode, {'acquires':    i.acquires,
+                         'revokes':     i.revokes,
+                         'num_nodes':   len(i.nodes),
+                         'total_wait':  i.waits.total,
+                         'longest_wait': i.waits.max if i.waits.count
+                                            else 0.0})
+                    for inode, i in worst[:top] if i.revokes or i.waits.count]
+
+    def node_stats(self):
+        """Returns a dict of node -> dict of stats"""
+
+        stats = {}
+        for name, n in self.nodes.iteritems():
+            stats[name] = {
+                'acquires':         n.acquires,
+                'revokes':          n.revokes,
+                'revokes_caused':   n.caused,
+                'total_wait':       n.waits.total,
+                'avg_wait':         n.waits.mean,
+                'longest_wait':     n.waits.max if n.waits.count else 0.0,
+                'avg_hold':         n.holds.mean,
+                'avg_revoke_wait':  n.revoke_waits.mean,
+            }
+        return stats
+
+    def merge(self, other):
+        """Adds the stats of another BRLStats, of a later part of the same
+        trace, or of another node"""
+
+        for (inode, node), count in other.unblamed.iteritems():
+            mine = self.inodes.get(inode)
+            if mine is None or mine.last_acquire is None:
+                key = (inode, node)
+                self.unblamed[key] = self.unblamed.get(key, 0) + count
+            elif mine.last_acquire != node:
+                self._node(mine.last_acquire).caused += count
+
+        for inode, i in other.inodes.iteritems():
+            if inode in self.inodes:
+                _merge_stats(self.inodes[inode], i)
+            else:
+                self.inodes[inode] = i
+        self.dropped += other.dropped
+        if len(self.inodes) > self.max_inodes:
+            self._trim()
+        for name, n in other.nodes.iteritems():
+            if name in self.nodes:
+                _merge_stats(self.nodes[name], n)
+            else:
+                self.nodes[name] = n
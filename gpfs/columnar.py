@@ -0,0 +1,181 @@
+import glob
+import numpy as np
+import os
+from array import array
+
+# parquet needs pyarrow, without it the batches go to .npz files
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+# the columns of each table, times are epoch seconds. node is the report
+#   the row came from in a directory parse (empty otherwise), dest the
+#   node an RPC was sent to. the string columns are dictionary encoded in
+#   parquet, byte strings in npz
+TABLES = {
+    'ios':  ('node', 'disknum', 'diskaddr', 'pid', 'optype', 'nsd_id',
+             'inode', 'block', 'nsectors', 'qio_epoch', 'sio_epoch',
+             'fio_epoch'),
+    'rpcs': ('node', 'msg_id', 'pid', 'msg', 'dest', 'send_epoch',
+             'reply_epoch', 'rtt'),
+}
+
+
+class IOColumns(object):
+    """Every finished IO (an IOMatcher consumer) in flat columns, until
+    they are written out, see columns()"""
+
+    def __init__(self):
+        self.clear()
+
+    def __len__(self):
+        return len(self.disknum)
+
+    def clear(self):
+        """Forgets the IOs"""
+
+        self.disknum = array('l')
+        self.diskaddr = array('l')
+        self.pid = array('l')
+        self.nsectors = array('l')
+        self.inode = array('l')
+        self.block = array('l')
+        self.optype = []        # interned strings
+        self.nsd_id = []
+        self.qio_time = array('d')
+        self.sio_time = array('d')
+        self.fio_time = array('d')
+
+    def add(self, record):
+        """Adds a finished IO (an IORecord)"""
+
+        self.disknum.append(record.disknum)
+        self.diskaddr.append(record.diskaddr)
+        self.pid.append(record.pid)
+        self.nsectors.append(record.nsectors)
+        self.inode.append(record.inode)
+        self.block.append(record.block)
+        self.optype.append(record.optype)
+        self.nsd_id.append(record.diskid)
+        self.qio_time.append(record.qio_time)
+        self.sio_time.append(record.sio_time)
+        self.fio_time.append(record.fio_time)
+
+    def columns(self, start_epoch, node=''):
+        """Returns the 'ios' table columns, a dict of column name -> numpy
+        array, with the trace times put on the epoch of the trace start
+
+        @param node: what goes in the node column, the report of the node
+            in a directory parse
+        @type node: string
+        """
+
+        def ints(a, dtype):
+            return np.frombuffer(a, dtype=a.typecode).astype(dtype)
+
+        return {'node':         np.repeat(np.array([node]), len(self)),
+                'disknum':      ints(self.disknum, np.int32),
+                'diskaddr':     ints(self.diskaddr, np.int64),
+                'pid':          ints(self.pid, np.int32),
+                'optype':       np.array(self.optype, dtype=str),
+                'nsd_id':       np.array(self.nsd_id, dtype=str),
+                'inode':        ints(self.inode, np.int64),
+                'block':        ints(self.block, np.int64),
+                'nsectors':     ints(self.nsectors, np.int32),
+                'qio_epoch':    np.frombuffer(self.qio_time, dtype='d') +
+                                    start_epoch,
+                'sio_epoch':    np.frombuffer(self.sio_time, dtype='d') +
+                                    start_epoch,
+                'fio_epoch':    np.frombuffer(self.fio_time, dtype='d') +
+                                    start_epoch}
+
+
+def _arrow_column(values):
+    """numpy column -> arrow array, strings dictionary encoded"""
+
+    if values.dtype.kind != 'S':
+        return pyarrow.array(values)
+    names, codes = np.unique(values, return_inverse=True)
+    return pyarrow.DictionaryArray.from_arrays(codes.astype(np.int32),
+                pyarrow.array([n.decode('utf-8') for n in names]))
+
+
+class ColumnWriter(object):
+    """Writes the tables of TABLES to a directory a batch at a time, for
+    pandas/DuckDB and the like: <directory>/<table>.parquet with a row
+    group per batch if pyarrow can be imported, or else numbered .npz
+    files of one batch each (<table>-00000.npz, ...), see read_columns.
+
+    A TraceParser hands it batches of about batch_size rows as the IOs
+    finish (see TraceParser.export_to), so the rows don't pile up in
+    memory. close() it when the parse is done.
+    """
+
+    def __init__(self, directory, batch_size=65536, format=None):
+        if format is None:
+            format = 'parquet' if pyarrow is not None else 'npz'
+        if format not in ('parquet', 'npz'):
+            raise ValueError("unknown format {0}".format(format))
+        if format == 'parquet' and pyarrow is None:
+            raise ValueError("parquet needs pyarrow")
+        self.directory = directory
+        self.batch_size = batch_size
+        self.format = format
+        self.rows = dict((table, 0) for table in TABLES)
+        self._batches = dict((table, 0) for table in TABLES)
+        self._parquet = {}      # table -> ParquetWriter
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+    def write(self, table, columns):
+        """Writes a batch of rows of a table, columns is a dict of column
+        name -> numpy array (all of TABLES[table], the same length)"""
+
+        names = TABLES[table]
+        num_rows = len(columns[names[0]])
+        if not num_rows:
+            return
+        if self.format == 'parquet':
+            batch = pyarrow.Table.from_arrays(
+                        [_arrow_column(columns[n]) for n in names],
+                        names=list(names))
+            writer = self._parquet.get(table)
+            if writer is None:
+                writer = self._parquet[table] = pyarrow.parquet.ParquetWriter(
+                    os.path.join(self.directory, table + '.parquet'),
+                    batch.schema)
+            writer.write_table(batch)
+        else:
+            np.savez(os.path.join(self.directory, '{0}-{1:05d}.npz'.format(
+                        table, self._batches[table])),
+                     **dict((n, columns[n]) for n in names))
+        self._batches[table] += 1
+        self.rows[table] += num_rows
+
+    def close(self):
+        """Finishes the parquet files"""
+
+        for writer in self._parquet.itervalues():
+            writer.close()
+        self._parquet = {}
+
+
+def read_columns(directory, table):
+    """Reads a table a ColumnWriter wrote, either format, as a dict of
+    column name -> numpy array (ex: pandas.DataFrame(read_columns(...)))"""
+
+    filename = os.path.join(directory, table + '.parquet')
+    if os.path.exists(filename):
+        if pyarrow is None:
+            raise ValueError("reading parquet needs pyarrow")
+        frame = pyarrow.parquet.read_table(filename).to_pandas()
+        return dict((n, np.asarray(frame[n])) for n in frame.columns)
+
+    parts = sorted(glob.glob(os.path.join(directory, table + '-*.npz')))
+    names = TABLES[table]
+    if not parts:
+        return dict((n, np.array([])) for n in names)
+    batches = [np.load(part) for part in parts]
+    return dict((n, np.concatenate([b[n] for b in batches])) for n in names)
@@ -18,14 +18,14 @@ def stddev(data):
 
     try:
         length = len(data)
-        mean = float(sum(data)) / length
+        mean = math.fsum(data) / length
     except TypeError as te:
         # this only affects a few things right now
         print "Type error when try to compute the std deviation: {0}".format(te)
         #print "Most likely the list contains strings..."
         return
 
-    stddev = math.sqrt((1. / length) * sum([(x - mean) ** 2 for x in data]))
+    stddev = math.sqrt((1. / length) * math.fsum([(x - mean) ** 2 for x in data]))
     variance = stddev ** 2
     return stddev, variance
 
@@ -35,3 +35,196 @@ def zscore(raw, mean, stddev):
     zscore = (raw - mean) / stddev
 
     return zscore
+
+class Interner(object):
+    """Maps repeated strings (optypes, nsd ids, ...) to small ints
+
+    >>> optypes = Interner()
+    >>> optypes.add('write data')
+    0
+    >>> optypes.values[0]
+    'write data'
+    """
+
+    def __init__(self):
+        self.codes = {}
+        self.values = []
+
+    def __len__(self):
+        return len(self.values)
+
+    def add(self, value):
+        """Returns the code for value, assigning a new one if needed"""
+
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+class RunningStats(object):
+    """Count, sum, max, mean and variance of a stream of values in
+    constant memory, using Welford's algorithm for the mean/variance"""
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = float('-inf')
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def add(self, x):
+        """Adds a value"""
+
+        self.count += 1
+        self.total += x
+        if x > self.max:
+            self.max = x
+        delta = x - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (x - self.mean)
+
+    def merge(self, other):
+        """Adds the values another RunningStats has seen (Chan et al.)"""
+
+        if not other.count:
+            return
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / count
+        self.m2 += other.m2 + delta ** 2 * self.count * other.count / count
+        self.count = count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+
+    def variance(self):
+        """Returns the (population) variance, same as stddev() does"""
+
+        if not self.count:
+            return 0.0
+        return self.m2 / self.count
+
+    def stddev(self):
+        """Returns the (population) standard deviation"""
+
+        return math.sqrt(self.variance())
+
+class QuantileSketch(object):
+    """Mergeable quantile sketch of a stream of positive values (io
+    times, ...), any percentile comes back within relative_error of the
+    real one (the DDSketch idea).
+
+    Values are counted into log scale bins, bin i covering
+    (gamma^(i-1), gamma^i] with gamma = (1 + e) / (1 - e), so the number
+    of bins only depends on the range of the values: 1ns to 1000s at 1%
+    is under 1400 bins. Values at or below min_value (ex: an io time of
+    0) are counted in a separate zero bin.
+
+    Two sketches made with the same relative_error merge exactly, so a
+    sketch per parse shard (or per node) can be added up afterwards. The
+    state is a few ints and a dict, see to_dict/from_dict.
+
+    >>> s = QuantileSketch()
+    >>> for x in range(1, 1001):
+    ...     s.add(x / 1000.0)
+    >>> abs(s.percentile(50) - 0.5) < 0.5 * 0.01
+    True
+    """
+
+    def __init__(self, relative_error=0.01, min_value=1e-9):
+        self.relative_error = relative_error
+        self.min_value = min_value
+        self.gamma = (1 + relative_error) / (1 - relative_error)
+        self._log_gamma = math.log(self.gamma)
+        self.bins = {}      # bin index -> count
+        self.zeros = 0      # values <= min_value
+        self.count = 0
+        self.min = float('inf')
+        self.max = float('-inf')
+
+    def __len__(self):
+        return self.count
+
+    def index(self, value):
+        """Returns the bin index of a value above min_value"""
+
+        return int(math.ceil(math.log(value) / self._log_gamma))
+
+    def add(self, value, count=1):
+        """Adds a value, count times"""
+
+        if value <= self.min_value:
+            self.zeros += count
+        else:
+            i = self.index(value)
+            self.bins[i] = self.bins.get(i, 0) + count
+        self.count += count
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+
+    def merge(self, other):
+        """Adds the values another sketch has seen"""
+
+        if other.gamma != self.gamma or other.min_value != self.min_value:
+            raise ValueError("can't merge sketches with different bins")
+        for i, c in other.bins.iteritems():
+            self.bins[i] = self.bins.get(i, 0) + c
+        self.zeros += other.zeros
+        self.count += other.count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    def percentiles(self, percentiles):
+        """Returns the estimates of a list of percentiles (0-100), nan if
+        nothing was added"""
+
+        if not self.count:
+            return [float('nan')] * len(percentiles)
+
+        # the ranks wanted, walked through the bins in order
+        wanted = sorted((p / 100.0 * (self.count - 1), n)
+                            for n, p in enumerate(percentiles))
+        result = [None] * len(percentiles)
+        bins = iter(sorted(self.bins.iteritems()))
+        seen = self.zeros
+        value = max(self.min, 0.0)
+        for rank, n in wanted:
+            while seen <= rank:
+                i, c = next(bins)
+                seen += c
+                # the middle of the bin, in relative terms
+                value = 2 * self.gamma ** i / (self.gamma + 1)
+            result[n] = min(max(value, self.min), self.max)
+        return result
+
+    def percentile(self, p):
+        """Returns the estimate of one percentile (0-100)"""
+
+        return self.percentiles([p])[0]
+
+    def to_dict(self):
+        """Returns the state as plain types (json safe)"""
+
+        return {'relative_error': self.relative_error,
+                'min_value': self.min_value,
+                'bins': dict((str(i), c) for i, c in self.bins.iteritems()),
+                'zeros': self.zeros,
+                'count': self.count,
+                'min': self.min if self.count else None,
+                'max': self.max if self.count else None}
+
+    @classmethod
+    def from_dict(cls, d):
+        """Makes a sketch from the state from to_dict, or of bin counts
+        gathered elsewhere (ex: with numpy)"""
+
+        sketch = cls(d['relative_error'], d['min_value'])
+        sketch.bins = dict((int(i), c) for i, c in d['bins'].iteritems())
+        sketch.zeros = d['zeros']
+        sketch.count = d['count']
+        if d['count']:
+            sketch.min = d['min']
+            sketch.max = d['max']
+        return sketch
@@ -0,0 +1,163 @@
+import numpy as np
+import struct
+import zlib
+from array import array
+
+# default LBA region size (bytes)
+REGION_SIZE = 1024 ** 3
+
+
+def _grow(counts, rows, cols):
+    """Returns counts padded with zeros to at least rows x cols, growing
+    by doubling so a disk seen a bit at a time isn't copied every time"""
+
+    have_rows, have_cols = counts.shape
+    if rows <= have_rows and cols <= have_cols:
+        return counts
+    if rows > have_rows:
+        rows = max(rows, have_rows * 2)
+    if cols > have_cols:
+        cols = max(cols, have_cols * 2)
+    bigger = np.zeros((max(rows, have_rows), max(cols, have_cols)),
+                      dtype=counts.dtype)
+    bigger[:have_rows, :have_cols] = counts
+    return bigger
+
+
+class LBAHeatMap(object):
+    """Counts the IOs and the bytes that hit each region of each disk, a
+    disk x LBA region matrix.
+
+    The IOs are buffered in flat arrays and binned batch_size at a time,
+    so memory is the matrix (number of disks x disk size / region_size)
+    plus one batch, however long the trace is. An IO is counted in the
+    region its first sector is in.
+    """
+
+    def __init__(self, region_size=REGION_SIZE, sector_size=512,
+            batch_size=100000):
+        self.region_size = region_size
+        self.sector_size = sector_size
+        self.batch_size = batch_size
+        self.rows = {}      # disknum -> row of the matrix
+        self._ios = np.zeros((0, 0), dtype=np.int64)
+        self._bytes = np.zeros((0, 0), dtype=np.int64)
+        self._disknum = array('l')
+        self._diskaddr = array('l')
+        self._nsectors = array('l')
+
+    def add(self, disknum, diskaddr, nsectors):
+        """Counts one IO, diskaddr and nsectors are in sectors"""
+
+        self._disknum.append(disknum)
+        self._diskaddr.append(diskaddr)
+        self._nsectors.append(nsectors)
+        if len(self._disknum) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """Bins the buffered IOs into the matrix"""
+
+        if not self._disknum:
+            return
+        disknums = np.frombuffer(self._disknum, dtype=self._disknum.typecode)
+        offsets = np.frombuffer(self._diskaddr, dtype=self._diskaddr.typecode)
+        nbytes = np.frombuffer(self._nsectors, dtype=self._nsectors.typecode) \
+            * self.sector_size
+        regions = offsets * self.sector_size // self.region_size
+
+        uniq, codes = np.unique(disknums, return_inverse=True)
+        for d in uniq.tolist():
+            if d not in self.rows:
+                self.rows[d] = len(self.rows)
+        rows = np.array([self.rows[d] for d in uniq.tolist()],
+                        dtype=np.int64)[codes]
+
+        num_cols = max(self._ios.shape[1], int(regions.max()) + 1)
+        self._ios = _grow(self._ios, len(self.rows), num_cols)
+        self._bytes = _grow(self._bytes, len(self.rows), num_cols)
+
+        # each cell hit in this batch once, with its sums
+        cells = rows * self._ios.shape[1] + regions
+        order = np.argsort(cells, kind='mergesort')
+        cells, first = np.unique(cells[order], return_index=True)
+        counts = np.diff(np.append(first, len(order)))
+        self._ios.ravel()[cells] += counts
+        self._bytes.ravel()[cells] += np.add.reduceat(nbytes[order], first)
+
+        self._disknum = array('l')
+        self._diskaddr = array('l')
+        self._nsectors = array('l')
+
+    def matrix(self):
+        """Returns (disks, ios, bytes), the disk numbers in ascending
+        order and the IO and byte counts of each of their regions, arrays
+        of shape (len(disks), number of regions)"""
+
+        self.flush()
+        disks = np.array(sorted(self.rows), dtype=np.int64)
+        order = [self.rows[d] for d in disks.tolist()]
+        num_cols = 0
+        if self._ios.size:
+            hit = np.nonzero(self._ios.any(axis=0))[0]
+            num_cols = int(hit.max()) + 1 if len(hit) else 0
+        return (disks, self._ios[order, :num_cols],
+                self._bytes[order, :num_cols])
+
+    def save(self, filename):
+        """Writes the matrix to a compressed .npz file, with the disks
+        and the region size"""
+
+        disks, ios, nbytes = self.matrix()
+        np.savez_compressed(filename, disks=disks, ios=ios, bytes=nbytes,
+                            region_size=np.array([self.region_size]))
+
+    def write_png(self, filename, what='ios', row_height=None):
+        """Writes the matrix as a PNG heat map, a row per disk (top to
+        bottom in disk number order) and a column per region, black for
+        regions without IOs through red and yellow to white for the
+        busiest, on a log scale
+
+        @param what: 'ios' or 'bytes'
+        @type what: string
+
+        @param row_height: pixels per disk, by default enough to make the
+            image about 400 pixels high
+        @type row_height: int
+        """
+
+        disks, ios, nbytes = self.matrix()
+        counts = ios if what == 'ios' else nbytes
+        if not counts.size:
+            counts = np.zeros((1, 1), dtype=np.int64)
+        if row_height is None:
+            row_height = max(1, 400 // counts.shape[0])
+
+        scaled = np.log1p(counts.astype(np.float64))
+        if scaled.max() > 0:
+            scaled /= scaled.max()
+        # black -> red -> yellow -> white
+        rgb = np.clip(np.dstack((scaled * 3, scaled * 3 - 1, scaled * 3 - 2)),
+                      0, 1)
+        pixels = np.repeat((rgb * 255).astype(np.uint8), row_height, axis=0)
+        _write_png(filename, pixels)
+
+
+def _write_png(filename, pixels):
+    """Writes an RGB image (uint8 array of shape (height, width, 3)) as a
+    PNG file, no imaging library needed"""
+
+    def chunk(kind, data):
+        return struct.pack('>I', len(data)) + kind + data + \
+            struct.pack('>I', zlib.crc32(kind + data) & 0xffffffff)
+
+    height, width = pixels.shape[:2]
+    # every scanline starts with its filter type, 0 (none)
+    raw = np.zeros((height, width * 3 + 1), dtype=np.uint8)
+    raw[:, 1:] = pixels.reshape(height, width * 3)
+    with open(filename, 'wb') as f:
+        f.write('\x89PNG\r\n\x1a\n')
+        f.write(chunk('IHDR', struct.pack('>IIBBBBB', width, height, 8, 2,
+                                          0, 0, 0)))
+        f.write(chunk('IDAT', zlib.compress(raw.tostring(), 6)))
+        f.write(chunk('IEND', ''))
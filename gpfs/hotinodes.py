@@ -0,0 +1,195 @@
+import math
+import numpy as np
+from array import array
+
+# what the inodes are ranked on, in the order of the sketch tables
+METRICS = ('bytes', 'ios', 'io_time')
+
+# odd 64 bit multipliers of the multiply-shift hash of each sketch row.
+#   fixed, so the sketches of every worker and node hash the same way
+_MULTIPLIERS = (0x9E3779B97F4A7C15, 0xC2B2AE3D27D4EB4F, 0x165667B19E3779F9,
+                0xD6E8FEB86659FD93, 0xFF51AFD7ED558CCD, 0xC4CEB9FE1A85EC53,
+                0x27D4EB2F165667C5, 0x94D049BB133111EB)
+
+
+class HotInodes(object):
+    """The inodes that got the most bytes, IOs and io time, out of any
+    number of inodes, in bounded memory.
+
+    Every IO is counted into a count-min sketch per metric (depth rows of
+    width counters, an inode's estimate is the smallest of its counters,
+    never under the real sum and, with probability 1 - e^-depth, over it
+    by at most e / width of the total, see error_bounds). Next to the
+    sketch the inodes with the highest estimates of each metric are kept
+    as candidates (by default 100 * top, at least 1000), with the disks
+    their IOs hit since they became one, so the disk spread of an inode
+    that only got hot late in the trace is a lower bound.
+
+    The top list is a heuristic: it is the top of the candidates, which
+    are picked a batch at a time, so an inode that is hot overall but
+    spread thin over the trace can be missed. There are many more
+    candidates than top for that.
+
+    The IOs are buffered in flat arrays and counted batch_size at a time
+    with numpy. The sketches of the same width and depth add up, so a
+    worker or node directory each fill their own and they are merged
+    after, the union of their candidates re-ranked on the merged sketch.
+    """
+
+    def __init__(self, top=10, width=16384, depth=4, sector_size=512,
+            batch_size=100000, candidates=None):
+        if width & (width - 1) or not 0 < depth <= len(_MULTIPLIERS):
+            raise ValueError("width must be a power of 2 and depth at most "
+                             "{0}".format(len(_MULTIPLIERS)))
+        self.top = top
+        # candidates kept per metric
+        self.capacity = candidates or max(1000, 100 * top)
+        self.width = width
+        self.depth = depth
+        self.sector_size = sector_size
+        self.batch_size = batch_size
+        self.tables = np.zeros((len(METRICS), depth, width), dtype=np.float64)
+        self.totals = np.zeros(len(METRICS), dtype=np.float64)
+        self.candidates = {}        # inode -> set of disk numbers
+        self._shift = np.uint64(64 - int(math.log(width, 2)))
+        self._inode = array('l')
+        self._disknum = array('l')
+        self._nsectors = array('l')
+        self._iotime = array('d')
+
+    def add(self, record):
+        """Counts a finished IO (an IORecord)"""
+
+        self._inode.append(record.inode)
+        self._disknum.append(record.disknum)
+        self._nsectors.append(record.nsectors)
+        self._iotime.append(record.fio_time - record.sio_time)
+        if len(self._inode) >= self.batch_size:
+            self.flush()
+
+    def _cells(self, inodes):
+        """Returns the counter of each inode in each row of the sketch, an
+        array of shape (depth, len(inodes))"""
+
+        keys = inodes.astype(np.uint64)
+        return np.vstack([(keys * np.uint64(m)) >> self._shift
+                            for m in _MULTIPLIERS[:self.depth]]).astype(np.intp)
+
+    def estimates(self, inodes):
+        """Returns the sketch estimates of a list of inodes, an array of
+        shape (len(METRICS), len(inodes))"""
+
+        inodes = np.asarray(inodes, dtype=np.int64)
+        if not len(inodes):
+            return np.zeros((len(METRICS), 0))
+        rows = np.arange(self.depth)[:, np.newaxis]
+        return self.tables[:, rows, self._cells(inodes)].min(axis=1)
+
+    def flush(self):
+        """Counts the buffered IOs into the sketch and updates the
+        candidates"""
+
+        if not self._inode:
+            return
+        inodes = np.frombuffer(self._inode, dtype=self._inode.typecode)
+        disknums = np.frombuffer(self._disknum, dtype=self._disknum.typecode)
+        nbytes = np.frombuffer(self._nsectors,
+                               dtype=self._nsectors.typecode) * \
+            float(self.sector_size)
+        iotimes = np.frombuffer(self._iotime, dtype=np.float64)
+        # no SIO seen, no io time
+        iotimes = np.where(iotimes == iotimes, iotimes, 0.0)
+
+        # each inode once, with its sums, then into every row
+        uniq, codes = np.unique(inodes, return_inverse=True)
+        sums = (np.bincount(codes, nbytes, len(uniq)),
+                np.bincount(codes, None, len(uniq)).astype(np.float64),
+                np.bincount(codes, iotimes, len(uniq)))
+        cells = self._cells(uniq)
+        for m, values in enumerate(sums):
+            self.totals[m] += values.sum()
+            for row in range(self.depth):
+                self.tables[m, row] += np.bincount(cells[row], values,
+                                                   self.width)
+
+        # the inodes of this batch that are now among the top of any
+        #   metric join the candidates, and the candidates keep track of
+        #   the disks they hit
+        est = self.estimates(uniq)
+        for m in range(len(METRICS)):
+            order = np.argsort(-est[m], kind='mergesort')[:self.capacity]
+            for inode in uniq[order].tolist():
+                if inode not in self.candidates:
+                    self.candidates[inode] = set()
+        wanted = np.in1d(inodes, np.array(self.candidates.keys(),
+                                           dtype=np.int64))
+        hits, disks = inodes[wanted], disknums[wanted]
+        order = np.lexsort((disks, hits))
+        hits, disks = hits[order], disks[order]
+        first = np.ones(len(hits), dtype=bool)
+        first[1:] = (hits[1:] != hits[:-1]) | (disks[1:] != disks[:-1])
+        for inode, disk in zip(hits[first].tolist(), disks[first].tolist()):
+            self.candidates[inode].add(disk)
+        self._trim()
+
+        self._inode = array('l')
+        self._disknum = array('l')
+        self._nsectors = array('l')
+        self._iotime = array('d')
+
+    def _trim(self):
+        """Keeps the top capacity candidates of each metric, ties go to the
+        lower inode numbers"""
+
+        inodes = np.array(sorted(self.candidates), dtype=np.int64)
+        if len(inodes) <= self.capacity:
+            return
+        est = self.estimates(inodes)
+        keep = set()
+        for m in range(len(METRICS)):
+            order = np.argsort(-est[m], kind='mergesort')[:self.capacity]
+            keep.update(inodes[order].tolist())
+        for inode in inodes.tolist():
+            if inode not in keep:
+                del self.candidates[inode]
+
+    def top_inodes(self, metric, n=None):
+        """Returns the top n (by default top) inodes by one of METRICS, a
+        list of dicts of the inode, the estimates of every metric and the
+        number of disks it was seen on, biggest first. The inodes whose
+        estimate isn't above the error bound of the metric are left out,
+        they can't be told apart from hash collisions"""
+
+        self.flush()
+        inodes = np.array(sorted(self.candidates), dtype=np.int64)
+        est = self.estimates(inodes)
+        m = METRICS.index(metric)
+        order = np.argsort(-est[m], kind='mergesort')[:n or self.top]
+        order = order[est[m, order] > self.error_bounds()[metric]]
+        return [{'inode':   int(inodes[i]),
+                 'bytes':   int(est[0, i]),
+                 'ios':     int(est[1, i]),
+                 'io_time': float(est[2, i]),
+                 'disks':   len(self.candidates[int(inodes[i])])}
+                    for i in order.tolist()]
+
+    def error_bounds(self):
+        """Returns how much each metric (a dict of METRICS) can be over
+        estimated by, with probability 1 - e^-depth"""
+
+        self.flush()
+        return dict((name, math.e / self.width * self.totals[m])
+                        for m, name in enumerate(METRICS))
+
+    def merge(self, other):
+        """Adds the IOs another HotInodes has counted"""
+
+        if other.width != self.width or other.depth != self.depth:
+            raise ValueError("can't merge sketches of different sizes")
+        self.flush()
+        other.flush()
+        self.tables += other.tables
+        self.totals += other.totals
+        for inode, disks in other.candidates.iteritems():
+            self.candidates.setdefault(inode, set()).update(disks)
+        self._trim()
@@ -0,0 +1,261 @@
+from collections import namedtuple
+
+_NAN = float('nan')
+
+# one finished IO, the trace times are nan when the QIO/SIO wasn't seen
+IORecord = namedtuple('IORecord', ['disknum', 'diskaddr', 'pid', 'nsectors',
+                                   'optype', 'diskid', 'inode', 'block',
+                                   'qio_time', 'sio_time', 'fio_time'])
+
+# one finished RDMA transfer, the start time is nan when it wasn't seen
+RDMARecord = namedtuple('RDMARecord', ['peer', 'optype', 'nbytes', 'status',
+                                       'start_time', 'done_time'])
+
+# one finished pair of byte range lock lines, see BRLMatcher
+BRLRecord = namedtuple('BRLRecord', ['kind', 'inode', 'lockrange', 'node',
+                                     'start_time', 'done_time'])
+
+# pending entry fields
+_QIO, _SIO, _HEAD = 0, 1, 2
+
+
+class IOMatcher(object):
+    """Matches the QIO/SIO/FIO lines of each IO, keeping only the IOs in
+    flight.
+
+    An IO id (disknum:diskaddr, pid) is pending from its QIO (or SIO)
+    until its FIO shows up, then an IORecord is handed to every consumer
+    and the IO is forgotten. Entries that don't see their FIO within
+    horizon seconds of trace time (ex: the "write logData" IOs whose FIO
+    has a different pid) are evicted and counted as orphans, so memory
+    follows the IO queue depth instead of the length of the trace.
+
+    A FIO with nothing pending is still handed on, without QIO/SIO times.
+    """
+
+    def __init__(self, horizon=300.0):
+        self.horizon = horizon
+        self.pending = {}       # IO id -> [qio time, sio time, head]
+        self.consumers = []     # callables taking an IORecord
+        self.orphans = 0
+        self.now = 0.0
+        self._next_sweep = 0.0
+
+        # a worker parsing a shard can't match the IOs that started in
+        #   an earlier shard, so (for a horizon from the start of the
+        #   shard) it saves the lines it can't resolve in heads, for the
+        #   parent to replay in merge()
+        self.partial = False
+        self.heads = []
+        self._head_until = None
+
+    def __getstate__(self):
+        # the consumers stay with the process that made them
+        state = self.__dict__.copy()
+        state['consumers'] = []
+        return state
+
+    def _emit(self, record):
+        for consumer in self.consumers:
+            consumer(record)
+
+    def _stale(self, entry, tracetime):
+        """True if an entry is older than the horizon"""
+
+        first = entry[_QIO] if entry[_QIO] == entry[_QIO] else entry[_SIO]
+        return first < tracetime - self.horizon
+
+    def _in_head(self, tracetime):
+        """True while a worker can still see IOs from an earlier shard"""
+
+        if self._head_until is None:
+            self._head_until = tracetime + self.horizon
+        return tracetime <= self._head_until
+
+    def _tick(self, tracetime):
+        self.now = tracetime
+        if tracetime >= self._next_sweep:
+            self.sweep(tracetime)
+
+    def sweep(self, tracetime):
+        """Evicts the entries older than the horizon"""
+
+        cutoff = tracetime - self.horizon
+        for oid, entry in self.pending.items():
+            if entry[_HEAD]:
+                continue    # the parent decides, see merge()
+            first = entry[_QIO] if entry[_QIO] == entry[_QIO] else entry[_SIO]
+            if first < cutoff:
+                del self.pending[oid]
+                self.orphans += 1
+        self._next_sweep = tracetime + self.horizon / 4
+
+    def add_qio(self, oid, tracetime):
+        """Records a queued IO"""
+
+        self._tick(tracetime)
+        entry = self.pending.get(oid)
+        if self.partial and (entry[_HEAD] if entry else
+                                self._in_head(tracetime)):
+            self.heads.append(('drop', oid, tracetime))
+        elif entry is not None:
+            # queued again before it finished, the old one is lost
+            self.orphans += 1
+        self.pending[oid] = [tracetime, _NAN, False]
+
+    def add_sio(self, oid, tracetime):
+        """Records a started IO"""
+
+        self._tick(tracetime)
+        entry = self.pending.get(oid)
+        if entry is not None and not entry[_HEAD] and \
+                self._stale(entry, tracetime):
+            del self.pending[oid]
+            self.orphans += 1
+            entry = None
+
+        if entry is None:
+            if self.partial and self._in_head(tracetime):
+                self.heads.append(('sio', oid, tracetime))
+                self.pending[oid] = [_NAN, tracetime, True]
+            else:
+                self.pending[oid] = [_NAN, tracetime, False]
+        elif entry[_HEAD]:
+            self.heads.append(('sio', oid, tracetime))
+            entry[_SIO] = tracetime
+        else:
+            entry[_SIO] = tracetime
+
+    def add_fio(self, oid, tracetime, disknum, diskaddr, pid, diskid,
+            optype, nsectors, inode, block):
+        """Records a finished IO and hands it to the consumers"""
+
+        self._tick(tracetime)
+        self._add_finished(oid, IORecord(disknum, diskaddr, pid, nsectors,
+                optype, diskid, inode, block, _NAN, _NAN, tracetime))
+
+    def _add_finished(self, oid, record):
+        entry = self.pending.pop(oid, None)
+        if entry is not None and entry[_HEAD]:
+            self.heads.append(('fio', oid, record))
+            return
+        if entry is None and self.partial and \
+                self._in_head(self._end_time(record)):
+            self.heads.append(('fio', oid, record))
+            return
+        self._finish(entry, record)
+
+    def _finish(self, entry, record):
+        if entry is not None:
+            if self._stale(entry, self._end_time(record)):
+                self.orphans += 1
+            else:
+                record = self._matched(entry, record)
+        self._emit(record)
+
+    def _end_time(self, record):
+        """The trace time a finished record was seen at"""
+
+        return record.fio_time
+
+    def _matched(self, entry, record):
+        """Fills in the times of a finished record from its pending entry"""
+
+        return record._replace(qio_time=entry[_QIO], sio_time=entry[_SIO])
+
+    def finish(self):
+        """Counts whatever is still pending at the end of the trace as
+        orphans"""
+
+        self.orphans += len(self.pending)
+        self.pending = {}
+
+    def merge(self, other):
+        """Merges the matcher of a worker that parsed a later part of the
+        same trace. The lines it held back are replayed here in order,
+        and the finished IOs are handed to our consumers."""
+
+        for op, oid, arg in other.heads:
+            if op == 'drop':
+                if self.pending.pop(oid, None) is not None:
+                    self.orphans += 1
+            elif op == 'sio':
+                self.add_sio(oid, arg)
+            else:
+                self._tick(self._end_time(arg))
+                self._finish(self.pending.pop(oid, None), arg)
+
+        # the IOs still in flight at the end of the worker's shard, the
+        #   ones it held back have been replayed above
+        for oid, entry in other.pending.iteritems():
+            if entry[_HEAD]:
+                continue
+            if oid in self.pending:
+                self.orphans += 1
+            self.pending[oid] = entry
+
+        self.orphans += other.orphans
+        if other.now > self.now:
+            self._tick(other.now)
+
+
+class RDMAMatcher(IOMatcher):
+    """Matches the start and completion lines of each RDMA transfer, the
+    same way IOMatcher does the SIO and FIO of an IO (a start is pending
+    until its completion shows up, or the horizon runs out).
+
+    The completion is handled by another thread than the one that posted
+    the transfer, so the id is (tag, peer) instead of having the pid in
+    it. The finished transfers are handed to the consumers as RDMARecords.
+    """
+
+    def add_start(self, oid, tracetime):
+        """Records a started transfer"""
+
+        self.add_sio(oid, tracetime)
+
+    def add_done(self, oid, tracetime, peer, optype, nbytes, status):
+        """Records a finished transfer and hands it to the consumers"""
+
+        self._tick(tracetime)
+        self._add_finished(oid, RDMARecord(peer, optype, nbytes, status,
+                                           _NAN, tracetime))
+
+    def _end_time(self, record):
+        return record.done_time
+
+    def _matched(self, entry, record):
+        return record._replace(start_time=entry[_SIO])
+
+
+class BRLMatcher(IOMatcher):
+    """Matches the byte range lock lines that go in pairs, on ids of
+    (kind, inode, range, node):
+
+        'wait':     acquire -> granted, the time a node waits for a lock
+        'hold':     granted -> release, the time it holds it
+        'revoke':   revoke -> release, the time it takes to give it up
+
+    The finished pairs are handed to the consumers as BRLRecords. A
+    release with no revoke pending comes out as a 'revoke' record without
+    a start time.
+    """
+
+    def add_start(self, oid, tracetime):
+        """Records the first line of a pair"""
+
+        self.add_sio(oid, tracetime)
+
+    def add_done(self, oid, tracetime):
+        """Records the second line of a pair and hands it on"""
+
+        self._tick(tracetime)
+        kind, inode, lockrange, node = oid
+        self._add_finished(oid, BRLRecord(kind, inode, lockrange, node,
+                                          _NAN, tracetime))
+
+    def _end_time(self, record):
+        return record.done_time
+
+    def _matched(self, entry, record):
+        return record._replace(start_time=entry[_SIO])
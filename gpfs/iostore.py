@@ -0,0 +1,737 @@
+import numpy as np
+from array import array
+from bisect import bisect
+from gpfs.funcs import Interner, QuantileSketch, RunningStats
+
+# default io size bucket edges (bytes), the 128K metadata buckets up to 1M
+#   and the 1M data buckets up to 8M that print_disk_summary reports
+SIZE_BUCKETS = range(0, 1048576, 131072) + range(1048576, 9437184, 1048576)
+
+# the percentiles of the io times print_disk_summary reports
+PERCENTILES = (50.0, 90.0, 99.0, 99.9)
+
+
+def log_buckets(low, high, per_decade=4):
+    """Log scale bucket edges, with a 0 edge in front for everything
+    below low
+
+    @param low: the first edge past 0 (ex: 10us)
+    @type low: float
+
+    @param high: the last edge, anything past it goes in the last bucket
+    @type high: float
+
+    @param per_decade: number of buckets for each power of 10
+    @type per_decade: int
+
+    @return: sorted bucket edges
+    @rtype: list
+    """
+
+    num = int(round(np.log10(float(high) / low) * per_decade)) + 1
+    return [0.0] + list(np.logspace(np.log10(low), np.log10(high), num))
+
+# default io time bucket edges (secs), 10us to 100s
+LATENCY_BUCKETS = log_buckets(1e-5, 100.0)
+
+
+def group_slices(keys):
+    """Groups an array of keys, the vectorized version of building a
+    dict of lists.
+
+    @param keys: keys to group on (disk numbers, ...)
+    @type keys: numpy array
+
+    @return: (order, uniq, starts, ends), keys[order][starts[i]:ends[i]]
+        are all equal to uniq[i]
+    @rtype: tuple
+    """
+
+    order = np.argsort(keys, kind='mergesort')
+    uniq, starts = np.unique(keys[order], return_index=True)
+    ends = np.append(starts[1:], len(keys))
+    return order, uniq, starts, ends
+
+
+def bucket_counts(rows, num_rows, values, buckets):
+    """Counts values into buckets, per row
+
+    @param rows: the row (disk) index of each value
+    @type rows: numpy array
+
+    @param num_rows: number of rows
+    @type num_rows: int
+
+    @param values: the values to count, same length as rows
+    @type values: numpy array
+
+    @param buckets: sorted lower edges of the buckets, anything past
+        the last edge goes into the last bucket, and anything below the
+        first edge into the first bucket
+    @type buckets: list
+
+    @return: counts, shape (num_rows, len(buckets))
+    @rtype: numpy array
+    """
+
+    b = np.maximum(np.searchsorted(buckets, values, side='right') - 1, 0)
+    counts = np.bincount(rows * len(buckets) + b,
+                         minlength=num_rows * len(buckets))
+    return counts.reshape(num_rows, len(buckets))
+
+def group_percentiles(groups, values, percentiles):
+    """Percentiles of the values of each group, for all groups at once,
+    interpolated like numpy.percentile
+
+    @param groups: the group of each value
+    @type groups: numpy array
+
+    @param values: the values, nan values are left out
+    @type values: numpy array
+
+    @param percentiles: the percentiles wanted, 0-100
+    @type percentiles: list
+
+    @return: dict of group -> list of the percentiles
+    @rtype: dict
+    """
+
+    keep = ~np.isnan(values)
+    groups, values = groups[keep], values[keep]
+    order = np.lexsort((values, groups))
+    uniq, starts = np.unique(groups[order], return_index=True)
+    if not len(uniq):
+        return {}
+    values = values[order]
+    counts = np.append(starts[1:], len(values)) - starts
+
+    # fractional rank of each percentile within each group
+    rank = (counts[:, None] - 1) * (np.asarray(percentiles) / 100.0)[None, :]
+    lo = np.floor(rank).astype(np.int64)
+    hi = np.minimum(lo + 1, counts[:, None] - 1)
+    frac = rank - lo
+    lo_v = values[starts[:, None] + lo]
+    hi_v = values[starts[:, None] + hi]
+    pcts = lo_v + (hi_v - lo_v) * frac
+    return dict((g, list(pcts[i])) for i, g in enumerate(uniq))
+
+def robust_zscores(groups, values):
+    """Modified z-scores of the values against the median and the MAD
+    (median absolute deviation) of their group, 0.6745 * (x - median) /
+    MAD. Unlike the mean and standard deviation, those don't get dragged
+    along by the outliers themselves, so a score over 3.5 or so is an
+    outlier whatever the spread of the rest.
+
+    A group with a MAD of 0 (half of its values the same) is scaled by
+    its mean absolute deviation instead, and one without any spread at
+    all scores 0.
+
+    @param groups: the group of each value (ex: disk class codes)
+    @type groups: numpy array
+
+    @param values: the values, nan values score nan
+    @type values: numpy array
+
+    @return: the scores, same length as values
+    @rtype: numpy array
+    """
+
+    values = np.asarray(values, dtype=np.float64)
+    scores = np.empty(len(values))
+    scores.fill(np.nan)
+    keep = ~np.isnan(values)
+    if not keep.any():
+        return scores
+    uniq, rows = np.unique(np.asarray(groups)[keep], return_inverse=True)
+    values = values[keep]
+
+    def medians(v):
+        m = group_percentiles(rows, v, [50.0])
+        return np.array([m[i][0] for i in range(len(uniq))])
+
+    median = medians(values)[rows]
+    dev = np.abs(values - median)
+    mad = medians(dev)
+    mean_ad = np.bincount(rows, weights=dev) / np.bincount(rows)
+    scale = np.where(mad > 0, mad / 0.6745, mean_ad * 1.253314)[rows]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        scores[keep] = np.where(scale > 0, (values - median) / scale, 0.0)
+    return scores
+
+def _depth_steps(groups, starts, ends):
+    """The sweep line over a set of intervals (ex: QIO -> SIO of each IO)
+    of each group, as a step function: each interval is a +1 at its start
+    and a -1 at its end, sorted by group and time (ends first on ties),
+    and the running sum is the number of intervals open right after each
+    step. Every group's steps add up to 0, so the running sum over all
+    the groups comes back to 0 between them.
+
+    @return: (groups, times, depths) of the steps
+    @rtype: tuple
+    """
+
+    with np.errstate(invalid='ignore'):
+        keep = ends > starts    # nan and empty intervals never open
+    groups = np.tile(np.asarray(groups)[keep], 2)
+    times = np.concatenate((starts[keep], ends[keep]))
+    steps = np.repeat(np.array([1, -1], dtype=np.int64), keep.sum())
+    order = np.lexsort((steps, times, groups))
+    return groups[order], times[order], np.cumsum(steps[order])
+
+def interval_depths(groups, num_groups, starts, ends):
+    """Queue depth of each group, the most intervals open at once and the
+    time integral of the number open (the sum of the interval lengths,
+    divided by a span of time it's the average depth over that span)
+
+    @param groups: the group of each interval, 0 to num_groups - 1
+    @type groups: numpy array
+
+    @param starts: start time of each interval, nan if not seen
+    @type starts: numpy array
+
+    @param ends: end time of each interval, nan if not seen
+    @type ends: numpy array
+
+    @return: (max depths, integrals), one of each per group
+    @rtype: tuple
+    """
+
+    groups, times, depths = _depth_steps(groups, starts, ends)
+    most = np.zeros(num_groups, dtype=np.int64)
+    integral = np.zeros(num_groups)
+    if len(depths):
+        uniq, first = np.unique(groups, return_index=True)
+        most[uniq] = np.maximum.reduceat(depths, first)
+        # the depth after the last step of a group is 0
+        widths = np.append(np.diff(times), 0.0)
+        integral = np.bincount(groups, weights=depths * widths,
+                               minlength=num_groups)
+    return most, integral
+
+def window_depths(groups, num_groups, starts, ends, start, window, num_windows):
+    """Queue depth of each group in each window of time, the average
+    (time weighted) number of intervals open and the most open at once
+
+    @param start: start time of window 0
+    @type start: float
+
+    @param window: window size
+    @type window: float
+
+    @param num_windows: number of windows
+    @type num_windows: int
+
+    @return: (averages, maxes), arrays of shape (num_groups, num_windows)
+    @rtype: tuple
+
+    Two intervals ending at 6.0, and one ending at 9.7 as another starts:
+
+    >>> groups = np.zeros(4, dtype=np.int64)
+    >>> starts = np.array([3.9, 4.4, 8.0, 9.7])
+    >>> ends = np.array([6.0, 6.0, 9.7, 10.5])
+    >>> averages, maxes = window_depths(groups, 1, starts, ends, 0.0, 1.0, 11)
+    >>> maxes[0].tolist()
+    [0, 0, 0, 1, 2, 2, 0, 0, 1, 1, 1]
+    >>> averages[0, 6]
+    0.0
+    """
+
+    shape = (num_groups, num_windows)
+    groups, times, depths = _depth_steps(groups, starts, ends)
+    if not len(depths):
+        return np.zeros(shape), np.zeros(shape, dtype=np.int64)
+    edges = start + window * np.arange(num_windows + 1)
+
+    # the time integral of the depth up to each step, it only grows
+    #   within a group. (group, time) is folded into one sorted key, so the
+    #   step before each window edge of each group is one searchsorted
+    widths = np.append(np.diff(times), 0.0)
+    integral = np.append(0.0, np.cumsum(depths * widths)[:-1])
+    low = min(times.min(), edges[0])
+    stride = max(times.max(), edges[-1]) - low + 1.0
+    keys = groups * stride + (times - low)
+    edge_keys = (np.arange(num_groups)[:, None] * stride +
+                    (edges - low)[None, :]).ravel()
+    before = np.searchsorted(keys, edge_keys, side='right') - 1
+    found = before >= 0
+    before = np.maximum(before, 0)
+    at_edge = np.where(found, depths[before], 0).reshape(num_groups, -1)
+    upto = np.where(found, integral[before] + depths[before] *
+                        (np.repeat(edges[None, :], num_groups, 0).ravel() -
+                         times[before]), 0.0).reshape(num_groups, -1)
+    averages = np.diff(upto, axis=1) / window
+
+    # the most open at once is the depth a window starts with, or right
+    #   after one of its steps. steps at the same time of a group happen
+    #   at once, only the depth after the last of them was ever open
+    maxes = at_edge[:, :-1].copy()
+    last = np.append((groups[1:] != groups[:-1]) | (times[1:] != times[:-1]),
+                     True)
+    inside = last & (times >= edges[0]) & (times < edges[-1])
+    cells = groups[inside] * num_windows + np.minimum(
+                ((times[inside] - start) / window).astype(np.int64),
+                num_windows - 1)
+    if len(cells):
+        uniq, first = np.unique(cells, return_index=True)
+        flat = maxes.ravel()
+        flat[uniq] = np.maximum(flat[uniq],
+                                np.maximum.reduceat(depths[inside], first))
+        maxes = flat.reshape(shape)
+    return averages, maxes
+
+
+class IOStore(object):
+    """Columnar store of the finished IOs in a trace, one row per IO.
+
+    The IOMatcher hands each finished IO to add(). The columns are flat
+    arrays, and the nsd ids and optype strings are kept once in lookup
+    tables, so a few million IOs only take a few hundred MB. Use arrays()
+    to get numpy views of the columns to compute on.
+    """
+
+    # column name, array typecode
+    _COLUMNS = (('qio_time', 'd'),     # trace times, nan if not seen
+                ('sio_time', 'd'),
+                ('fio_time', 'd'),
+                ('disknum',  'l'),
+                ('diskaddr', 'l'),
+                ('nsectors', 'l'),
+                ('pid',      'l'),
+                ('optype',   'i'),     # code in self.optypes
+                ('diskid',   'i'),     # code in self.diskids
+                ('inode',    'l'),     # the IO tags
+                ('block',    'l'))
+
+    def __init__(self, sector_size=512):
+        self.sector_size = sector_size
+        self.optypes = Interner()
+        self.diskids = Interner()
+        self._arrays = None
+        for name, typecode in self._COLUMNS:
+            setattr(self, name, array(typecode))
+
+    @classmethod
+    def from_arrays(cls, cols, optypes, diskids, sector_size=512):
+        """Makes a read only store on top of numpy arrays (ex: memory
+        mapped from a parse cache), nothing can be added to it
+
+        @param cols: dict of column name -> numpy array
+        @type cols: dict
+
+        @param optypes: the optype strings, in code order
+        @type optypes: list
+
+        @param diskids: the nsd id strings, in code order
+        @type diskids: list
+
+        @return: the store
+        @rtype: IOStore
+        """
+
+        store = cls(sector_size)
+        for v in optypes:
+            store.optypes.add(v)
+        for v in diskids:
+            store.diskids.add(v)
+        store._arrays = cols
+        for name, typecode in cls._COLUMNS:
+            setattr(store, name, None)
+        return store
+
+    def __len__(self):
+        if self._arrays is not None:
+            return len(self._arrays['disknum'])
+        return len(self.disknum)
+
+    def add(self, record):
+        """Adds a finished IO (an IORecord)"""
+
+        self.qio_time.append(record.qio_time)
+        self.sio_time.append(record.sio_time)
+        self.fio_time.append(record.fio_time)
+        self.disknum.append(record.disknum)
+        self.diskaddr.append(record.diskaddr)
+        self.nsectors.append(record.nsectors)
+        self.pid.append(record.pid)
+        self.optype.append(self.optypes.add(record.optype))
+        self.diskid.append(self.diskids.add(record.diskid))
+        self.inode.append(record.inode)
+        self.block.append(record.block)
+
+    def arrays(self):
+        """Returns a dict of numpy views of the columns, no copies made"""
+
+        if self._arrays is not None:
+            return self._arrays
+
+        cols = {}
+        for name, typecode in self._COLUMNS:
+            col = getattr(self, name)
+            cols[name] = np.frombuffer(col, dtype=col.typecode) if col else \
+                np.zeros(0, dtype=typecode)
+        return cols
+
+    def completed(self):
+        """Returns numpy arrays (disknum, iosize, iotime) of the IOs,
+        iotime is nan without a SIO"""
+
+        c = self.arrays()
+
+        # some of the client logs don't have QIO/SIO for certain things
+        #   like log writes, those get a nan iotime
+        iotimes = c['fio_time'] - c['sio_time']
+        iosizes = c['nsectors'] * self.sector_size
+        return c['disknum'], iosizes, iotimes
+
+    def disk_stats(self):
+        """Returns a dict of disknum -> dict of stats of the finished IOs,
+        computed for all disks at once"""
+
+        disks, iosizes, iotimes = self.completed()
+
+        # sort on the io times within each disk, so the sums come out the
+        #   same whatever order the IOs were added in
+        order = np.lexsort((iotimes, disks))
+        uniq, starts = np.unique(disks[order], return_index=True)
+        if not len(uniq):
+            return {}
+        ends = np.append(starts[1:], len(disks))
+        iosizes = iosizes[order]
+        iotimes = iotimes[order]
+        is_data = np.in1d(self.arrays()['optype'][order], self._data_codes())
+        has_time = ~np.isnan(iotimes)
+        iotimes = np.where(has_time, iotimes, 0.0)
+
+        num_iops = ends - starts
+        num_times = np.add.reduceat(has_time.astype(np.int64), starts)
+        num_data = np.add.reduceat(is_data.astype(np.int64), starts)
+        total_bytes = np.add.reduceat(iosizes, starts)
+        total_time = np.add.reduceat(iotimes, starts)
+        longest = np.maximum.reduceat(np.where(has_time, iotimes, -np.inf),
+                                      starts)
+        mean = total_time / np.maximum(num_times, 1)
+        dev = np.where(has_time, iotimes - np.repeat(mean, num_iops), 0.0)
+        variance = np.add.reduceat(dev ** 2, starts) / np.maximum(num_times, 1)
+
+        stats = {}
+        for i, disk in enumerate(uniq):
+            stats[int(disk)] = {
+                'num_iops':         int(num_iops[i]),
+                'num_data_ios':     int(num_data[i]),
+                'num_times':        int(num_times[i]),
+                'total_bytes_io':   int(total_bytes[i]),
+                'total_time_io':    float(total_time[i]),
+                'avg_io_tm':        float(mean[i]),
+                'avg_io_sz':        int(total_bytes[i]) / int(num_iops[i]),
+                'longest_io':       float(longest[i]),
+                'stddev_io_tm':     float(np.sqrt(variance[i])),
+            }
+        return stats
+
+    def queue_depths(self, span=None):
+        """The queue depths of each disk, from a sweep over the QIO, SIO
+        and FIO times of its IOs: the IOs queued but not started, and the
+        IOs started but not finished (in service). Lots queued with few
+        in service points at the GPFS side (ex: not enough NSD worker
+        threads), lots in service at the disk or the path to it. The IOs
+        without a QIO (or SIO) are only counted where they were seen.
+
+        @param span: seconds to average the depths over, the time between
+            the first and last IO time in the store by default
+        @type span: float
+
+        @return: dict of disknum -> dict of max_queued, avg_queued,
+            max_in_service, avg_in_service
+        @rtype: dict
+        """
+
+        c = self.arrays()
+        disks, rows = np.unique(c['disknum'], return_inverse=True)
+        if not len(disks):
+            return {}
+        if span is None:
+            times = np.concatenate((c['qio_time'], c['sio_time'],
+                                    c['fio_time']))
+            span = np.nanmax(times) - np.nanmin(times)
+        span = max(span, 1e-9)
+
+        max_q, queued = interval_depths(rows, len(disks), c['qio_time'],
+                                        c['sio_time'])
+        max_s, in_service = interval_depths(rows, len(disks), c['sio_time'],
+                                            c['fio_time'])
+        return dict((int(d), {'max_queued':     int(max_q[i]),
+                              'avg_queued':     float(queued[i] / span),
+                              'max_in_service': int(max_s[i]),
+                              'avg_in_service': float(in_service[i] / span)})
+                        for i, d in enumerate(disks))
+
+    def _data_codes(self):
+        """The optype codes of the data block IOs (ex: 'write data'), the
+        rest are metadata (inode, indBlock, logData, ...)"""
+
+        return [code for code, optype in enumerate(self.optypes.values)
+                    if optype.endswith(' data')]
+
+    def size_histograms(self, buckets):
+        """Counts the io sizes of each disk into buckets
+
+        @param buckets: sorted lower edges of the buckets (bytes), sizes
+            past the last edge go into the last bucket
+        @type buckets: list
+
+        @return: dict of disknum -> numpy array of counts
+        @rtype: dict
+        """
+
+        disks, iosizes = self.completed()[0:2]
+        return self._histograms(disks, iosizes, buckets)
+
+    def latency_histograms(self, buckets=LATENCY_BUCKETS):
+        """Counts the io times of each disk into buckets, the IOs
+        without a SIO are left out
+
+        @param buckets: sorted lower edges of the buckets (secs)
+        @type buckets: list
+
+        @return: dict of disknum -> numpy array of counts
+        @rtype: dict
+        """
+
+        disks, iosizes, iotimes = self.completed()
+        has_time = ~np.isnan(iotimes)
+        return self._histograms(disks[has_time], iotimes[has_time], buckets)
+
+    def _histograms(self, disks, values, buckets):
+        order, uniq, starts, ends = group_slices(disks)
+        rows = np.repeat(np.arange(len(uniq)), ends - starts)
+        counts = bucket_counts(rows, len(uniq), values[order], buckets)
+        return dict((int(d), counts[i]) for i, d in enumerate(uniq))
+
+    def latency_percentiles(self, percentiles=PERCENTILES, classes=None):
+        """Exact percentiles of the io times (fio - sio), per disk or per
+        class of disks
+
+        @param percentiles: the percentiles wanted, 0-100
+        @type percentiles: list
+
+        @param classes: dict of disknum -> class (ex: 'data'), the IOs of
+            all the disks in a class are pooled. disks not in it are left
+            out. None for per disk percentiles
+        @type classes: dict
+
+        @return: dict of disknum (or class) -> list of the percentiles
+        @rtype: dict
+        """
+
+        disks, iosizes, iotimes = self.completed()
+        return self._percentiles(disks, iotimes, percentiles, classes)
+
+    def queue_percentiles(self, percentiles=PERCENTILES, classes=None):
+        """Exact percentiles of the queue times (sio - qio), same as
+        latency_percentiles"""
+
+        c = self.arrays()
+        return self._percentiles(c['disknum'], c['sio_time'] - c['qio_time'],
+                                 percentiles, classes)
+
+    def _percentiles(self, disks, values, percentiles, classes):
+        if classes is None:
+            pcts = group_percentiles(disks, values, percentiles)
+            return dict((int(d), p) for d, p in pcts.iteritems())
+
+        names = sorted(set(classes.itervalues()))
+        codes = dict((d, names.index(c)) for d, c in classes.iteritems())
+        groups = np.array([codes.get(d, -1) for d in disks.tolist()],
+                          dtype=np.int64)
+        keep = groups >= 0
+        pcts = group_percentiles(groups[keep], values[keep], percentiles)
+        return dict((names[g], p) for g, p in pcts.iteritems())
+
+    def shift_times(self, seconds):
+        """Moves the trace times of every IO by seconds, in place (ex: to
+        put the IOs of traces that started at different times on the same
+        clock)"""
+
+        for name in ('qio_time', 'sio_time', 'fio_time'):
+            col = getattr(self, name)
+            if col:
+                np.frombuffer(col, dtype=col.typecode)[:] += seconds
+
+    def merge(self, other):
+        """Adds the rows of another store"""
+
+        optypes = [self.optypes.add(v) for v in other.optypes.values]
+        diskids = [self.diskids.add(v) for v in other.diskids.values]
+
+        for name, typecode in self._COLUMNS:
+            if name == 'optype':
+                self.optype.extend(array('i', [optypes[c] for c in other.optype]))
+            elif name == 'diskid':
+                self.diskid.extend(array('i', [diskids[c] for c in other.diskid]))
+            else:
+                getattr(self, name).extend(getattr(other, name))
+
+
+class _DiskSummary(object):
+    """Running stats of the finished IOs of one disk"""
+
+    def __init__(self, num_size_buckets, num_latency_buckets, relative_error):
+        self.num_iops = 0
+        self.num_data = 0
+        self.total_sectors = 0
+        self.iotimes = RunningStats()
+        self.iotime_sketch = QuantileSketch(relative_error)
+        self.qtime_sketch = QuantileSketch(relative_error)
+        self.size_counts = [0] * num_size_buckets
+        self.latency_counts = [0] * num_latency_buckets
+
+    def merge(self, other):
+        self.num_iops += other.num_iops
+        self.num_data += other.num_data
+        self.total_sectors += other.total_sectors
+        self.iotimes.merge(other.iotimes)
+        self.iotime_sketch.merge(other.iotime_sketch)
+        self.qtime_sketch.merge(other.qtime_sketch)
+        self.size_counts = [a + b for a, b in
+                                zip(self.size_counts, other.size_counts)]
+        self.latency_counts = [a + b for a, b in
+                                zip(self.latency_counts, other.latency_counts)]
+
+
+class IOSummary(object):
+    """Per disk running stats of the finished IOs, the summary only
+    alternative to IOStore.
+
+    Each IO is added to its disk's count, sums, max, mean/variance and
+    size histogram when its FIO shows up, and then forgotten, so memory
+    grows with the number of disks instead of the number of IOs in the
+    trace. Only the size and io time buckets given up front can be
+    reported, and the io and queue time percentiles come from quantile
+    sketches, within relative_error of the exact ones.
+    """
+
+    def __init__(self, sector_size=512, size_buckets=SIZE_BUCKETS,
+            latency_buckets=LATENCY_BUCKETS, relative_error=0.01):
+        self.sector_size = sector_size
+        self.size_buckets = list(size_buckets)
+        self.latency_buckets = list(latency_buckets)
+        self.relative_error = relative_error
+        self.disks = {}     # disknum -> _DiskSummary
+
+    def add(self, record):
+        """Adds a finished IO (an IORecord) to its disk's stats"""
+
+        disk = self.disks.get(record.disknum)
+        if disk is None:
+            disk = self.disks[record.disknum] = _DiskSummary(
+                len(self.size_buckets), len(self.latency_buckets),
+                self.relative_error)
+        disk.num_iops += 1
+        if record.optype.endswith(' data'):
+            disk.num_data += 1
+        disk.total_sectors += record.nsectors
+        disk.size_counts[bisect(self.size_buckets,
+                                record.nsectors * self.sector_size) - 1] += 1
+
+        iotime = record.fio_time - record.sio_time
+        if iotime == iotime:    # not nan, there was a SIO
+            disk.iotimes.add(iotime)
+            disk.iotime_sketch.add(iotime)
+            disk.latency_counts[max(bisect(self.latency_buckets, iotime) - 1,
+                                    0)] += 1
+
+        qtime = record.sio_time - record.qio_time
+        if qtime == qtime:      # there was a QIO and a SIO
+            disk.qtime_sketch.add(qtime)
+
+    def disk_stats(self):
+        """Returns a dict of disknum -> dict of stats of the finished IOs"""
+
+        stats = {}
+        for disknum, disk in self.disks.iteritems():
+            total_bytes = disk.total_sectors * self.sector_size
+            stats[disknum] = {
+                'num_iops':         disk.num_iops,
+                'num_data_ios':     disk.num_data,
+                'num_times':        disk.iotimes.count,
+                'total_bytes_io':   total_bytes,
+                'total_time_io':    disk.iotimes.total,
+                'avg_io_tm':        disk.iotimes.mean,
+                'avg_io_sz':        total_bytes / disk.num_iops,
+                'longest_io':       disk.iotimes.max,
+                'stddev_io_tm':     disk.iotimes.stddev(),
+            }
+        return stats
+
+    def size_histograms(self, buckets):
+        """Counts of the io sizes of each disk, buckets must be a subset
+        of the size buckets this summary was made with
+
+        @return: dict of disknum -> numpy array of counts
+        @rtype: dict
+        """
+
+        return self._histograms(self.size_buckets, 'size_counts', buckets)
+
+    def latency_histograms(self, buckets=LATENCY_BUCKETS):
+        """Counts of the io times of each disk, buckets must be a subset
+        of the io time buckets this summary was made with
+
+        @return: dict of disknum -> numpy array of counts
+        @rtype: dict
+        """
+
+        return self._histograms(self.latency_buckets, 'latency_counts',
+                                buckets)
+
+    def _histograms(self, kept, attr, buckets):
+        idx = np.searchsorted(kept, buckets)
+        if idx[0] != 0 or list(np.asarray(kept)[idx]) != list(buckets):
+            raise ValueError("buckets {0} were not kept".format(buckets))
+        return dict((disknum, np.add.reduceat(getattr(disk, attr), idx))
+                        for disknum, disk in self.disks.iteritems())
+
+    def latency_percentiles(self, percentiles=PERCENTILES, classes=None):
+        """Percentiles of the io times from the sketches, per disk or per
+        class of disks, see IOStore.latency_percentiles
+
+        @return: dict of disknum (or class) -> list of the percentiles
+        @rtype: dict
+        """
+
+        return self._percentiles('iotime_sketch', percentiles, classes)
+
+    def queue_percentiles(self, percentiles=PERCENTILES, classes=None):
+        """Percentiles of the queue times from the sketches, same as
+        latency_percentiles"""
+
+        return self._percentiles('qtime_sketch', percentiles, classes)
+
+    def _percentiles(self, attr, percentiles, classes):
+        if classes is None:
+            sketches = dict((disknum, getattr(disk, attr))
+                                for disknum, disk in self.disks.iteritems())
+        else:
+            sketches = {}
+            for disknum, c in classes.iteritems():
+                if disknum not in self.disks:
+                    continue
+                if c not in sketches:
+                    sketches[c] = QuantileSketch(self.relative_error)
+                sketches[c].merge(getattr(self.disks[disknum], attr))
+        return dict((k, sketch.percentiles(percentiles))
+                        for k, sketch in sketches.iteritems() if sketch.count)
+
+    def shift_times(self, seconds):
+        """Nothing to do, the summary keeps no trace times"""
+
+        pass
+
+    def merge(self, other):
+        """Adds the disk stats of another summary"""
+
+        for disknum, disk in other.disks.iteritems():
+            if disknum in self.disks:
+                self.disks[disknum].merge(disk)
+            else:
+                self.disks[disknum] = disk
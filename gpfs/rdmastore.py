@@ -0,0 +1,302 @@
+import numpy as np
+from array import array
+from gpfs.funcs import Interner, QuantileSketch, RunningStats
+from gpfs.iostore import PERCENTILES, group_percentiles
+
+
+def _window_bytes(rows, num_rows, times, nbytes, window):
+    """Bytes per window of trace time of each row (peer)
+
+    @return: (start, counts), the trace time window 0 starts at and the
+        bytes of each window, shape (num_rows, num windows)
+    @rtype: tuple
+    """
+
+    if not len(times):
+        return 0.0, np.zeros((num_rows, 0), dtype=np.int64)
+    start = np.floor(times.min() / window) * window
+    windows = ((times - start) / window).astype(np.int64)
+    num_windows = int(windows.max()) + 1
+    counts = np.bincount(rows * num_windows + windows, weights=nbytes,
+                         minlength=num_rows * num_windows)
+    return start, counts.astype(np.int64).reshape(num_rows, num_windows)
+
+
+class RDMAStore(object):
+    """Columnar store of the finished RDMA transfers in a trace, one row
+    per transfer, the RDMA side of IOStore.
+
+    The RDMAMatcher hands each finished transfer to add(). The peers and
+    the optypes (read/write) are kept once in lookup tables.
+    """
+
+    # column name, array typecode
+    _COLUMNS = (('start_time', 'd'),   # trace times, nan if not seen
+                ('done_time',  'd'),
+                ('peer',       'i'),   # code in self.peers
+                ('optype',     'i'),   # code in self.optypes
+                ('nbytes',     'l'),
+                ('status',     'i'))
+
+    def __init__(self):
+        self.peers = Interner()
+        self.optypes = Interner()
+        for name, typecode in self._COLUMNS:
+            setattr(self, name, array(typecode))
+
+    def __len__(self):
+        return len(self.peer)
+
+    def add(self, record):
+        """Adds a finished transfer (an RDMARecord)"""
+
+        self.start_time.append(record.start_time)
+        self.done_time.append(record.done_time)
+        self.peer.append(self.peers.add(record.peer))
+        self.optype.append(self.optypes.add(record.optype))
+        self.nbytes.append(record.nbytes)
+        self.status.append(record.status)
+
+    def arrays(self):
+        """Returns a dict of numpy views of the columns, no copies made"""
+
+        cols = {}
+        for name, typecode in self._COLUMNS:
+            col = getattr(self, name)
+            cols[name] = np.frombuffer(col, dtype=col.typecode) if col else \
+                np.zeros(0, dtype=typecode)
+        return cols
+
+    def peer_stats(self):
+        """Returns a dict of peer -> dict of stats of the finished
+        transfers, computed for all peers at once"""
+
+        c = self.arrays()
+        latency = c['done_time'] - c['start_time']
+
+        # sort on the latencies within each peer, so the sums come out the
+        #   same whatever order the transfers were added in
+        order = np.lexsort((latency, c['peer']))
+        uniq, starts = np.unique(c['peer'][order], return_index=True)
+        if not len(uniq):
+            return {}
+        ends = np.append(starts[1:], len(order))
+        latency = latency[order]
+        nbytes = c['nbytes'][order]
+        reads = c['optype'][order] == self.optypes.codes.get('read', -1)
+        errors = c['status'][order] != 0
+        has_time = ~np.isnan(latency)
+        latency = np.where(has_time, latency, 0.0)
+
+        num_times = np.add.reduceat(has_time.astype(np.int64), starts)
+        total_time = np.add.reduceat(latency, starts)
+        longest = np.maximum.reduceat(np.where(has_time, latency, -np.inf),
+                                      starts)
+        read_bytes = np.add.reduceat(np.where(reads, nbytes, 0), starts)
+        total_bytes = np.add.reduceat(nbytes, starts)
+        num_errors = np.add.reduceat(errors.astype(np.int64), starts)
+
+        stats = {}
+        for i, code in enumerate(uniq):
+            stats[self.peers.values[code]] = {
+                'num_ops':      int(ends[i] - starts[i]),
+                'num_errors':   int(num_errors[i]),
+                'num_times':    int(num_times[i]),
+                'total_bytes':  int(total_bytes[i]),
+                'read_bytes':   int(read_bytes[i]),
+                'write_bytes':  int(total_bytes[i] - read_bytes[i]),
+                'total_lat':    float(total_time[i]),
+                'avg_lat':      float(total_time[i] / max(num_times[i], 1)),
+                'longest_lat':  float(longest[i]),
+            }
+        return stats
+
+    def latency_percentiles(self, percentiles=PERCENTILES):
+        """Exact percentiles of the completion latencies (done - start),
+        per peer
+
+        @param percentiles: the percentiles wanted, 0-100
+        @type percentiles: list
+
+        @return: dict of peer -> list of the percentiles
+        @rtype: dict
+        """
+
+        c = self.arrays()
+        pcts = group_percentiles(c['peer'], c['done_time'] - c['start_time'],
+                                 percentiles)
+        return dict((self.peers.values[p], v) for p, v in pcts.iteritems())
+
+    def throughput(self, window=1.0):
+        """Bytes moved per window of trace time, per peer, each transfer
+        counted in the window it completed in
+
+        @param window: window size in seconds
+        @type window: float
+
+        @return: (start, peers, counts), the trace time window 0 starts at,
+            the peers and the bytes of each of their windows, shape
+            (len(peers), num windows)
+        @rtype: tuple
+        """
+
+        c = self.arrays()
+        start, counts = _window_bytes(c['peer'], len(self.peers),
+                                      c['done_time'], c['nbytes'], window)
+        return start, list(self.peers.values), counts
+
+    def shift_times(self, seconds):
+        """Moves the trace times of every transfer by seconds, in place"""
+
+        for name in ('start_time', 'done_time'):
+            col = getattr(self, name)
+            if col:
+                np.frombuffer(col, dtype=col.typecode)[:] += seconds
+
+    def merge(self, other):
+        """Adds the rows of another store"""
+
+        peers = [self.peers.add(v) for v in other.peers.values]
+        optypes = [self.optypes.add(v) for v in other.optypes.values]
+
+        for name, typecode in self._COLUMNS:
+            if name == 'peer':
+                self.peer.extend(array('i', [peers[c] for c in other.peer]))
+            elif name == 'optype':
+                self.optype.extend(array('i', [optypes[c] for c in other.optype]))
+            else:
+                getattr(self, name).extend(getattr(other, name))
+
+
+class _PeerSummary(object):
+    """Running stats of the finished transfers with one peer"""
+
+    def __init__(self, relative_error):
+        self.num_ops = 0
+        self.num_errors = 0
+        self.read_bytes = 0
+        self.write_bytes = 0
+        self.latencies = RunningStats()
+        self.latency_sketch = QuantileSketch(relative_error)
+        self.window_bytes = {}      # window number -> bytes
+
+    def merge(self, other):
+        self.num_ops += other.num_ops
+        self.num_errors += other.num_errors
+        self.read_bytes += other.read_bytes
+        self.write_bytes += other.write_bytes
+        self.latencies.merge(other.latencies)
+        self.latency_sketch.merge(other.latency_sketch)
+        for w, nbytes in other.window_bytes.iteritems():
+            self.window_bytes[w] = self.window_bytes.get(w, 0) + nbytes
+
+
+class RDMASummary(object):
+    """Per peer running stats of the finished RDMA transfers, the summary
+    only alternative to RDMAStore.
+
+    Memory grows with the number of peers, and with the length of the
+    trace only through the bytes kept per window of window seconds (for
+    the throughput over time). The latency percentiles come from quantile
+    sketches, within relative_error of the exact ones.
+    """
+
+    def __init__(self, window=1.0, relative_error=0.01):
+        self.window = window
+        self.relative_error = relative_error
+        self.peers = {}     # peer -> _PeerSummary
+
+    def add(self, record):
+        """Adds a finished transfer (an RDMARecord) to its peer's stats"""
+
+        peer = self.peers.get(record.peer)
+        if peer is None:
+            peer = self.peers[record.peer] = _PeerSummary(self.relative_error)
+        peer.num_ops += 1
+        if record.status:
+            peer.num_errors += 1
+        if record.optype == 'read':
+            peer.read_bytes += record.nbytes
+        else:
+            peer.write_bytes += record.nbytes
+        w = int(record.done_time // self.window)
+        peer.window_bytes[w] = peer.window_bytes.get(w, 0) + record.nbytes
+
+        latency = record.done_time - record.start_time
+        if latency == latency:  # not nan, the start was seen
+            peer.latencies.add(latency)
+            peer.latency_sketch.add(latency)
+
+    def peer_stats(self):
+        """Returns a dict of peer -> dict of stats, see RDMAStore"""
+
+        stats = {}
+        for name, peer in self.peers.iteritems():
+            lat = peer.latencies
+            stats[name] = {
+                'num_ops':      peer.num_ops,
+                'num_errors':   peer.num_errors,
+                'num_times':    lat.count,
+                'total_bytes':  peer.read_bytes + peer.write_bytes,
+                'read_bytes':   peer.read_bytes,
+                'write_bytes':  peer.write_bytes,
+                'total_lat':    lat.total,
+                'avg_lat':      lat.mean,
+                'longest_lat':  lat.max,
+            }
+        return stats
+
+    def latency_percentiles(self, percentiles=PERCENTILES):
+        """Percentiles of the completion latencies from the sketches, per
+        peer
+
+        @return: dict of peer -> list of the percentiles
+        @rtype: dict
+        """
+
+        return dict((name, peer.latency_sketch.percentiles(percentiles))
+                        for name, peer in self.peers.iteritems()
+                        if peer.latency_sketch.count)
+
+    def throughput(self, window=1.0):
+        """Bytes moved per window of trace time, per peer, see RDMAStore.
+        window must be a multiple of the window this summary was made with
+        """
+
+        factor = int(round(window / self.window))
+        if factor < 1 or abs(factor * self.window - window) > 1e-9:
+            raise ValueError("window {0} is not a multiple of {1}".format(
+                                window, self.window))
+
+        names = sorted(self.peers)
+        rows, windows, nbytes = [], [], []
+        for i, name in enumerate(names):
+            for w, b in self.peers[name].window_bytes.iteritems():
+                rows.append(i)
+                windows.append(w)
+                nbytes.append(b)
+        times = (np.array(windows, dtype=np.float64) + 0.5) * self.window
+        start, counts = _window_bytes(np.array(rows, dtype=np.int64),
+                                      len(names), times,
+                                      np.array(nbytes, dtype=np.float64),
+                                      factor * self.window)
+        return start, names, counts
+
+    def shift_times(self, seconds):
+        """Moves the windows by seconds, rounded to whole windows"""
+
+        offset = int(round(seconds / self.window))
+        if not offset:
+            return
+        for peer in self.peers.itervalues():
+            peer.window_bytes = dict((w + offset, b) for w, b in
+                                        peer.window_bytes.iteritems())
+
+    def merge(self, other):
+        """Adds the peer stats of another summary"""
+
+        for name, peer in other.peers.iteritems():
+            if name in self.peers:
+                self.peers[name].merge(peer)
+            else:
+                self.peers[name] = peer
@@ -0,0 +1,70 @@
+import heapq
+
+
+def _push(heap, k, elapsed, record):
+    """Keeps the k largest (elapsed, record) entries in a min-heap"""
+
+    if len(heap) < k:
+        heapq.heappush(heap, (elapsed, record))
+    elif elapsed > heap[0][0]:
+        heapq.heapreplace(heap, (elapsed, record))
+
+
+class SlowestIOs(object):
+    """The k slowest finished IOs of a trace (fio - sio) and the k longest
+    queue waits (sio - qio), each with its whole IORecord.
+
+    An IOMatcher consumer. Each list is a min-heap of k entries with the
+    fastest of them on top, so an IO only has to beat that one to get in,
+    and memory stays at 2 * k records however long the trace is.
+    """
+
+    def __init__(self, k=10):
+        self.k = k
+        self.iotimes = []   # min-heap of (io time, IORecord)
+        self.qtimes = []    # min-heap of (queue time, IORecord)
+
+    def add(self, record):
+        """Adds a finished IO (an IORecord)"""
+
+        iotime = record.fio_time - record.sio_time
+        if iotime == iotime:    # not nan, there was a SIO
+            if len(self.iotimes) < self.k or iotime > self.iotimes[0][0]:
+                _push(self.iotimes, self.k, iotime, record)
+
+        qtime = record.sio_time - record.qio_time
+        if qtime == qtime:      # there was a QIO and a SIO
+            if len(self.qtimes) < self.k or qtime > self.qtimes[0][0]:
+                _push(self.qtimes, self.k, qtime, record)
+
+    def slowest(self):
+        """Returns the slowest IOs, a list of (io time, IORecord), slowest
+        first"""
+
+        return sorted(self.iotimes, reverse=True)
+
+    def longest_waits(self):
+        """Returns the longest queue waits, a list of (queue time,
+        IORecord), longest first"""
+
+        return sorted(self.qtimes, reverse=True)
+
+    def shift_times(self, seconds):
+        """Moves the trace times of every IO by seconds"""
+
+        def shift(heap):
+            return [(elapsed, r._replace(qio_time=r.qio_time + seconds,
+                                         sio_time=r.sio_time + seconds,
+                                         fio_time=r.fio_time + seconds))
+                        for elapsed, r in heap]
+
+        self.iotimes = shift(self.iotimes)
+        self.qtimes = shift(self.qtimes)
+
+    def merge(self, other):
+        """Keeps the k slowest of both"""
+
+        for elapsed, record in other.iotimes:
+            _push(self.iotimes, self.k, elapsed, record)
+        for elapsed, record in other.qtimes:
+            _push(self.qtimes, self.k, elapsed, record)
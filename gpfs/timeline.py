@@ -0,0 +1,205 @@
+import numpy as np
+from collections import deque
+from gpfs.iostore import group_percentiles, window_depths
+
+# the per window stats, in the order of Timeline.arrays()
+_STATS = ('bytes', 'iops', 'io_tm_mean', 'io_tm_p99', 'qu_tm_mean',
+          'queued_avg', 'queued_max', 'in_service_avg', 'in_service_max')
+
+# the queue depth stats, and the (start, end) columns of their intervals
+_DEPTHS = (('queued', 'qio_time', 'sio_time'),
+           ('in_service', 'sio_time', 'fio_time'))
+
+
+class Timeline(object):
+    """Per window stats of the finished IOs, per disk and cluster wide.
+
+    Each IO lands in the window its FIO falls in. Every stat is an array
+    with one entry per window, per disk ones have one row per disk (in
+    the order of self.disks):
+
+        bytes:      bytes finished
+        iops:       IOs finished, per second
+        io_tm_mean: mean io time (fio - sio), nan without IOs
+        io_tm_p99:  99th percentile io time, nan without IOs
+        qu_tm_mean: mean queue time (sio - qio), nan without IOs
+
+    and the queue depths over each window, unlike the above they count
+    every IO in flight during the window, not just the ones finishing:
+
+        queued_avg:     average number of IOs queued but not started
+        queued_max:     most IOs queued at once
+        in_service_avg: average number of IOs started but not finished
+        in_service_max: most IOs in service at once
+
+    The cluster wide stats are in self.total, a dict of the same arrays.
+    """
+
+    def __init__(self, window, start, disks, stats, total):
+        self.window = window
+        self.start = start      # trace time of the start of window 0
+        self.disks = disks
+        self.stats = stats      # stat -> array (num disks, num windows)
+        self.total = total      # stat -> array (num windows)
+
+    def __len__(self):
+        return len(self.total['iops'])
+
+    def times(self, epoch=0.0):
+        """Returns the start time of each window, pass the trace start
+        epoch to get epoch seconds"""
+
+        return epoch + self.start + self.window * np.arange(len(self))
+
+    def arrays(self):
+        """Returns a flat dict of all the arrays, ex: for numpy.savez"""
+
+        arrays = {'window': np.array([self.window]),
+                  'times': self.times(),
+                  'disks': self.disks}
+        for stat in _STATS:
+            arrays[stat] = self.stats[stat]
+            arrays['total_' + stat] = self.total[stat]
+        return arrays
+
+def _window_stats(groups, num_groups, iosizes, iotimes, qtimes, window):
+    """The _STATS of each group (a window, or a window of a disk), but
+    the queue depths"""
+
+    def mean(values):
+        has = ~np.isnan(values)
+        num = np.bincount(groups[has], minlength=num_groups)
+        total = np.bincount(groups[has], weights=values[has],
+                            minlength=num_groups)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return total / num
+
+    p99 = np.empty(num_groups)
+    p99.fill(np.nan)
+    for g, pcts in group_percentiles(groups, iotimes, [99.0]).iteritems():
+        p99[g] = pcts[0]
+
+    return {'bytes':      np.bincount(groups, weights=iosizes,
+                                      minlength=num_groups).astype(np.int64),
+            'iops':       np.bincount(groups, minlength=num_groups) / window,
+            'io_tm_mean': mean(iotimes),
+            'io_tm_p99':  p99,
+            'qu_tm_mean': mean(qtimes)}
+
+def build_timeline(store, window=1.0):
+    """Bins the finished IOs of an IOStore into windows of trace time
+
+    @param store: the finished IOs
+    @type store: IOStore
+
+    @param window: window size in seconds (ex: 1.0, 0.1)
+    @type window: float
+
+    @return: the timeline, None if there are no IOs
+    @rtype: Timeline
+    """
+
+    c = store.arrays()
+    disknums, iosizes, iotimes = store.completed()
+    if not len(disknums):
+        return None
+    qtimes = c['sio_time'] - c['qio_time']
+
+    fio_times = c['fio_time']
+    start = np.floor(fio_times.min() / window) * window
+    windows = ((fio_times - start) / window).astype(np.int64)
+    num_windows = int(windows.max()) + 1
+
+    disks, rows = np.unique(disknums, return_inverse=True)
+    stats = _window_stats(rows * num_windows + windows,
+                          len(disks) * num_windows,
+                          iosizes, iotimes, qtimes, window)
+    for stat in stats:
+        stats[stat] = stats[stat].reshape(len(disks), num_windows)
+    total = _window_stats(windows, num_windows, iosizes, iotimes, qtimes,
+                          window)
+
+    for name, begin, end in _DEPTHS:
+        stats[name + '_avg'], stats[name + '_max'] = window_depths(rows,
+            len(disks), c[begin], c[end], start, window, num_windows)
+        avg, most = window_depths(np.zeros(len(rows), dtype=np.int64), 1,
+            c[begin], c[end], start, window, num_windows)
+        total[name + '_avg'], total[name + '_max'] = avg[0], most[0]
+    return Timeline(window, start, disks, stats, total)
+
+
+class IOWindow(object):
+    """Per disk stats of the IOs that finished in the last window seconds
+    of trace time, kept up to date as IOs come in (the rolling stats of
+    TraceParser.follow_trace).
+
+    It's an IOMatcher consumer, the IOs in the window are kept in a
+    queue and taken back out of the per disk sums as they fall out of
+    the window, so the memory follows the IO rate and not the length of
+    the trace.
+    """
+
+    def __init__(self, window=60.0, sector_size=512):
+        self.window = window
+        self.sector_size = sector_size
+        self.ios = deque()      # (fio time, disknum, bytes, io time, data)
+        self.disks = {}         # disknum -> [num_iops, bytes, num_times,
+                                #   time, num_data]
+        self.now = 0.0
+
+    def add(self, record):
+        """Adds a finished IO (an IORecord)"""
+
+        iotime = record.fio_time - record.sio_time
+        nbytes = record.nsectors * self.sector_size
+        data = record.optype.endswith(' data')
+        self.ios.append((record.fio_time, record.disknum, nbytes, iotime,
+                         data))
+
+        disk = self.disks.get(record.disknum)
+        if disk is None:
+            disk = self.disks[record.disknum] = [0, 0, 0, 0.0, 0]
+        disk[0] += 1
+        disk[1] += nbytes
+        disk[4] += data
+        if iotime == iotime:    # not nan, there was a SIO
+            disk[2] += 1
+            disk[3] += iotime
+        if record.fio_time > self.now:
+            self.now = record.fio_time
+
+    def expire(self, now=None):
+        """Drops the IOs that finished before the window (ending at now,
+        or at the last FIO seen)"""
+
+        if now is not None and now > self.now:
+            self.now = now
+        cutoff = self.now - self.window
+        ios = self.ios
+        while ios and ios[0][0] < cutoff:
+            fio_time, disknum, nbytes, iotime, data = ios.popleft()
+            disk = self.disks[disknum]
+            disk[0] -= 1
+            disk[1] -= nbytes
+            disk[4] -= data
+            if iotime == iotime:
+                disk[2] -= 1
+                disk[3] -= iotime
+            if not disk[0]:
+                del self.disks[disknum]
+
+    def disk_stats(self):
+        """Returns a dict of disknum -> dict of stats over the window"""
+
+        stats = {}
+        for disknum, (num_iops, nbytes, num_times, total_time, num_data) in \
+                self.disks.iteritems():
+            stats[disknum] = {
+                'num_iops':     num_iops,
+                'num_data_ios': num_data,
+                'iops':         num_iops / self.window,
+                'bytes_sec':    nbytes / self.window,
+                'avg_io_sz':    nbytes / num_iops,
+                'avg_io_tm':    total_time / num_times if num_times else None,
+            }
+        return stats
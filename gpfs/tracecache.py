@@ -0,0 +1,142 @@
+import cPickle as pickle
+import hashlib
+import numpy as np
+import os
+import shutil
+import tempfile
+from gpfs.analyze import _plain
+from gpfs.iostore import IOStore
+
+# bump when the layout of a cache entry changes
+_CACHE_VERSION = 5
+_SAMPLE_SIZE = 1024 * 1024
+
+
+def cache_key(filename, filters, options):
+    """Returns the cache key of a parse, a hash of the trace report and
+    of everything that changes what the parse keeps.
+
+    Hashing a 50GB trace would take as long as parsing it, so the trace
+    is hashed on its size, mtime and its first and last MB.
+
+    @param filename: the trace report
+    @type filename: string
+
+    @param filters: comma separated list of filters, ex: 'io,ts'
+    @type filters: string
+
+    @param options: the parser options, see TraceParser._options
+    @type options: dict
+
+    @return: hex digest
+    @rtype: string
+    """
+
+    st = os.stat(filename)
+    h = hashlib.sha1()
+    h.update(repr((_CACHE_VERSION, st.st_size, int(st.st_mtime),
+                   sorted(filters.split(',')), sorted(options.items()))))
+    with open(filename, 'rb') as f:
+        h.update(f.read(_SAMPLE_SIZE))
+        if st.st_size > _SAMPLE_SIZE:
+            f.seek(max(_SAMPLE_SIZE, st.st_size - _SAMPLE_SIZE))
+            h.update(f.read(_SAMPLE_SIZE))
+    return h.hexdigest()
+
+def _fill(tree, d):
+    """Copies plain dicts into a defaultdict tree"""
+
+    for k, v in d.iteritems():
+        if isinstance(v, dict):
+            _fill(tree[k], v)
+        else:
+            tree[k] = v
+
+def save(parser, path):
+    """Writes what a TraceParser parsed to a cache entry (a directory).
+
+    The IO columns go in one .npy file each, so they can be memory mapped
+    back in, everything else (the tracelog, the lookup tables, a summary
+    only mode's disk stats, the RDMA transfers) goes in state.pickle. The
+    entry is written next to path and renamed into place, so a crashed run
+    can't leave a half written entry behind.
+
+    @param parser: a TraceParser after parse_trace
+    @type parser: TraceParser
+
+    @param path: the cache entry directory to write
+    @type path: string
+
+    @return: NOTHING
+    """
+
+    parent = os.path.dirname(os.path.abspath(path))
+    if not os.path.isdir(parent):
+        os.makedirs(parent)
+    tmp = tempfile.mkdtemp(dir=parent, prefix='.tmp-')
+
+    try:
+        state = {'version':     _CACHE_VERSION,
+                 'tracelog':    _plain(parser.tracelog),
+                 'trace_start_epoch': getattr(parser, 'trace_start_epoch', 0),
+                 'trace_stop_epoch': getattr(parser, 'trace_stop_epoch', 0)}
+
+        store = parser.iostore
+        if isinstance(store, IOStore):
+            state['optypes'] = store.optypes.values
+            state['diskids'] = store.diskids.values
+            for name, col in store.arrays().iteritems():
+                np.save(os.path.join(tmp, name + '.npy'), col)
+        else:
+            state['iosummary'] = store
+        state['rdmastore'] = parser.rdmastore
+
+        with open(os.path.join(tmp, 'state.pickle'), 'wb') as f:
+            pickle.dump(state, f, pickle.HIGHEST_PROTOCOL)
+
+        if os.path.exists(path):
+            shutil.rmtree(path)
+        os.rename(tmp, path)
+    except:
+        shutil.rmtree(tmp, ignore_errors=True)
+        raise
+
+def load(parser, path):
+    """Loads a cache entry into a TraceParser, in place of parse_trace.
+    The IO columns are memory mapped, so this takes milliseconds and the
+    pages are only read in when the summaries touch them.
+
+    @param parser: a fresh TraceParser, made with the same options
+    @type parser: TraceParser
+
+    @param path: the cache entry directory
+    @type path: string
+
+    @return: True if the entry was loaded, False if it isn't there or was
+        written by another version
+    @rtype: bool
+    """
+
+    try:
+        with open(os.path.join(path, 'state.pickle'), 'rb') as f:
+            state = pickle.load(f)
+    except (IOError, EOFError, pickle.UnpicklingError):
+        return False
+    if state.get('version') != _CACHE_VERSION:
+        return False
+
+    _fill(parser.tracelog, state['tracelog'])
+    parser.trace_start_epoch = state['trace_start_epoch']
+    parser.trace_stop_epoch = state['trace_stop_epoch']
+
+    if 'rdmastore' in state:
+        parser.rdmastore = state['rdmastore']
+    if 'iosummary' in state:
+        parser.iostore = state['iosummary']
+    else:
+        cols = dict((name, np.load(os.path.join(path, name + '.npy'),
+                                   mmap_mode='r'))
+                        for name, typecode in IOStore._COLUMNS)
+        parser.iostore = IOStore.from_arrays(cols, state['optypes'],
+                        state['diskids'], parser.iostore.sector_size)
+    return True
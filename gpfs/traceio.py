@@ -0,0 +1,450 @@
+import bz2
+import mmap
+import os
+import Queue
+import sys
+import threading
+import time
+import zlib
+
+_GZIP_MAGIC = '\x1f\x8b'
+_READ_SIZE = 1024 * 1024
+
+# magic bytes -> format. xz, zstd and lz4 reports are only recognized, so
+#   they aren't parsed as text
+_MAGIC = (('\x1f\x8b',              'gzip'),
+          ('BZh',                   'bz2'),
+          ('\xfd7zXZ\x00',          'xz'),
+          ('\x28\xb5\x2f\xfd',      'zstd'),
+          ('\x04\x22\x4d\x18',      'lz4'))
+
+# the file extensions of the formats above, and of the reports themselves
+_EXTENSIONS = ('.gz', '.bz2', '.xz', '.zst', '.lz4', '.trcrpt', '.txt')
+
+
+def trace_format(filename):
+    """Returns the format of a trace report from its first bytes: 'plain',
+    'gzip', 'bz2', 'xz', 'zstd' or 'lz4'"""
+
+    with open(filename, 'rb') as f:
+        head = f.read(6)
+    for magic, fmt in _MAGIC:
+        if head.startswith(magic):
+            return fmt
+    return 'plain'
+
+def node_name(filename):
+    """Returns the node a trace report is named after, its file name less
+    the compression and report extensions (ex: nsd1.cluster.trcrpt.gz ->
+    nsd1.cluster, 10.0.0.1.gz -> 10.0.0.1)"""
+
+    name = os.path.basename(filename)
+    root, ext = os.path.splitext(name)
+    while root and ext.lower() in _EXTENSIONS:
+        name = root
+        root, ext = os.path.splitext(name)
+    return name
+
+def _decompressor(fmt):
+    """Returns a function making a new decompressor (an object with a
+    decompress method) for a format, None for plain text"""
+
+    if fmt == 'plain':
+        return None
+    elif fmt == 'gzip':
+        return lambda: zlib.decompressobj(16 + zlib.MAX_WBITS)
+    elif fmt == 'bz2':
+        return bz2.BZ2Decompressor
+    raise IOError("can't read {0} trace reports, please decompress it "
+                  "first".format(fmt))
+
+
+class TraceFile(object):
+    """A trace report opened for reading, plain text, gzip'd or bzip2'd.
+    Concatenated streams (pigz, pbzip2, ...) are read through.
+
+    The data is read and decompressed read_size bytes at a time. readline
+    and tell work as for a file (tell is the uncompressed offset), and
+    chunks() hands out the rest of the file in big pieces that end on a
+    line, see line_batches.
+    """
+
+    def __init__(self, filename, read_size=4 * _READ_SIZE):
+        self.format = trace_format(filename)
+        self.read_size = read_size
+        self._new = _decompressor(self.format)
+        self._d = self._new() if self._new else None
+        self._raw = open(filename, 'rb')
+        self._buf = ''
+        self._pos = 0       # uncompressed offset of the end of _buf
+        self._eof = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __iter__(self):
+        for chunk in self.chunks():
+            for line in chunk.splitlines(True):
+                yield line
+
+    def _read(self):
+        """Returns the next piece of uncompressed data, '' at the end"""
+
+        while not self._eof:
+            data = self._raw.read(self.read_size)
+            if not data:
+                self._eof = True
+                break
+            if self._d is None:
+                return data
+            try:
+                out = self._d.decompress(data)
+            except EOFError:
+                # a bz2 stream ended right at the end of the last read,
+                #   this is the next one
+                self._d = self._new()
+                out = self._d.decompress(data)
+            while self._d.unused_data:
+                # the end of a stream, the rest is the next one
+                rest = self._d.unused_data
+                self._d = self._new()
+                out += self._d.decompress(rest)
+            if out:
+                return out
+        return ''
+
+    def readline(self):
+        """Returns the next line, '' at the end"""
+
+        nl = self._buf.find('\n')
+        while nl == -1:
+            data = self._read()
+            if not data:
+                break
+            self._pos += len(data)
+            self._buf += data
+            nl = self._buf.find('\n')
+        end = nl + 1 if nl != -1 else len(self._buf)
+        line, self._buf = self._buf[:end], self._buf[end:]
+        return line
+
+    def tell(self):
+        """Returns the uncompressed offset of the next line"""
+
+        return self._pos - len(self._buf)
+
+    def chunks(self):
+        """Yields the rest of the data in pieces that end on a line"""
+
+        buf, self._buf = self._buf, ''
+        while True:
+            data = self._read()
+            if not data:
+                break
+            self._pos += len(data)
+            buf += data
+            nl = buf.rfind('\n')
+            if nl != -1:
+                yield buf[:nl + 1]
+                buf = buf[nl + 1:]
+        if buf:
+            yield buf
+
+    def close(self):
+        self._raw.close()
+
+def open_trace(filename):
+    """Opens a trace report, see TraceFile"""
+
+    return TraceFile(filename)
+
+def line_batches(f, batch_size=100000, queue_size=4):
+    """Yields lists of the lines left in an open TraceFile.
+
+    The reading, decompressing and splitting are done in a background
+    thread, up to queue_size batches ahead of the caller. zlib, bz2 and
+    the like let go of the GIL while they work, so decompressing the
+    next batches overlaps with parsing this one. The lines have no
+    trailing newline.
+
+    @param f: the open trace report
+    @type f: TraceFile
+
+    @param batch_size: about how many lines to put in a batch
+    @type batch_size: int
+
+    @param queue_size: how many batches can be waiting
+    @type queue_size: int
+    """
+
+    done = object()
+    q = Queue.Queue(queue_size)
+    stop = threading.Event()
+
+    def put(item):
+        # give up if the caller went away, instead of blocking forever
+        while not stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except Queue.Full:
+                continue
+        return False
+
+    def produce():
+        try:
+            batch = []
+            for chunk in f.chunks():
+                lines = chunk.split('\n')
+                if not lines[-1]:
+                    lines.pop()
+                batch.extend(lines)
+                if len(batch) >= batch_size:
+                    if not put(batch):
+                        return
+                    batch = []
+            if batch and not put(batch):
+                return
+            put(done)
+        except Exception:
+            put(sys.exc_info())
+
+    reader = threading.Thread(target=produce, name='trace reader')
+    reader.daemon = True
+    reader.start()
+    try:
+        while True:
+            item = q.get()
+            if item is done:
+                break
+            if isinstance(item, tuple):     # the reader blew up
+                raise item[0], item[1], item[2]
+            yield item
+    finally:
+        stop.set()
+        reader.join()
+
+def gzip_seek_index(filename):
+    """Builds a seek point index of a gzip file, one entry per gzip member.
+
+    A single member gzip file can't be entered in the middle, but files
+    written by pigz/bgzip (or cat'd together) are made of many members,
+    and each one of those is a place we can start decompressing from.
+
+    @param filename: the gzip file
+    @type filename: string
+
+    @return: list of (compressed offset, uncompressed offset, prev_nl)
+        tuples, prev_nl is True if the uncompressed data before the member
+        ends on a newline, and the total uncompressed size
+    @rtype: tuple
+    """
+
+    index = [(0, 0, True)]
+    c_off = 0       # compressed offset of the current member
+    u_off = 0       # uncompressed bytes seen so far
+    last = '\n'
+    d = zlib.decompressobj(16 + zlib.MAX_WBITS)
+
+    with open(filename, 'rb') as f:
+        while True:
+            chunk = f.read(_READ_SIZE)
+            if not chunk:
+                break
+            pos = 0
+            while chunk:
+                data = d.decompress(chunk)
+                if data:
+                    u_off += len(data)
+                    last = data[-1]
+                if not d.unused_data:
+                    break
+                # end of a member, the rest of the chunk is the next one
+                pos += len(chunk) - len(d.unused_data)
+                chunk = d.unused_data
+                index.append((c_off + pos, u_off, last == '\n'))
+                d = zlib.decompressobj(16 + zlib.MAX_WBITS)
+            c_off += pos + len(chunk)
+
+    return index, u_off
+
+def _plain_lines(filename, start, end):
+    """Yields the lines that start inside the byte range [start, end)"""
+
+    with open(filename, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            pos = start
+            # a line belongs to the shard it starts in, so skip the tail
+            #   of a line the previous shard is working on
+            if pos > 0 and mm[pos - 1] != '\n':
+                pos = mm.find('\n', pos) + 1
+                if pos == 0:
+                    return
+            while pos < end:
+                nl = mm.find('\n', pos)
+                if nl == -1:
+                    yield mm[pos:]
+                    break
+                yield mm[pos:nl + 1]
+                pos = nl + 1
+        finally:
+            mm.close()
+
+def _gzip_lines(filename, c_start, u_off, u_start, u_end, prev_nl):
+    """Yields the lines starting inside the uncompressed range
+    [u_start, u_end), decompressing from the member at c_start, which
+    starts at uncompressed offset u_off"""
+
+    with open(filename, 'rb') as f:
+        f.seek(c_start)
+        d = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        u_pos = u_off       # uncompressed offset of buf[0]
+        buf = ''
+        skip = not prev_nl
+        while True:
+            chunk = f.read(_READ_SIZE)
+            if chunk:
+                data = d.decompress(chunk)
+                while d.unused_data:
+                    rest = d.unused_data
+                    d = zlib.decompressobj(16 + zlib.MAX_WBITS)
+                    data += d.decompress(rest)
+                buf += data
+
+            pos = 0
+            if skip:
+                # the previous shard finishes the line we start in
+                nl = buf.find('\n')
+                if nl != -1:
+                    pos = nl + 1
+                    skip = False
+                elif chunk:
+                    continue
+            while True:
+                nl = buf.find('\n', pos)
+                if nl == -1 or u_pos + pos >= u_end:
+                    break
+                if u_pos + pos >= u_start:
+                    yield buf[pos:nl + 1]
+                pos = nl + 1
+            u_pos += pos
+            buf = buf[pos:]
+
+            if u_pos >= u_end:
+                return
+            if not chunk:
+                if buf and not skip and u_pos >= u_start:
+                    yield buf
+                return
+
+def trace_shards(filename, data_start, num_shards):
+    """Splits a trace report into at most num_shards shards that can be
+    read independently, plain files are split on byte ranges, gzip files
+    on the member boundaries from gzip_seek_index.
+
+    @param filename: the trace report
+    @type filename: string
+
+    @param data_start: offset of the first line after the header,
+        uncompressed for gzip files
+    @type data_start: int
+
+    @param num_shards: number of shards wanted
+    @type num_shards: int
+
+    @return: list of shards (tuples) to pass to read_shard, or None if
+        the file can't be split (a single member gzip file, or any other
+        compressed format)
+    @rtype: list
+    """
+
+    fmt = trace_format(filename)
+    if fmt != 'plain' and fmt != 'gzip':
+        return None
+    if fmt == 'gzip':
+        index, u_total = gzip_seek_index(filename)
+        if len(index) < 2:
+            return None
+
+        # spread the members over the shards, on uncompressed size. the
+        #   first shard starts decompressing at 0 but skips the header
+        target = float(u_total - data_start) / num_shards
+        shards = []
+        c_start, u_off, u_start, prev_nl = 0, 0, data_start, True
+        for c, u, nl in index[1:]:
+            if u - u_start >= target:
+                shards.append(('gzip', c_start, u_off, u_start, u, prev_nl))
+                c_start, u_off, u_start, prev_nl = c, u, u, nl
+        shards.append(('gzip', c_start, u_off, u_start, u_total, prev_nl))
+        return shards
+
+    size = os.path.getsize(filename)
+    step = max(1, (size - data_start) / num_shards + 1)
+    return [('plain', s, min(s + step, size))
+                for s in range(data_start, size, step)]
+
+def read_shard(filename, shard):
+    """Yields the lines of a shard from trace_shards"""
+
+    if shard[0] == 'gzip':
+        return _gzip_lines(filename, *shard[1:])
+    else:
+        return _plain_lines(filename, *shard[1:])
+
+def follow_lines(filename, poll=1.0):
+    """Yields the lines of a trace report that is still being written,
+    forever. New data is read from where the last read stopped, a line
+    is only handed out once its newline is there, and a gzip'd report is
+    decompressed as it grows.
+
+    None is yielded each time no new data showed up for poll seconds, so
+    the caller gets a chance to do something else while the file is idle.
+
+    @param filename: the trace report
+    @type filename: string
+
+    @param poll: seconds to wait for new data
+    @type poll: float
+    """
+
+    with open(filename, 'rb') as f:
+        d = None
+        buf = ''
+        while True:
+            data = f.read(_READ_SIZE)
+            if not data:
+                yield None
+                time.sleep(poll)
+                continue
+
+            if d is None:
+                # not enough to tell gzip from plain yet
+                if len(buf) + len(data) < 2:
+                    buf += data
+                    continue
+                data, buf = buf + data, ''
+                if data[:2] == _GZIP_MAGIC:
+                    d = zlib.decompressobj(16 + zlib.MAX_WBITS)
+                else:
+                    d = False
+            if d:
+                data = d.decompress(data)
+                while d.unused_data:
+                    # the next gzip member
+                    rest = d.unused_data
+                    d = zlib.decompressobj(16 + zlib.MAX_WBITS)
+                    data += d.decompress(rest)
+
+            buf += data
+            nl = buf.rfind('\n')
+            if nl == -1:
+                continue
+            for line in buf[:nl + 1].splitlines(True):
+                yield line
+            buf = buf[nl + 1:]
@@ -1,5 +1,5 @@
 try:
-    from setuputils import setup
+    from setuptools import setup
 except:
     from distutils.core import setup
 
@@ -11,7 +11,8 @@ setup(
     description = 'libraries and tools for GPFS',
     author = 'stevec7',
     author_email = 'none',
-    packages = ['gpfs']
+    packages = ['gpfs'],
+    install_requires = ['numpy']
 
 
 
@@ -0,0 +1,51 @@
+import os
+import sys
+from collections import defaultdict
+from StringIO import StringIO
+
+# the trace generator lives with the tools in contrib/trace, not in gpfs
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..', 'contrib', 'trace'))
+
+from gpfs.analyze import TraceParser
+
+
+def tree():
+    return defaultdict(tree)
+
+def parse(filename, filters='io,ts', workers=1, **options):
+    """Parses a trace with the summaries it prints swallowed, returns the
+    TraceParser"""
+
+    parser = TraceParser(tree(), False, **options)
+    stdout, sys.stdout = sys.stdout, StringIO()
+    try:
+        parser.parse_trace(filename, filters, workers)
+    finally:
+        sys.stdout = stdout
+    return parser
+
+def same(a, b, rel=1e-9):
+    """True if two nested results (dicts, lists, numbers) are equal, with
+    nan equal to nan and floats within rel of each other (sums taken in
+    another order)"""
+
+    if isinstance(a, dict) and isinstance(b, dict):
+        return sorted(a) == sorted(b) and \
+            all(same(a[k], b[k], rel) for k in a)
+    if isinstance(a, (list, tuple)) and isinstance(b, (list, tuple)):
+        return len(a) == len(b) and \
+            all(same(x, y, rel) for x, y in zip(a, b))
+    if isinstance(a, float) and isinstance(b, float):
+        if a != a:
+            return b != b
+        return abs(a - b) <= rel * max(abs(a), abs(b))
+    return a == b
+
+def io_stats(tracelog):
+    """The disk and overall IO stats of a parse, less the top inodes,
+    which are a heuristic (see HotInodes)"""
+
+    stats = dict(tracelog['trace_io']['stats'])
+    stats.pop('top_inodes', None)
+    return tracelog['trace_io']['disks'], stats
@@ -0,0 +1,77 @@
+import os
+import shutil
+import tempfile
+import unittest
+from gen_trace import write_trace
+from gpfs.analyze import _plain
+from tests import io_stats, parse, same
+
+# the disk stats a summary only parse keeps exactly, and the ones it sums
+#   in another order
+EXACT = ('num_iops', 'num_data_ios', 'avg_io_sz', 'total_bytes_io',
+         'longest_io', 'class', 'patterns')
+SUMS = ('avg_io_tm', 'total_time_io', 'stddev_io_tm')
+
+
+class ParseModesTest(unittest.TestCase):
+    """A serial, a parallel and a summary only parse of the same trace
+    give the same disk and RPC stats"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmpdir = tempfile.mkdtemp()
+        cls.filename = os.path.join(cls.tmpdir, 'trace.gz')
+        write_trace(cls.filename, 20000, num_disks=8, slow_disks=(2,),
+                    meta_disks=1)
+        cls.serial = _plain(parse(cls.filename).tracelog)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.tmpdir)
+
+    def assertSameRPCs(self, a, b):
+        self.assertTrue(a['trace_ts']['stats']['rpc_msgs'])
+        for name in ('rpc_msgs', 'rpc_nodes'):
+            self.assertTrue(same(a['trace_ts']['stats'][name],
+                                 b['trace_ts']['stats'][name]), name)
+        # the nodes each message went to, in whatever order the messages
+        #   were walked
+        for name in ('sent', 'received'):
+            counts = lambda t: dict((msg, sorted(nodes)) for msg, nodes in
+                                    t['trace_ts']['stats'].get(name,
+                                        {}).iteritems())
+            self.assertEqual(counts(a), counts(b))
+
+    def test_parallel(self):
+        tracelog = _plain(parse(self.filename, workers=3).tracelog)
+        self.assertTrue(self.serial['trace_io']['disks'])
+        self.assertTrue(same(io_stats(self.serial), io_stats(tracelog)))
+        self.assertSameRPCs(self.serial, tracelog)
+
+    def test_summary_only(self):
+        summary = _plain(parse(self.filename, summary_only=True).tracelog)
+        parallel = _plain(parse(self.filename, workers=3,
+                                summary_only=True).tracelog)
+        self.assertTrue(same(io_stats(summary), io_stats(parallel)))
+
+        disks = self.serial['trace_io']['disks']
+        self.assertEqual(sorted(disks), sorted(summary['trace_io']['disks']))
+        for disknum, disk in disks.iteritems():
+            full = disk['stats']
+            stats = summary['trace_io']['disks'][disknum]['stats']
+            for name in EXACT:
+                self.assertTrue(same(full[name], stats[name]), name)
+            for name in SUMS:
+                self.assertAlmostEqual(full[name], stats[name], delta=1e-9)
+            # the sketch median is within 1% of the value, the exact one
+            #   is interpolated between two
+            self.assertAlmostEqual(full['io_tm_pcts'][0],
+                                   stats['io_tm_pcts'][0],
+                                   delta=0.03 * full['io_tm_pcts'][0])
+        self.assertEqual(self.serial['trace_io']['stats']['ranked_disks'][0],
+                         summary['trace_io']['stats']['ranked_disks'][0])
+        self.assertSameRPCs(self.serial, summary)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+import numpy as np
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from StringIO import StringIO
+from gen_trace import write_trace
+from gpfs import tracecache
+from gpfs.analyze import TraceParser, _plain
+from tests import parse, same, tree
+
+
+class TraceCacheTest(unittest.TestCase):
+    """What tracecache.save writes, tracecache.load gives back"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmpdir = tempfile.mkdtemp()
+        cls.filename = os.path.join(cls.tmpdir, 'trace.gz')
+        write_trace(cls.filename, 20000, num_disks=8, slow_disks=(2,))
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.tmpdir)
+
+    def round_trip(self, **options):
+        parser = parse(self.filename, **options)
+        entry = os.path.join(self.tmpdir, 'cache',
+                             tracecache.cache_key(self.filename, 'io,ts',
+                                                  parser._options))
+        tracecache.save(parser, entry)
+        loaded = TraceParser(tree(), False, **options)
+        self.assertTrue(tracecache.load(loaded, entry))
+        self.assertTrue(same(_plain(parser.tracelog), _plain(loaded.tracelog)))
+        self.assertEqual(parser.trace_start_epoch, loaded.trace_start_epoch)
+        self.assertEqual(parser.trace_stop_epoch, loaded.trace_stop_epoch)
+        self.assertEqual(type(parser.iostore), type(loaded.iostore))
+
+        # and the summaries print from the cache
+        stdout, sys.stdout = sys.stdout, StringIO()
+        try:
+            loaded.print_disk_summary()
+        finally:
+            sys.stdout = stdout
+        return parser, loaded
+
+    def test_full(self):
+        parser, loaded = self.round_trip()
+        self.assertTrue(len(parser.iostore))
+        self.assertEqual(len(parser.iostore), len(loaded.iostore))
+        arrays = parser.iostore.arrays()
+        loaded_arrays = loaded.iostore.arrays()
+        self.assertEqual(sorted(arrays), sorted(loaded_arrays))
+        for name, col in arrays.iteritems():
+            np.testing.assert_array_equal(col, loaded_arrays[name])
+        self.assertEqual(parser.iostore.optypes.values,
+                         loaded.iostore.optypes.values)
+        self.assertEqual(parser.iostore.diskids.values,
+                         loaded.iostore.diskids.values)
+
+    def test_summary_only(self):
+        self.round_trip(summary_only=True)
+
+    def test_missing(self):
+        parser = TraceParser(tree(), False)
+        self.assertFalse(tracecache.load(parser,
+                                         os.path.join(self.tmpdir, 'none')))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,89 @@
+import bz2
+import os
+import shutil
+import tempfile
+import unittest
+import zlib
+from gen_trace import write_trace
+from gpfs.analyze import _plain
+from gpfs.traceio import TraceFile, node_name, trace_format
+from tests import io_stats, parse, same
+
+
+def _gzip(data):
+    c = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    return c.compress(data) + c.flush()
+
+
+class TraceFileTest(unittest.TestCase):
+    """Concatenated gzip and bz2 streams (pigz, pbzip2) read back the same
+    as the plain text report"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmpdir = tempfile.mkdtemp()
+        cls.plain = os.path.join(cls.tmpdir, 'trace')
+        write_trace(cls.plain, 20000, num_disks=8)
+        with open(cls.plain, 'rb') as f:
+            cls.data = f.read()
+
+        # three streams each, cut in the middle of lines
+        cuts = [0, len(cls.data) // 3 + 7, 2 * len(cls.data) // 3 + 11,
+                len(cls.data)]
+        parts = [cls.data[a:b] for a, b in zip(cuts, cuts[1:])]
+        cls.streams = {'gzip': [_gzip(p) for p in parts],
+                       'bz2':  [bz2.compress(p) for p in parts]}
+        cls.filenames = {'plain': cls.plain}
+        for fmt, streams in cls.streams.iteritems():
+            cls.filenames[fmt] = os.path.join(cls.tmpdir, 'trace.' + fmt)
+            with open(cls.filenames[fmt], 'wb') as f:
+                f.write(''.join(streams))
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.tmpdir)
+
+    def test_format(self):
+        for fmt, filename in self.filenames.iteritems():
+            self.assertEqual(trace_format(filename), fmt)
+
+    def test_chunks(self):
+        for fmt, filename in self.filenames.iteritems():
+            # small reads, so streams end in the middle of a read
+            f = TraceFile(filename, read_size=4096)
+            self.assertEqual(''.join(f.chunks()), self.data, fmt)
+
+    def test_readline(self):
+        for fmt, filename in self.filenames.iteritems():
+            f = TraceFile(filename, read_size=4096)
+            lines = []
+            line = f.readline()
+            while line:
+                lines.append(line)
+                line = f.readline()
+            self.assertEqual(lines, self.data.splitlines(True), fmt)
+            self.assertEqual(f.tell(), len(self.data))
+
+    def test_stream_end_on_read(self):
+        # a stream ending right at the end of a read
+        for fmt, streams in self.streams.iteritems():
+            f = TraceFile(self.filenames[fmt], read_size=len(streams[0]))
+            self.assertEqual(''.join(f.chunks()), self.data, fmt)
+
+    def test_parse(self):
+        tracelog = _plain(parse(self.plain).tracelog)
+        self.assertTrue(tracelog['trace_io']['disks'])
+        for fmt in self.streams:
+            other = _plain(parse(self.filenames[fmt]).tracelog)
+            self.assertTrue(same(io_stats(tracelog), io_stats(other)), fmt)
+        other = _plain(parse(self.filenames['gzip'], workers=2).tracelog)
+        self.assertTrue(same(io_stats(tracelog), io_stats(other)))
+
+    def test_node_name(self):
+        self.assertEqual(node_name('/d/nsd1.cluster.gz'), 'nsd1.cluster')
+        self.assertEqual(node_name('10.0.0.1.trcrpt.bz2'), '10.0.0.1')
+        self.assertEqual(node_name('10.0.0.1'), '10.0.0.1')
+
+
+if __name__ == '__main__':
+    unittest.main()